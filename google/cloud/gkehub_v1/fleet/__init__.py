@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Hand-written helpers for working with large fleets of memberships."""
+
+from .analytics import ConfigManagementStats
+from .analytics import TDigest
+from .batching import BatchMetrics
+from .batching import FeatureUpdateBatcher
+from .construction import ClientFactory
+from .deployments import DeploymentMatrix
+from .edits import EditSession
+from .edits import diff_paths
+from .failover import ConfigMembershipMonitor
+from .failover import FailoverEvent
+from .filters import And
+from .filters import FieldEquals
+from .filters import HasLabel
+from .filters import Label
+from .filters import NamePrefix
+from .filters import Not
+from .filters import Or
+from .filters import Predicate
+from .filters import QueryPlan
+from .filters import TimeRange
+from .filters import Where
+from .filters import list_features
+from .filters import list_memberships
+from .filters import plan
+from .forksafe import ForkSafeClient
+from .gitsources import GitSource
+from .gitsources import GitSourceIndex
+from .gitsources import normalize_git_source
+from .importer import ImportReport
+from .importer import Journal
+from .importer import MembershipImporter
+from .importer import read_inventory
+from .interning import InternTable
+from .interning import default_intern_table
+from .interning import iter_interned_memberships
+from .joins import JoinedMembership
+from .joins import ProjectAliasCache
+from .joins import join_feature_memberships
+from .manifests import ManifestCache
+from .mapreduce import fleet_map_reduce
+from .mapreduce import iter_partials
+from .names import MembershipNameIndex
+from .names import parse_feature_path
+from .names import parse_feature_paths
+from .names import parse_membership_path
+from .names import parse_membership_paths
+from .paging import AsyncListing
+from .paging import CheckpointFile
+from .paging import Listing
+from .paging import PageSizeTuner
+from .paging import PagerCheckpoint
+from .pipeline import Pipeline
+from .pipeline import StageMetrics
+from .ratelimit import TokenBucket
+from .reconcile import ConfigManagementReconciler
+from .reconcile import ReconcileReport
+from .reconcile import SpecChange
+from .reconcile import diff_membership_specs
+from .refresh import AsyncCredentialsRefresher
+from .refresh import CredentialsRefresher
+from .selectors import LabelIndex
+from .selectors import Requirement
+from .selectors import parse_selector
+from .syncerrors import ErrorKey
+from .syncerrors import SyncErrorIndex
+from .teardown import TeardownPlan
+from .teardown import TeardownProgress
+from .teardown import TeardownReport
+from .teardown import TeardownRunner
+from .teardown import TeardownStep
+from .teardown import plan_teardown
+from .upgrades import AgentVersionIndex
+from .upgrades import ConnectUpgradePlanner
+from .upgrades import UpgradeReport
+from .upgrades import UpgradeResult
+from .validation import Finding
+from .validation import has_errors
+from .validation import validate_feature
+from .validation import validate_spec
+from .validation import validate_specs
+
+__all__ = (
+    "ConfigManagementStats",
+    "TDigest",
+    "BatchMetrics",
+    "FeatureUpdateBatcher",
+    "ClientFactory",
+    "DeploymentMatrix",
+    "EditSession",
+    "diff_paths",
+    "ConfigMembershipMonitor",
+    "FailoverEvent",
+    "And",
+    "FieldEquals",
+    "HasLabel",
+    "Label",
+    "NamePrefix",
+    "Not",
+    "Or",
+    "Predicate",
+    "QueryPlan",
+    "TimeRange",
+    "Where",
+    "list_features",
+    "list_memberships",
+    "plan",
+    "ForkSafeClient",
+    "GitSource",
+    "GitSourceIndex",
+    "normalize_git_source",
+    "ImportReport",
+    "Journal",
+    "MembershipImporter",
+    "read_inventory",
+    "InternTable",
+    "default_intern_table",
+    "iter_interned_memberships",
+    "JoinedMembership",
+    "ProjectAliasCache",
+    "join_feature_memberships",
+    "ManifestCache",
+    "fleet_map_reduce",
+    "iter_partials",
+    "MembershipNameIndex",
+    "parse_feature_path",
+    "parse_feature_paths",
+    "parse_membership_path",
+    "parse_membership_paths",
+    "AsyncListing",
+    "CheckpointFile",
+    "Listing",
+    "PageSizeTuner",
+    "PagerCheckpoint",
+    "Pipeline",
+    "StageMetrics",
+    "TokenBucket",
+    "ConfigManagementReconciler",
+    "ReconcileReport",
+    "SpecChange",
+    "diff_membership_specs",
+    "AsyncCredentialsRefresher",
+    "CredentialsRefresher",
+    "LabelIndex",
+    "Requirement",
+    "parse_selector",
+    "ErrorKey",
+    "SyncErrorIndex",
+    "TeardownPlan",
+    "TeardownProgress",
+    "TeardownReport",
+    "TeardownRunner",
+    "TeardownStep",
+    "plan_teardown",
+    "AgentVersionIndex",
+    "ConnectUpgradePlanner",
+    "UpgradeReport",
+    "UpgradeResult",
+    "Finding",
+    "has_errors",
+    "validate_feature",
+    "validate_spec",
+    "validate_specs",
+)
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Field mask paths, including paths into map fields (AIP-161)."""
+
+import re
+from typing import Iterable
+
+from google.protobuf import field_mask_pb2  # type: ignore
+
+_IDENTIFIER_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def quote_segment(segment: str) -> str:
+    """Quote a path segment with backticks unless it is an identifier."""
+    if _IDENTIFIER_RE.match(segment):
+        return segment
+    return "`{}`".format(segment.replace("`", "\\`"))
+
+
+def unquote_segment(segment: str) -> str:
+    """Reverse :func:`quote_segment`."""
+    if len(segment) > 1 and segment.startswith("`") and segment.endswith("`"):
+        return segment[1:-1].replace("\\`", "`")
+    return segment
+
+
+def map_key_path(field: str, key: str) -> str:
+    """Return the mask path of one entry of a map field.
+
+    For example ``map_key_path("membership_specs", "projects/p/...")`` is
+    ``membership_specs.`projects/p/...```.
+    """
+    return "{}.{}".format(field, quote_segment(key))
+
+
+def field_mask(paths: Iterable[str]) -> field_mask_pb2.FieldMask:
+    """Build a ``FieldMask`` with sorted, de-duplicated paths."""
+    return field_mask_pb2.FieldMask(paths=sorted(set(paths)))
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Access to the raw ``configmanagement`` state of a membership."""
+
+from typing import Any, Optional
+
+from google.cloud.gkehub_v1 import configmanagement_v1
+from google.cloud.gkehub_v1.types import feature as gcg_feature
+
+
+def configmanagement_pb(state: Any) -> Optional[Any]:
+    """Return the raw protobuf ``configmanagement.MembershipState``, if any.
+
+    Args:
+        state (Any): A ``MembershipFeatureState``, a
+            ``configmanagement_v1.MembershipState`` (proto-plus or raw
+            protobuf), or ``None``.
+
+    Returns:
+        Optional[Any]: The raw message, or ``None`` when the state carries
+            no Config Management state.
+    """
+    if state is None:
+        return None
+    if isinstance(state, gcg_feature.MembershipFeatureState):
+        pb = gcg_feature.MembershipFeatureState.pb(state)
+        return pb.configmanagement if pb.HasField("configmanagement") else None
+    if isinstance(state, configmanagement_v1.MembershipState):
+        return configmanagement_v1.MembershipState.pb(state)
+    if state.DESCRIPTOR.name == "MembershipFeatureState":
+        return state.configmanagement if state.HasField("configmanagement") else None
+    return state
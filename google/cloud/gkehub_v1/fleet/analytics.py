@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Single-pass version-drift and sync-lag statistics for Config Management.
+
+:class:`ConfigManagementStats` reads each membership state once, straight
+from the raw protobuf, and keeps only a histogram per version field and a
+:class:`TDigest` of Config Sync lag (the time since
+``SyncState.last_sync_time``). Both are mergeable, so per-project results
+can be combined, and :meth:`ConfigManagementStats.to_dict` output can be
+shipped between processes::
+
+    stats = ConfigManagementStats()
+    for feature in features:               # e.g. one per project
+        stats.add_feature(feature)
+    stats.version_histogram("config_sync.reconciler_manager")
+    stats.lag_percentiles((50, 90, 99))
+"""
+
+import bisect
+import collections
+import math
+import time
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from google.cloud.gkehub_v1.types import feature as gcg_feature
+
+from . import _states
+
+# histogram name -> path from the configmanagement MembershipState
+VERSION_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "operator": ("operator_state", "version"),
+    "config_sync.importer": ("config_sync_state", "version", "importer"),
+    "config_sync.syncer": ("config_sync_state", "version", "syncer"),
+    "config_sync.git_sync": ("config_sync_state", "version", "git_sync"),
+    "config_sync.monitor": ("config_sync_state", "version", "monitor"),
+    "config_sync.reconciler_manager": (
+        "config_sync_state",
+        "version",
+        "reconciler_manager",
+    ),
+    "config_sync.root_reconciler": (
+        "config_sync_state",
+        "version",
+        "root_reconciler",
+    ),
+    "policy_controller": ("policy_controller_state", "version", "version"),
+    "hierarchy_controller.hnc": ("hierarchy_controller_state", "version", "hnc"),
+    "hierarchy_controller.extension": (
+        "hierarchy_controller_state",
+        "version",
+        "extension",
+    ),
+    "spec": ("membership_spec", "version"),
+}
+
+
+class TDigest:
+    """A mergeable sketch of a distribution for quantile estimates.
+
+    This is the merging variant of Dunning's t-digest with the arcsine
+    scale function: at most about ``compression`` centroids are kept, small
+    near the tails and large near the median, so extreme quantiles stay
+    accurate in constant memory.
+    """
+
+    def __init__(self, compression: float = 100.0):
+        """Instantiates an empty digest.
+
+        Args:
+            compression (float): Larger values keep more centroids and give
+                more accurate quantiles.
+        """
+        if compression < 10:
+            raise ValueError("compression must be at least 10.")
+        self.compression = compression
+        self._centroids: List[Tuple[float, float]] = []
+        self._buffer: List[Tuple[float, float]] = []
+        self._buffer_limit = int(5 * compression)
+        self.count = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def __len__(self) -> int:
+        return int(self.count)
+
+    def add(self, value: float, weight: float = 1.0) -> None:
+        """Adds a value."""
+        if weight <= 0:
+            raise ValueError("weight must be positive.")
+        self._buffer.append((float(value), float(weight)))
+        self.count += weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self._buffer) >= self._buffer_limit:
+            self._compress()
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        """Adds every value of ``other`` to this digest.
+
+        Returns:
+            TDigest: This digest.
+        """
+        other._compress()
+        self._buffer.extend(other._centroids)
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _k(self, q: float) -> float:
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _q(self, k: float) -> float:
+        return (math.sin(min(k * 2 * math.pi / self.compression, math.pi / 2)) + 1) / 2
+
+    def _compress(self) -> None:
+        if not self._buffer:
+            return
+        points = sorted(self._centroids + self._buffer)
+        self._buffer = []
+        total = sum(weight for _, weight in points)
+        merged = []
+        mean, weight = points[0]
+        so_far = 0.0
+        limit = self._q(self._k(0.0) + 1)
+        for next_mean, next_weight in points[1:]:
+            if (so_far + weight + next_weight) / total <= limit:
+                weight += next_weight
+                mean += (next_mean - mean) * next_weight / weight
+            else:
+                merged.append((mean, weight))
+                so_far += weight
+                limit = self._q(self._k(so_far / total) + 1)
+                mean, weight = next_mean, next_weight
+        merged.append((mean, weight))
+        self._centroids = merged
+
+    def quantile(self, q: float) -> float:
+        """Estimates the ``q``-quantile, for ``q`` in ``[0, 1]``.
+
+        Returns:
+            float: The estimate, or ``nan`` for an empty digest.
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("q must be in [0, 1].")
+        self._compress()
+        centroids = self._centroids
+        if not centroids:
+            return math.nan
+        if q == 0:
+            return self.min
+        if q == 1:
+            return self.max
+        target = q * self.count
+        previous_mean, previous_center = self.min, 0.0
+        cumulative = 0.0
+        for mean, weight in centroids:
+            center = cumulative + weight / 2
+            if target < center:
+                span = center - previous_center
+                fraction = (target - previous_center) / span if span > 0 else 0.0
+                return previous_mean + (mean - previous_mean) * fraction
+            previous_mean, previous_center = mean, center
+            cumulative += weight
+        span = self.count - previous_center
+        fraction = (target - previous_center) / span if span > 0 else 0.0
+        return previous_mean + (self.max - previous_mean) * fraction
+
+    def centroids(self) -> List[Tuple[float, float]]:
+        """Returns the ``(mean, weight)`` centroids, sorted by mean."""
+        self._compress()
+        return list(self._centroids)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns a JSON-serializable representation."""
+        return {
+            "compression": self.compression,
+            "centroids": [list(c) for c in self.centroids()],
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TDigest":
+        """Rebuilds a digest from :meth:`to_dict` output."""
+        digest = cls(data["compression"])
+        digest._centroids = [(float(m), float(w)) for m, w in data["centroids"]]
+        digest.count = sum(w for _, w in digest._centroids)
+        if digest.count:
+            digest.min = data["min"]
+            digest.max = data["max"]
+        return digest
+
+
+def _read(pb: Any, path: Tuple[str, ...]) -> Any:
+    for part in path:
+        pb = getattr(pb, part)
+    return pb
+
+
+class ConfigManagementStats:
+    """Version histograms and a sync-lag digest over membership states.
+
+    Attributes:
+        memberships (int): Membership states seen.
+        without_state (int): States without Config Management state.
+        never_synced (int): Config Sync states without ``last_sync_time``.
+        lag (TDigest): Sync lag in seconds.
+    """
+
+    def __init__(self, compression: float = 100.0):
+        self.memberships = 0
+        self.without_state = 0
+        self.never_synced = 0
+        self.lag = TDigest(compression)
+        self._histograms: Dict[str, collections.Counter] = {
+            name: collections.Counter() for name in VERSION_FIELDS
+        }
+
+    def add(self, state: Any, now: float = None) -> None:
+        """Accounts for one membership state.
+
+        Args:
+            state (Any): A ``MembershipFeatureState`` or
+                ``configmanagement_v1.MembershipState``, proto-plus or raw.
+            now (float): The reference time for lag, in seconds since the
+                epoch; defaults to the current time.
+        """
+        self.memberships += 1
+        pb = _states.configmanagement_pb(state)
+        if pb is None:
+            self.without_state += 1
+            return
+        for name, path in VERSION_FIELDS.items():
+            version = _read(pb, path)
+            if version:
+                self._histograms[name][version] += 1
+        if not pb.HasField("config_sync_state"):
+            return
+        sync_state = pb.config_sync_state.sync_state
+        if not sync_state.HasField("last_sync_time"):
+            self.never_synced += 1
+            return
+        last_sync = sync_state.last_sync_time
+        if now is None:
+            now = time.time()
+        self.lag.add(max(0.0, now - (last_sync.seconds + last_sync.nanos / 1e9)))
+
+    def add_states(self, states: Iterable[Any], now: float = None) -> None:
+        """Accounts for every state of an iterable."""
+        if now is None:
+            now = time.time()
+        for state in states:
+            self.add(state, now)
+
+    def add_feature(self, feature: Any, now: float = None) -> None:
+        """Accounts for every membership state of a ``configmanagement`` Feature.
+
+        The states are read from the underlying protobuf without building
+        proto-plus wrappers.
+        """
+        if isinstance(feature, gcg_feature.Feature):
+            feature = gcg_feature.Feature.pb(feature)
+        self.add_states(feature.membership_states.values(), now)
+
+    def merge(self, other: "ConfigManagementStats") -> "ConfigManagementStats":
+        """Adds the statistics of ``other``; returns this object."""
+        self.memberships += other.memberships
+        self.without_state += other.without_state
+        self.never_synced += other.never_synced
+        self.lag.merge(other.lag)
+        for name, histogram in other._histograms.items():
+            self._histograms[name].update(histogram)
+        return self
+
+    def version_histogram(self, field: str) -> Dict[str, int]:
+        """Returns the count of each version of a field of :data:`VERSION_FIELDS`."""
+        return dict(self._histograms[field])
+
+    def version_drift(self, field: str) -> Dict[str, float]:
+        """Returns the fraction of reporting memberships at each version."""
+        histogram = self._histograms[field]
+        total = sum(histogram.values())
+        return {version: count / total for version, count in histogram.items()}
+
+    def lag_percentiles(self, percentiles: Sequence[float] = (50, 90, 99)) -> Dict:
+        """Returns estimated sync lag, in seconds, at each percentile."""
+        return {p: self.lag.quantile(p / 100) for p in percentiles}
+
+    def lag_at_most(self, seconds: float) -> float:
+        """Returns the estimated fraction of synced memberships with lag <= ``seconds``."""
+        centroids = self.lag.centroids()
+        if not centroids:
+            return math.nan
+        means = [mean for mean, _ in centroids]
+        index = bisect.bisect_right(means, seconds)
+        return sum(weight for _, weight in centroids[:index]) / self.lag.count
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns a JSON-serializable representation."""
+        return {
+            "memberships": self.memberships,
+            "without_state": self.without_state,
+            "never_synced": self.never_synced,
+            "lag": self.lag.to_dict(),
+            "versions": {
+                name: dict(histogram)
+                for name, histogram in self._histograms.items()
+                if histogram
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ConfigManagementStats":
+        """Rebuilds statistics from :meth:`to_dict` output."""
+        lag = TDigest.from_dict(data["lag"])
+        stats = cls(lag.compression)
+        stats.memberships = data["memberships"]
+        stats.without_state = data["without_state"]
+        stats.never_synced = data["never_synced"]
+        stats.lag = lag
+        for name, histogram in data["versions"].items():
+            stats._histograms[name].update(histogram)
+        return stats
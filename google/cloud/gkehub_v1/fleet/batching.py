@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Coalescing of per-membership ``update_feature`` calls.
+
+Reconcilers that each change one entry of ``Feature.membership_specs``
+would otherwise start one long-running operation per membership, all
+contending on the same Feature. :class:`FeatureUpdateBatcher` holds the
+changes for a short window and sends them as a single
+``UpdateFeatureRequest`` whose ``update_mask`` names exactly the changed
+entries::
+
+    batcher = FeatureUpdateBatcher(client, window=0.1)
+    future = batcher.submit(feature_name, membership_name, spec)
+    feature = future.result()
+
+Every caller of a batch receives the Feature returned by its operation.
+The futures are :class:`concurrent.futures.Future`, so asyncio code can
+await them through :func:`asyncio.wrap_future`.
+"""
+
+from concurrent import futures
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.cloud.gkehub_v1.types import feature as gcg_feature
+
+from . import _masks
+
+
+class BatchMetrics:
+    """Counters for a :class:`FeatureUpdateBatcher`.
+
+    Attributes:
+        submitted (int): Changes submitted.
+        coalesced (int): Changes superseded, before being sent, by a later
+            change to the same entry.
+        batches (int): ``update_feature`` calls made.
+        failed_batches (int): Calls, or their operations, that failed.
+        max_batch_size (int): The most entries sent in one call.
+        batch_sizes (Dict[int, int]): A histogram of entries per call.
+    """
+
+    def __init__(self):
+        self.submitted = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.max_batch_size = 0
+        self.batch_sizes: Dict[int, int] = {}
+
+    @property
+    def mean_batch_size(self) -> float:
+        """float: The average number of entries per call."""
+        if not self.batches:
+            return 0.0
+        total = sum(size * count for size, count in self.batch_sizes.items())
+        return total / self.batches
+
+    def record(self, size: int) -> None:
+        self.batches += 1
+        self.max_batch_size = max(self.max_batch_size, size)
+        self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns the counters as a dictionary."""
+        return {
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "max_batch_size": self.max_batch_size,
+            "mean_batch_size": self.mean_batch_size,
+            "batch_sizes": dict(self.batch_sizes),
+        }
+
+
+class _Batch:
+    def __init__(self):
+        # key -> (spec or None, futures waiting on the key)
+        self.entries: Dict[str, Tuple[Any, List[futures.Future]]] = {}
+        # futures of the entries being sent
+        self.sending: List[futures.Future] = []
+        self.timer: Optional[threading.Timer] = None
+        self.in_flight = False
+        self.due = False
+
+
+class FeatureUpdateBatcher:
+    """Merges per-membership spec changes into batched ``update_feature`` calls.
+
+    At most one call per Feature is in flight; changes arriving meanwhile
+    form the next batch, which is sent as soon as the current call
+    completes and its window has elapsed. A batch larger than
+    ``max_batch_size`` is sent in several calls, one after another.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        window: float = 0.05,
+        max_batch_size: int = 500,
+        operation_timeout: float = None,
+        **kwargs
+    ):
+        """Instantiates the batcher.
+
+        Args:
+            client (google.cloud.gkehub_v1.GkeHubClient): The client.
+            window (float): How long, in seconds, the first change of a
+                batch waits for others to join it.
+            max_batch_size (int): Send as soon as a batch holds this many
+                entries, and never send more in one call.
+            operation_timeout (float): The longest wait, in seconds, for
+                each operation; ``None`` waits indefinitely.
+            kwargs: Passed to ``update_feature`` (``retry``, ``timeout``,
+                ``metadata``).
+        """
+        if window < 0 or max_batch_size < 1:
+            raise ValueError("window must not be negative and max_batch_size positive.")
+        self._client = client
+        self._window = window
+        self._max_batch_size = max_batch_size
+        self._operation_timeout = operation_timeout
+        self._kwargs = kwargs
+        self._lock = threading.Lock()
+        self._batches: Dict[str, _Batch] = {}
+        self._closed = False
+        self.metrics = BatchMetrics()
+
+    def submit(
+        self, feature: str, membership: str, spec: Optional[Any]
+    ) -> futures.Future:
+        """Queues a change of one entry of ``membership_specs``.
+
+        Args:
+            feature (str): The Feature name,
+                ``projects/*/locations/*/features/*``.
+            membership (str): The ``membership_specs`` key, i.e. the
+                membership name.
+            spec (Optional[google.cloud.gkehub_v1.types.MembershipFeatureSpec]):
+                The new spec; ``None`` removes the entry.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the updated
+                ``google.cloud.gkehub_v1.types.Feature``, or to the error of
+                the call or of its operation.
+        """
+        future = futures.Future()
+        send = False
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The batcher is closed.")
+            self.metrics.submitted += 1
+            batch = self._batches.get(feature)
+            if batch is None:
+                batch = self._batches[feature] = _Batch()
+            previous = batch.entries.get(membership)
+            if previous is not None:
+                self.metrics.coalesced += 1
+                waiters = previous[1]
+            else:
+                waiters = []
+            waiters.append(future)
+            batch.entries[membership] = (spec, waiters)
+            if len(batch.entries) >= self._max_batch_size:
+                send = self._mark_due(feature, batch)
+            elif batch.timer is None and not batch.due:
+                batch.timer = threading.Timer(self._window, self._on_timer, (feature,))
+                batch.timer.daemon = True
+                batch.timer.start()
+        if send:
+            self._start_send(feature)
+        return future
+
+    def _mark_due(self, feature: str, batch: _Batch) -> bool:
+        # Called with the lock held; returns whether the caller must send.
+        if batch.timer is not None:
+            batch.timer.cancel()
+            batch.timer = None
+        batch.due = True
+        if batch.in_flight:
+            return False
+        batch.in_flight = True
+        return True
+
+    def _on_timer(self, feature: str) -> None:
+        with self._lock:
+            batch = self._batches.get(feature)
+            if batch is None or batch.timer is not threading.current_thread():
+                # Superseded by a flush or by a full batch.
+                return
+            batch.timer = None
+            send = self._mark_due(feature, batch)
+        if send:
+            self._send(feature)
+
+    def _start_send(self, feature: str) -> None:
+        threading.Thread(target=self._send, args=(feature,), daemon=True).start()
+
+    def _send(self, feature: str) -> None:
+        while True:
+            with self._lock:
+                batch = self._batches[feature]
+                entries, batch.entries = batch.entries, {}
+                batch.due = False
+                batch.sending = [
+                    future for _, futures_ in entries.values() for future in futures_
+                ]
+            items = list(entries.items())
+            for start in range(0, len(items), self._max_batch_size):
+                self._call(feature, dict(items[start : start + self._max_batch_size]))
+            with self._lock:
+                batch.sending = []
+                if not batch.due or not batch.entries:
+                    batch.in_flight = False
+                    if not batch.entries and batch.timer is None:
+                        del self._batches[feature]
+                    return
+
+    def _call(
+        self, feature: str, entries: Dict[str, Tuple[Any, List[futures.Future]]]
+    ) -> None:
+        specs = {key: spec for key, (spec, _) in entries.items() if spec is not None}
+        mask = _masks.field_mask(
+            _masks.map_key_path("membership_specs", key) for key in entries
+        )
+        waiters = [future for _, futures_ in entries.values() for future in futures_]
+        for future in waiters:
+            future.set_running_or_notify_cancel()
+        with self._lock:
+            self.metrics.record(len(entries))
+        try:
+            operation = self._client.update_feature(
+                name=feature,
+                resource=gcg_feature.Feature(name=feature, membership_specs=specs),
+                update_mask=mask,
+                **self._kwargs
+            )
+            result = operation.result(timeout=self._operation_timeout)
+        except Exception as exc:
+            with self._lock:
+                self.metrics.failed_batches += 1
+            for future in waiters:
+                if not future.cancelled():
+                    future.set_exception(exc)
+            return
+        for future in waiters:
+            if not future.cancelled():
+                future.set_result(result)
+
+    def flush(self) -> None:
+        """Sends every pending change now and waits for the results.
+
+        Calls already in flight are waited for as well.
+        """
+        with self._lock:
+            pending = list(self._batches.items())
+            to_send = [
+                feature
+                for feature, batch in pending
+                if batch.entries and self._mark_due(feature, batch)
+            ]
+            waiters = [
+                future
+                for _, batch in pending
+                for _, futures_ in batch.entries.values()
+                for future in futures_
+            ]
+            waiters.extend(future for _, batch in pending for future in batch.sending)
+        for feature in to_send:
+            self._start_send(feature)
+        futures.wait(waiters)
+
+    def close(self) -> None:
+        """Flushes pending changes and rejects further submissions."""
+        with self._lock:
+            self._closed = True
+        self.flush()
+
+    def __enter__(self) -> "FeatureUpdateBatcher":
+        return self
+
+    def __exit__(self, type, value, traceback) -> None:
+        self.close()
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Cheap repeated client construction.
+
+Building a client resolves the endpoint from environment variables, may run
+a client certificate source (for the default source, an external command),
+and loads credentials from a key file or the environment. Code that builds
+a client per task pays for all of it every time. :class:`ClientFactory`
+resolves each input once, keyed by everything it depends on, and hands the
+results to the transport::
+
+    factory = ClientFactory(GkeHubClient)
+    client = factory.create(client_options={"credentials_file": "key.json"})
+
+Clients built by the same factory share one credentials object, so an
+access token fetched by one is reused by the others.
+"""
+
+import os
+import threading
+from typing import Any, Dict, Optional, Sequence, Tuple, Union
+
+from google.api_core import client_options as client_options_lib
+import google.auth
+import grpc
+
+from google.cloud.gkehub_v1.services.gke_hub import GkeHubClient
+
+_ENVIRONMENT = (
+    "GOOGLE_API_USE_CLIENT_CERTIFICATE",
+    "GOOGLE_API_USE_MTLS_ENDPOINT",
+    "GOOGLE_APPLICATION_CREDENTIALS",
+)
+
+_CACHES = ("endpoints", "credentials")
+
+
+class ClientFactory:
+    """Builds clients from memoized endpoints, SSL and auth credentials.
+
+    Works with ``GkeHubClient``, ``GkeHubAsyncClient`` (with
+    ``transport="grpc_asyncio"``) and the v1beta1
+    ``GkeHubMembershipServiceClient``. Thread-safe.
+    """
+
+    def __init__(self, client_class: Any = GkeHubClient, transport: str = "grpc"):
+        """Instantiates the factory.
+
+        Args:
+            client_class (Any): The client class to build.
+            transport (str): The name of a gRPC transport of the client.
+        """
+        self._client_class = client_class
+        self._transport = transport
+        self._transport_class = client_class.get_transport_class(transport)
+        self._lock = threading.Lock()
+        self._cache: Dict[Tuple, Any] = {}
+        self._hits = dict.fromkeys(_CACHES, 0)
+        self._misses = dict.fromkeys(_CACHES, 0)
+
+    def _memoize(self, cache: str, key: Tuple, compute) -> Any:
+        key = (cache,) + key
+        with self._lock:
+            if key in self._cache:
+                self._hits[cache] += 1
+                return self._cache[key]
+            # Computed under the lock so that concurrent first calls do not
+            # all run the certificate source or read the key file.
+            value = compute()
+            self._misses[cache] += 1
+            self._cache[key] = value
+            return value
+
+    def resolve_endpoint(
+        self, client_options: client_options_lib.ClientOptions = None
+    ) -> Tuple[str, Optional[grpc.ChannelCredentials]]:
+        """Returns the endpoint and the SSL channel credentials to use.
+
+        The decision is the client's ``get_mtls_endpoint_and_cert_source``;
+        the client certificate source, if any, is run once and its result
+        kept as SSL channel credentials.
+
+        Args:
+            client_options (google.api_core.client_options.ClientOptions):
+                Only ``api_endpoint`` and ``client_cert_source`` are used.
+
+        Returns:
+            Tuple[str, Optional[grpc.ChannelCredentials]]: The endpoint, and
+                the mutual TLS channel credentials or ``None`` when mutual
+                TLS is not in use.
+        """
+        if client_options is None:
+            client_options = client_options_lib.ClientOptions()
+        key = (
+            tuple(os.environ.get(name) for name in _ENVIRONMENT[:2]),
+            client_options.api_endpoint,
+            client_options.client_cert_source,
+        )
+
+        def compute():
+            resolve = self._client_class.get_mtls_endpoint_and_cert_source
+            endpoint, cert_source = resolve(client_options)
+            ssl_credentials = None
+            if cert_source is not None:
+                cert, key = cert_source()
+                ssl_credentials = grpc.ssl_channel_credentials(
+                    certificate_chain=cert, private_key=key
+                )
+            return endpoint, ssl_credentials
+
+        return self._memoize("endpoints", key, compute)
+
+    def credentials(
+        self,
+        credentials_file: str = None,
+        scopes: Optional[Sequence[str]] = None,
+        quota_project_id: str = None,
+    ) -> Any:
+        """Returns credentials from a file or the environment.
+
+        A file is reloaded when its modification time or size changes.
+
+        Args:
+            credentials_file (str): A file accepted by
+                :func:`google.auth.load_credentials_from_file`, such as a
+                service account key. When omitted, the application default
+                credentials are used.
+            scopes (Optional[Sequence[str]]): The scopes to request.
+            quota_project_id (str): The project to bill quota to.
+
+        Returns:
+            google.auth.credentials.Credentials: The credentials.
+        """
+        scopes_kwargs = {
+            "scopes": scopes,
+            "default_scopes": self._transport_class.AUTH_SCOPES,
+        }
+        scopes = tuple(scopes) if scopes else None
+        if credentials_file is not None:
+            path = os.path.realpath(credentials_file)
+            stat = os.stat(path)
+            key = (path, stat.st_mtime_ns, stat.st_size, scopes, quota_project_id)
+
+            def compute():
+                credentials, _ = google.auth.load_credentials_from_file(
+                    path, quota_project_id=quota_project_id, **scopes_kwargs
+                )
+                return credentials
+
+        else:
+            key = (os.environ.get(_ENVIRONMENT[2]), scopes, quota_project_id)
+
+            def compute():
+                credentials, _ = google.auth.default(
+                    quota_project_id=quota_project_id, **scopes_kwargs
+                )
+                return credentials
+
+        return self._memoize("credentials", key, compute)
+
+    def create(
+        self,
+        credentials: Any = None,
+        client_options: Union[client_options_lib.ClientOptions, dict] = None,
+        **kwargs
+    ) -> Any:
+        """Builds a client.
+
+        Args:
+            credentials (google.auth.credentials.Credentials): Credentials to
+                use as is. When omitted, ``client_options.credentials_file``
+                or the application default credentials are loaded through
+                the cache.
+            client_options (Union[google.api_core.client_options.ClientOptions, dict]):
+                The same options the client accepts. Options with an
+                ``api_key`` are not cached and are passed to the client.
+            kwargs: Passed to the transport, e.g. ``client_info``.
+
+        Returns:
+            Any: A new client sharing the cached material.
+        """
+        if isinstance(client_options, dict):
+            client_options = client_options_lib.from_dict(client_options)
+        if client_options is None:
+            client_options = client_options_lib.ClientOptions()
+        if getattr(client_options, "api_key", None):
+            return self._client_class(
+                credentials=credentials,
+                transport=self._transport,
+                client_options=client_options,
+                **kwargs
+            )
+
+        endpoint, ssl_credentials = self.resolve_endpoint(client_options)
+        if credentials is None:
+            credentials = self.credentials(
+                client_options.credentials_file,
+                scopes=client_options.scopes,
+                quota_project_id=client_options.quota_project_id,
+            )
+        transport = self._transport_class(
+            credentials=credentials,
+            host=endpoint,
+            scopes=client_options.scopes,
+            ssl_channel_credentials=ssl_credentials,
+            quota_project_id=client_options.quota_project_id,
+            always_use_jwt_access=True,
+            **kwargs
+        )
+        return self._client_class(transport=transport)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Returns hit and miss counts per cache.
+
+        Returns:
+            Dict[str, Dict[str, int]]: ``{"endpoints": {"hits": ...,
+                "misses": ...}, "credentials": {...}}``.
+        """
+        with self._lock:
+            return {
+                cache: {"hits": self._hits[cache], "misses": self._misses[cache]}
+                for cache in _CACHES
+            }
+
+    def clear(self) -> None:
+        """Forgets every cached endpoint and credentials object."""
+        with self._lock:
+            self._cache.clear()
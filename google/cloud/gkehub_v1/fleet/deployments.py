@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""A compact matrix of Config Management component deployment states.
+
+Every component of every cluster reports a ``configmanagement``
+``DeploymentState``. :class:`DeploymentMatrix` stores one byte per
+membership per component, in one :class:`bytearray` per component indexed
+by membership ordinal, instead of a tree of proto-plus objects per
+cluster. Counting is :meth:`bytearray.count`; "any component in ERROR" is
+a :meth:`bytes.translate` per component folded into one integer bitmask.
+"""
+
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from google.cloud.gkehub_v1 import configmanagement_v1
+
+from . import _states
+
+DeploymentState = configmanagement_v1.DeploymentState
+
+# component name -> path from the configmanagement MembershipState
+COMPONENTS: Dict[str, Tuple[str, ...]] = {
+    "operator": ("operator_state", "deployment_state"),
+    "importer": ("config_sync_state", "deployment_state", "importer"),
+    "syncer": ("config_sync_state", "deployment_state", "syncer"),
+    "git_sync": ("config_sync_state", "deployment_state", "git_sync"),
+    "monitor": ("config_sync_state", "deployment_state", "monitor"),
+    "reconciler_manager": (
+        "config_sync_state",
+        "deployment_state",
+        "reconciler_manager",
+    ),
+    "root_reconciler": ("config_sync_state", "deployment_state", "root_reconciler"),
+    "gatekeeper_controller_manager": (
+        "policy_controller_state",
+        "deployment_state",
+        "gatekeeper_controller_manager_state",
+    ),
+    "gatekeeper_audit": (
+        "policy_controller_state",
+        "deployment_state",
+        "gatekeeper_audit",
+    ),
+    "hnc": ("hierarchy_controller_state", "state", "hnc"),
+    "hnc_extension": ("hierarchy_controller_state", "state", "extension"),
+}
+
+# Stored in the slots of removed memberships so they match no state.
+_ABSENT = 0xFF
+
+
+def _read(pb: Any, path: Tuple[str, ...]) -> int:
+    for part in path:
+        pb = getattr(pb, part)
+    return pb
+
+
+def _indicator(state: int) -> bytes:
+    table = bytearray(256)
+    table[state] = 1
+    return bytes(table)
+
+
+class DeploymentMatrix:
+    """Deployment state per component per membership, one byte each."""
+
+    def __init__(self, components: Sequence[str] = None):
+        """Instantiates an empty matrix.
+
+        Args:
+            components (Sequence[str]): The components to track, from
+                :data:`COMPONENTS`; all of them by default.
+        """
+        components = tuple(components) if components is not None else tuple(COMPONENTS)
+        unknown = set(components) - set(COMPONENTS)
+        if unknown:
+            raise ValueError("Unknown components: {}".format(sorted(unknown)))
+        self._paths = [(c, COMPONENTS[c]) for c in components]
+        self._columns: Dict[str, bytearray] = {c: bytearray() for c in components}
+        self._ordinals: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._free: List[int] = []
+
+    @classmethod
+    def from_feature(cls, feature: Any, **kwargs) -> "DeploymentMatrix":
+        """Builds a matrix from ``Feature.membership_states``."""
+        matrix = cls(**kwargs)
+        for name, state in feature.membership_states.items():
+            matrix.update(name, state)
+        return matrix
+
+    @property
+    def components(self) -> List[str]:
+        """List[str]: The tracked components, in column order."""
+        return list(self._columns)
+
+    def __len__(self) -> int:
+        return len(self._ordinals)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._ordinals
+
+    def update(self, name: str, state: Any) -> None:
+        """Sets the states of one membership.
+
+        Args:
+            name (str): The membership name.
+            state (Any): Its ``MembershipFeatureState`` or
+                ``configmanagement_v1.MembershipState``. Memberships
+                without Config Management state are recorded as
+                ``DEPLOYMENT_STATE_UNSPECIFIED`` everywhere.
+        """
+        ordinal = self._ordinals.get(name)
+        if ordinal is None:
+            if self._free:
+                ordinal = self._free.pop()
+                self._names[ordinal] = name
+            else:
+                ordinal = len(self._names)
+                self._names.append(name)
+                for column in self._columns.values():
+                    column.append(_ABSENT)
+            self._ordinals[name] = ordinal
+        pb = _states.configmanagement_pb(state)
+        columns = self._columns
+        for component, path in self._paths:
+            columns[component][ordinal] = _read(pb, path) if pb is not None else 0
+
+    def update_from_feature(self, feature: Any) -> None:
+        """Updates every membership in ``Feature.membership_states``."""
+        for name, state in feature.membership_states.items():
+            self.update(name, state)
+
+    def remove(self, name: str) -> bool:
+        """Removes a membership; returns whether it was present."""
+        ordinal = self._ordinals.pop(name, None)
+        if ordinal is None:
+            return False
+        for column in self._columns.values():
+            column[ordinal] = _ABSENT
+        self._names[ordinal] = ""
+        self._free.append(ordinal)
+        return True
+
+    def state(self, name: str, component: str) -> DeploymentState:
+        """Returns the state of one component of one membership."""
+        return DeploymentState(self._columns[component][self._ordinals[name]])
+
+    def states(self, name: str) -> Dict[str, DeploymentState]:
+        """Returns the state of every component of one membership."""
+        ordinal = self._ordinals[name]
+        return {
+            component: DeploymentState(column[ordinal])
+            for component, column in self._columns.items()
+        }
+
+    def counts(self, component: str) -> Dict[DeploymentState, int]:
+        """Returns the number of memberships in each state for a component."""
+        column = self._columns[component]
+        return {state: column.count(state) for state in DeploymentState}
+
+    def mask(self, state: int, components: Iterable[str] = None) -> int:
+        """Returns a bitmask of memberships with any component in ``state``.
+
+        Bit ``8 * ordinal`` is set for each matching membership; masks of
+        different states can be combined with ``|`` and ``&``.
+
+        Args:
+            state (int): A ``DeploymentState``.
+            components (Iterable[str]): The components to consider; all
+                tracked components by default.
+
+        Returns:
+            int: The bitmask.
+        """
+        table = _indicator(state)
+        result = 0
+        for component in components if components is not None else self._columns:
+            result |= int.from_bytes(
+                self._columns[component].translate(table), "little"
+            )
+        return result
+
+    def names(self, mask: int) -> List[str]:
+        """Returns the memberships selected by a bitmask, in ordinal order."""
+        flags = mask.to_bytes(len(self._names), "little")
+        names, result, start = self._names, [], 0
+        while True:
+            start = flags.find(1, start)
+            if start < 0:
+                return result
+            result.append(names[start])
+            start += 1
+
+    def select(self, state: int, components: Iterable[str] = None) -> List[str]:
+        """Returns the memberships with any of ``components`` in ``state``.
+
+        For example ``select(DeploymentState.ERROR)`` lists every cluster
+        with at least one failing component.
+        """
+        return self.names(self.mask(state, components))
+
+    def count_any(self, state: int, components: Iterable[str] = None) -> int:
+        """Returns how many memberships have any of ``components`` in ``state``."""
+        return bin(self.mask(state, components)).count("1")
+
+    def column(self, component: str) -> bytes:
+        """Returns a copy of a component's column; removed slots hold 0xFF."""
+        return bytes(self._columns[component])
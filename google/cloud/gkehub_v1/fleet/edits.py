@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Edit sessions that derive the minimal ``update_mask`` from what changed.
+
+An :class:`EditSession` snapshots a Membership or Feature, lets the caller
+modify it in place, and compares the two when the update is built. Map
+fields (``labels``, ``membership_specs``) are compared key by key, so a
+changed label becomes the single mask path ``labels.env`` and the request
+carries only that label::
+
+    session = EditSession(client.get_membership(name=name))
+    session.resource.labels["env"] = "prod"
+    operation = session.commit(client)   # None when nothing changed
+
+Output-only fields are never included.
+"""
+
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from google.cloud.gkehub_v1.types import feature as gcg_feature
+from google.cloud.gkehub_v1.types import membership as gcg_membership
+from google.cloud.gkehub_v1.types import service
+from google.cloud.gkehub_v1beta1.types import membership as v1beta1_membership
+from google.protobuf import field_mask_pb2  # type: ignore
+
+from . import _masks
+
+_OUTPUT_ONLY_MEMBERSHIP = frozenset(
+    (
+        "name",
+        "state",
+        "create_time",
+        "update_time",
+        "delete_time",
+        "last_connection_time",
+        "unique_id",
+    )
+)
+
+# resource type -> (request type, client method, output-only fields)
+_KINDS: Dict[type, Tuple[type, str, FrozenSet[str]]] = {
+    gcg_membership.Membership: (
+        service.UpdateMembershipRequest,
+        "update_membership",
+        _OUTPUT_ONLY_MEMBERSHIP | {"description"},
+    ),
+    gcg_feature.Feature: (
+        service.UpdateFeatureRequest,
+        "update_feature",
+        frozenset(
+            (
+                "name",
+                "resource_state",
+                "state",
+                "membership_states",
+                "create_time",
+                "update_time",
+                "delete_time",
+            )
+        ),
+    ),
+    v1beta1_membership.Membership: (
+        v1beta1_membership.UpdateMembershipRequest,
+        "update_membership",
+        _OUTPUT_ONLY_MEMBERSHIP,
+    ),
+}
+
+
+def _is_map(field: Any) -> bool:
+    return field.message_type is not None and field.message_type.GetOptions().map_entry
+
+
+def _is_repeated(field: Any) -> bool:
+    # ``label`` is gone from newer protobuf runtimes.
+    if hasattr(field, "is_repeated"):
+        return field.is_repeated
+    return field.label == field.LABEL_REPEATED  # pragma: NO COVER
+
+
+def _field_changed(field: Any, before: Any, after: Any) -> bool:
+    if _is_repeated(field):
+        return list(getattr(before, field.name)) != list(getattr(after, field.name))
+    if field.message_type is not None:
+        if before.HasField(field.name) != after.HasField(field.name):
+            return True
+    return getattr(before, field.name) != getattr(after, field.name)
+
+
+def diff_paths(
+    before: Any, after: Any, skip: FrozenSet[str] = frozenset()
+) -> List[str]:
+    """Return the mask paths of the fields that differ between two messages.
+
+    Map fields yield one path per added, removed or changed key; other
+    fields yield their name.
+
+    Args:
+        before (Any): The original message, proto-plus or protobuf.
+        after (Any): The modified message, of the same type.
+        skip (FrozenSet[str]): Top-level fields to ignore.
+
+    Returns:
+        List[str]: The paths, in field order and then key order.
+    """
+    before = type(before).pb(before) if hasattr(type(before), "pb") else before
+    after = type(after).pb(after) if hasattr(type(after), "pb") else after
+    paths = []
+    for field in after.DESCRIPTOR.fields:
+        if field.name in skip:
+            continue
+        if _is_map(field):
+            old, new = getattr(before, field.name), getattr(after, field.name)
+            keys = sorted(set(old) | set(new))
+            paths.extend(
+                _masks.map_key_path(field.name, key)
+                for key in keys
+                if key not in old or key not in new or old[key] != new[key]
+            )
+        elif _field_changed(field, before, after):
+            paths.append(field.name)
+    return paths
+
+
+class EditSession:
+    """Tracks edits to a ``Membership`` or ``Feature``.
+
+    Supports the v1 ``Membership`` and ``Feature`` and the v1beta1
+    ``Membership``.
+    """
+
+    def __init__(self, resource: Any):
+        """Starts a session.
+
+        Args:
+            resource (Any): The resource as last read from the server. It is
+                edited in place through :attr:`resource`.
+
+        Raises:
+            TypeError: If the resource type is not supported.
+        """
+        kind = _KINDS.get(type(resource))
+        if kind is None:
+            raise TypeError(
+                "Unsupported resource type {}.".format(type(resource).__name__)
+            )
+        self._request_type, self._method, self._output_only = kind
+        self._resource = resource
+        self._snapshot = None
+        self.reset()
+
+    @property
+    def resource(self) -> Any:
+        """Any: The resource being edited."""
+        return self._resource
+
+    def reset(self) -> None:
+        """Marks the current state of the resource as unmodified."""
+        pb = type(self._resource).pb(self._resource)
+        self._snapshot = type(pb)()
+        self._snapshot.CopyFrom(pb)
+
+    def dirty_paths(self) -> List[str]:
+        """Returns the mask paths of every modified field and map entry."""
+        return diff_paths(self._snapshot, self._resource, skip=self._output_only)
+
+    @property
+    def dirty(self) -> bool:
+        """bool: Whether anything but output-only fields was modified."""
+        return bool(self.dirty_paths())
+
+    @property
+    def update_mask(self) -> field_mask_pb2.FieldMask:
+        """google.protobuf.field_mask_pb2.FieldMask: The minimal mask."""
+        return field_mask_pb2.FieldMask(paths=self.dirty_paths())
+
+    def request(self) -> Optional[Any]:
+        """Builds the update request.
+
+        The request's resource holds only the modified fields, and only the
+        added or changed entries of modified maps; removed entries appear
+        in the mask alone, which deletes them.
+
+        Returns:
+            Optional[Any]: An ``UpdateMembershipRequest`` or
+                ``UpdateFeatureRequest``, or ``None`` if nothing changed.
+        """
+        paths = self.dirty_paths()
+        if not paths:
+            return None
+        source = type(self._resource).pb(self._resource)
+        target = type(source)()
+        fields = source.DESCRIPTOR.fields_by_name
+        for path in paths:
+            name, _, key = path.partition(".")
+            field = fields[name]
+            if _is_map(field):
+                key = _masks.unquote_segment(key)
+                values = getattr(source, name)
+                if key not in values:
+                    continue
+                if field.message_type.fields_by_name["value"].message_type is None:
+                    getattr(target, name)[key] = values[key]
+                else:
+                    getattr(target, name)[key].CopyFrom(values[key])
+            elif _is_repeated(field):  # pragma: NO COVER
+                # No supported resource has a repeated field besides maps.
+                getattr(target, name).extend(getattr(source, name))
+            elif field.message_type is not None:
+                getattr(target, name).CopyFrom(getattr(source, name))
+            else:
+                setattr(target, name, getattr(source, name))
+        resource_type = type(self._resource)
+        return self._request_type(
+            name=self._resource.name,
+            resource=resource_type.wrap(target),
+            update_mask=field_mask_pb2.FieldMask(paths=paths),
+        )
+
+    def commit(self, client: Any, **kwargs) -> Optional[Any]:
+        """Sends the update if anything changed.
+
+        Args:
+            client (Any): A ``GkeHubClient``, ``GkeHubAsyncClient`` or
+                v1beta1 ``GkeHubMembershipServiceClient``.
+            kwargs: Passed to the update method (``retry``, ``timeout``,
+                ``metadata``).
+
+        Returns:
+            Optional[Any]: The operation returned by the client (a coroutine
+                for the async client), or ``None`` if no RPC was needed. Once
+                the call is made the session treats the edits as committed.
+        """
+        request = self.request()
+        if request is None:
+            return None
+        result = getattr(client, self._method)(request=request, **kwargs)
+        self.reset()
+        return result
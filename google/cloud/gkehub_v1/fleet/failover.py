@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Health monitoring and failover of the Multi-cluster Ingress config membership.
+
+``multiclusteringress_v1.FeatureSpec.config_membership`` names the one
+cluster that hosts the MultiClusterIngress resources. A
+:class:`ConfigMembershipMonitor` watches a ranked list of candidate
+memberships and, when the current config membership becomes unhealthy,
+points the Feature at the best healthy candidate with a single
+``update_feature`` call whose mask is
+``spec.multiclusteringress.config_membership``::
+
+    monitor = ConfigMembershipMonitor(
+        client,
+        "projects/p/locations/global/features/multiclusteringress",
+        candidates=[primary, secondary, tertiary],
+    )
+    with monitor:
+        ...
+
+A membership is healthy when its state is ``READY`` and, unless
+``max_staleness`` is ``None``, its ``last_connection_time`` is recent.
+The Feature is read again right before a failover, and a config
+membership moved by someone else in the meantime is left alone.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from google.cloud.gkehub_v1 import multiclusteringress_v1
+from google.cloud.gkehub_v1.types import feature as gcg_feature
+from google.cloud.gkehub_v1.types import membership as gcg_membership
+from google.protobuf import field_mask_pb2  # type: ignore
+
+CONFIG_MEMBERSHIP_PATH = "spec.multiclusteringress.config_membership"
+
+_READY = gcg_membership.MembershipState.Code.READY
+
+
+class FailoverEvent(NamedTuple):
+    """A completed or attempted failover.
+
+    Attributes:
+        previous (str): The config membership that was replaced.
+        target (str): The membership failed over to.
+        detected (float): When the previous membership was found unhealthy,
+            as a ``time.monotonic()`` value.
+        duration (float): Seconds from detection until the operation
+            completed or failed.
+        error (Optional[Exception]): Why the failover failed, if it did.
+    """
+
+    previous: str
+    target: str
+    detected: float
+    duration: float
+    error: Optional[Exception] = None
+
+
+def is_healthy(
+    membership: Any, max_staleness: Optional[float] = 600.0, now: float = None
+) -> bool:
+    """Decide whether a membership can host the MCI config.
+
+    Args:
+        membership (google.cloud.gkehub_v1.types.Membership): The membership.
+        max_staleness (Optional[float]): The oldest acceptable
+            ``last_connection_time``, in seconds; ``None`` skips the check.
+        now (float): The current time in seconds since the epoch.
+
+    Returns:
+        bool: Whether it is ``READY`` and recently connected.
+    """
+    pb = gcg_membership.Membership.pb(membership)
+    if pb.state.code != _READY:
+        return False
+    if max_staleness is None:
+        return True
+    if not pb.HasField("last_connection_time"):
+        return False
+    connected = pb.last_connection_time
+    if now is None:
+        now = time.time()
+    return now - (connected.seconds + connected.nanos / 1e9) <= max_staleness
+
+
+class ConfigMembershipMonitor:
+    """Keeps the MCI config membership on a healthy candidate.
+
+    Attributes:
+        checks (int): Health checks performed.
+        events (List[FailoverEvent]): Every failover attempted, oldest first.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        feature: str,
+        candidates: Sequence[str],
+        max_staleness: Optional[float] = 600.0,
+        interval: float = 30.0,
+        operation_timeout: float = None,
+        on_failover: Callable[[FailoverEvent], None] = None,
+        assign_when_unset: bool = False,
+        **kwargs
+    ):
+        """Instantiates the monitor; call :meth:`start` to run it.
+
+        Args:
+            client (google.cloud.gkehub_v1.GkeHubClient): The client.
+            feature (str): The Feature name,
+                ``projects/*/locations/global/features/multiclusteringress``.
+            candidates (Sequence[str]): Membership names, most preferred
+                first. The current config membership need not be listed.
+            max_staleness (Optional[float]): See :func:`is_healthy`.
+            interval (float): Seconds between health checks.
+            operation_timeout (float): The longest wait, in seconds, for the
+                failover operation.
+            on_failover (Callable[[FailoverEvent], None]): Called after
+                every failover attempt.
+            assign_when_unset (bool): Set the best healthy candidate when the
+                Feature has no config membership; by default :meth:`check`
+                leaves it unset.
+            kwargs: Passed to every RPC (``retry``, ``timeout``,
+                ``metadata``).
+        """
+        if not candidates:
+            raise ValueError("At least one candidate is required.")
+        if interval <= 0:
+            raise ValueError("interval must be positive.")
+        self._client = client
+        self._feature = feature
+        self._candidates = list(dict.fromkeys(candidates))
+        self._priority = {name: i for i, name in enumerate(self._candidates)}
+        self._max_staleness = max_staleness
+        self._interval = interval
+        self._operation_timeout = operation_timeout
+        self._on_failover = on_failover
+        self._assign_when_unset = assign_when_unset
+        self._kwargs = kwargs
+        self._health: Dict[str, bool] = {}
+        self._ranked: List[str] = []
+        self._current = None  # type: Optional[str]
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None  # type: Optional[threading.Thread]
+        self.checks = 0
+        self.events: List[FailoverEvent] = []
+
+    @property
+    def current(self) -> Optional[str]:
+        """Optional[str]: The config membership as last read or set."""
+        return self._current
+
+    def ranked(self) -> List[str]:
+        """Returns the healthy candidates, most preferred first."""
+        return list(self._ranked)
+
+    def healthy(self, name: str) -> Optional[bool]:
+        """Returns whether a membership was healthy when last observed."""
+        return self._health.get(name)
+
+    def observe(self, membership: Any, now: float = None) -> bool:
+        """Records the health of one membership and updates the ranking.
+
+        Args:
+            membership (google.cloud.gkehub_v1.types.Membership): The
+                membership as just read.
+            now (float): The current time in seconds since the epoch.
+
+        Returns:
+            bool: Whether it is healthy.
+        """
+        healthy = is_healthy(membership, self._max_staleness, now)
+        self._health[membership.name] = healthy
+        if membership.name in self._priority:
+            self._ranked = [name for name in self._candidates if self._health.get(name)]
+        return healthy
+
+    def sync(self) -> Optional[str]:
+        """Reads the config membership from the Feature.
+
+        Returns:
+            Optional[str]: The config membership, or ``None`` if unset.
+        """
+        feature = self._client.get_feature(name=self._feature, **self._kwargs)
+        self._current = feature.spec.multiclusteringress.config_membership or None
+        return self._current
+
+    def poll(self, now: float = None) -> None:
+        """Reads the current config membership and every candidate."""
+        names = list(self._candidates)
+        if self._current is not None and self._current not in self._priority:
+            names.append(self._current)
+        for name in names:
+            try:
+                membership = self._client.get_membership(name=name, **self._kwargs)
+            except Exception:
+                self._health[name] = False
+                self._ranked = [n for n in self._ranked if n != name]
+                continue
+            self.observe(membership, now)
+
+    def check(self, now: float = None) -> Optional[FailoverEvent]:
+        """Polls and fails over if the config membership is unhealthy.
+
+        Returns:
+            Optional[FailoverEvent]: The failover performed, if any. There is
+                none when the config membership changed since it was last
+                read, or is unset and ``assign_when_unset`` is false.
+        """
+        with self._lock:
+            if self._current is None:
+                self.sync()
+            self.poll(now)
+            self.checks += 1
+            if self._current is None and not self._assign_when_unset:
+                return None
+            if self._current is not None and self._health.get(self._current):
+                return None
+            detected = time.monotonic()
+            target = next((n for n in self._ranked if n != self._current), None)
+            if target is None:
+                return None
+            expected = self._current
+            if self.sync() != expected:
+                # Moved by someone else; its health is judged next check.
+                return None
+            return self._failover(target, detected)
+
+    def failover(self, target: str = None) -> FailoverEvent:
+        """Moves the config membership now.
+
+        Args:
+            target (str): The new config membership; the best healthy
+                candidate by default.
+
+        Returns:
+            FailoverEvent: The outcome.
+
+        Raises:
+            ValueError: If no target was given and no candidate is healthy.
+        """
+        with self._lock:
+            detected = time.monotonic()
+            if target is None:
+                target = next((n for n in self._ranked if n != self._current), None)
+                if target is None:
+                    raise ValueError("No healthy candidate to fail over to.")
+            return self._failover(target, detected)
+
+    def _failover(self, target: str, detected: float) -> FailoverEvent:
+        previous = self._current or ""
+        error = None
+        try:
+            operation = self._client.update_feature(
+                name=self._feature,
+                resource=gcg_feature.Feature(
+                    name=self._feature,
+                    spec=gcg_feature.CommonFeatureSpec(
+                        multiclusteringress=multiclusteringress_v1.FeatureSpec(
+                            config_membership=target
+                        )
+                    ),
+                ),
+                update_mask=field_mask_pb2.FieldMask(paths=[CONFIG_MEMBERSHIP_PATH]),
+                **self._kwargs
+            )
+            operation.result(timeout=self._operation_timeout)
+        except Exception as exc:
+            error = exc
+        else:
+            self._current = target
+        event = FailoverEvent(
+            previous, target, detected, time.monotonic() - detected, error
+        )
+        self.events.append(event)
+        if self._on_failover is not None:
+            self._on_failover(event)
+        return event
+
+    def start(self) -> None:
+        """Starts checking on a background thread."""
+        if self._thread is not None:
+            raise RuntimeError("The monitor is already started.")
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="gkehub-mci-monitor", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.check()
+            except Exception:
+                # Transient read errors are retried on the next check.
+                pass
+            if self._stopped.wait(self._interval):
+                return
+
+    def stop(self, timeout: float = None) -> None:
+        """Stops the background thread and waits for it to exit."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def __enter__(self) -> "ConfigMembershipMonitor":
+        if self._thread is None:
+            self.start()
+        return self
+
+    def __exit__(self, type, value, traceback) -> None:
+        self.stop()
@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Structured predicates compiled into ``filter`` strings for list calls.
+
+Predicates that have an AIP-160 representation are pushed down into
+``ListMembershipsRequest.filter`` / ``ListFeaturesRequest.filter``; the rest
+are evaluated locally on the streamed results. :func:`plan` reports which is
+which.
+"""
+
+import abc
+import datetime
+import re
+from typing import Any, Callable, Iterator, List, NamedTuple, Optional
+
+from google.cloud.gkehub_v1.types import service
+
+_LABEL_KEY_RE = re.compile(r"^[a-z][a-z0-9_-]*$")
+
+
+def _quote(value: str) -> str:
+    return '"{}"'.format(value.replace("\\", "\\\\").replace('"', '\\"'))
+
+
+def _as_utc(value: datetime.datetime) -> datetime.datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc)
+
+
+class Predicate(abc.ABC):
+    """Base class for predicates over Memberships or Features.
+
+    Subclasses must implement :meth:`matches`; :meth:`to_filter` is
+    optional and defaults to local evaluation.
+    """
+
+    def to_filter(self) -> Optional[str]:
+        """Return the AIP-160 expression, or ``None`` if not expressible."""
+        return None
+
+    @abc.abstractmethod
+    def matches(self, resource: Any) -> bool:  # pragma: NO COVER
+        """Evaluate the predicate against a single resource."""
+        raise NotImplementedError()
+
+    def __and__(self, other: "Predicate") -> "And":
+        return And(self, other)
+
+    def __or__(self, other: "Predicate") -> "Or":
+        return Or(self, other)
+
+    def __invert__(self) -> "Not":
+        return Not(self)
+
+    def __repr__(self) -> str:
+        expression = self.to_filter()
+        return "{}<{}>".format(
+            self.__class__.__name__, expression if expression else "local"
+        )
+
+
+class Label(Predicate):
+    """``labels[key] == value``."""
+
+    def __init__(self, key: str, value: str):
+        self.key = key
+        self.value = value
+
+    def to_filter(self) -> Optional[str]:
+        if not _LABEL_KEY_RE.match(self.key):
+            return None
+        return "labels.{} = {}".format(self.key, _quote(self.value))
+
+    def matches(self, resource: Any) -> bool:
+        return resource.labels.get(self.key) == self.value
+
+
+class HasLabel(Predicate):
+    """The label ``key`` is present, whatever its value."""
+
+    def __init__(self, key: str):
+        self.key = key
+
+    def to_filter(self) -> Optional[str]:
+        if not _LABEL_KEY_RE.match(self.key):
+            return None
+        return "labels.{}:*".format(self.key)
+
+    def matches(self, resource: Any) -> bool:
+        return self.key in resource.labels
+
+
+class FieldEquals(Predicate):
+    """A scalar or enum field, addressed by a dotted path, equals a value.
+
+    For example ``FieldEquals("state.code", MembershipState.Code.READY)``
+    or ``FieldEquals("resource_state.state", FeatureResourceState.State.ACTIVE)``.
+    """
+
+    def __init__(self, path: str, value: Any):
+        self.path = path
+        self.value = value
+
+    def to_filter(self) -> Optional[str]:
+        value = self.value
+        if hasattr(value, "name") and isinstance(value, int):
+            literal = value.name
+        elif isinstance(value, bool):
+            literal = "true" if value else "false"
+        elif isinstance(value, (int, float)):
+            literal = str(value)
+        else:
+            literal = _quote(str(value))
+        return "{} = {}".format(self.path, literal)
+
+    def matches(self, resource: Any) -> bool:
+        value = resource
+        for part in self.path.split("."):
+            value = getattr(value, part)
+        return value == self.value
+
+
+class TimeRange(Predicate):
+    """A timestamp field lies in ``[after, before)``.
+
+    Either bound may be omitted. Naive datetimes are taken to be UTC.
+    """
+
+    def __init__(
+        self,
+        field: str,
+        after: datetime.datetime = None,
+        before: datetime.datetime = None,
+    ):
+        if after is None and before is None:
+            raise ValueError("TimeRange needs at least one bound.")
+        self.field = field
+        self.after = _as_utc(after) if after is not None else None
+        self.before = _as_utc(before) if before is not None else None
+
+    def to_filter(self) -> Optional[str]:
+        terms = []
+        if self.after is not None:
+            terms.append(
+                '{} >= "{}"'.format(
+                    self.field, self.after.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+                )
+            )
+        if self.before is not None:
+            terms.append(
+                '{} < "{}"'.format(
+                    self.field, self.before.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+                )
+            )
+        return " AND ".join(terms)
+
+    def matches(self, resource: Any) -> bool:
+        value = getattr(resource, self.field)
+        if value is None:
+            return False
+        value = _as_utc(value)
+        if self.after is not None and value < self.after:
+            return False
+        if self.before is not None and value >= self.before:
+            return False
+        return True
+
+
+class NamePrefix(Predicate):
+    """The resource name starts with ``prefix``.
+
+    The list filters have no prefix operator, so this is always evaluated
+    locally.
+    """
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+
+    def matches(self, resource: Any) -> bool:
+        return resource.name.startswith(self.prefix)
+
+
+class Where(Predicate):
+    """An arbitrary local predicate."""
+
+    def __init__(self, function: Callable[[Any], bool], description: str = None):
+        self.function = function
+        self.description = description or getattr(function, "__name__", "where")
+
+    def matches(self, resource: Any) -> bool:
+        return bool(self.function(resource))
+
+    def __repr__(self) -> str:
+        return "Where<{}>".format(self.description)
+
+
+class And(Predicate):
+    """All operands hold."""
+
+    def __init__(self, *operands: Predicate):
+        flattened = []
+        for operand in operands:
+            flattened.extend(
+                operand.operands if isinstance(operand, And) else [operand]
+            )
+        self.operands = flattened
+
+    def to_filter(self) -> Optional[str]:
+        expressions = [operand.to_filter() for operand in self.operands]
+        if not expressions or None in expressions:
+            return None
+        return " AND ".join("({})".format(e) for e in expressions)
+
+    def matches(self, resource: Any) -> bool:
+        return all(operand.matches(resource) for operand in self.operands)
+
+
+class Or(Predicate):
+    """At least one operand holds."""
+
+    def __init__(self, *operands: Predicate):
+        self.operands = list(operands)
+
+    def to_filter(self) -> Optional[str]:
+        expressions = [operand.to_filter() for operand in self.operands]
+        if not expressions or None in expressions:
+            return None
+        return " OR ".join("({})".format(e) for e in expressions)
+
+    def matches(self, resource: Any) -> bool:
+        return any(operand.matches(resource) for operand in self.operands)
+
+
+class Not(Predicate):
+    """The operand does not hold."""
+
+    def __init__(self, operand: Predicate):
+        self.operand = operand
+
+    def to_filter(self) -> Optional[str]:
+        expression = self.operand.to_filter()
+        return "NOT ({})".format(expression) if expression else None
+
+    def matches(self, resource: Any) -> bool:
+        return not self.operand.matches(resource)
+
+
+class QueryPlan(NamedTuple):
+    """How a predicate is split between the server and the client.
+
+    Attributes:
+        filter (str): The server-side filter; empty when nothing is pushed.
+        pushed (List[Predicate]): Conjuncts expressed in ``filter``.
+        residual (List[Predicate]): Conjuncts evaluated locally.
+    """
+
+    filter: str
+    pushed: List[Predicate]
+    residual: List[Predicate]
+
+    def matches(self, resource: Any) -> bool:
+        """Evaluate the residual conjuncts against a resource."""
+        return all(predicate.matches(resource) for predicate in self.residual)
+
+    def explain(self) -> str:
+        """Return a human-readable description of the plan."""
+        lines = ["server filter: {}".format(self.filter or "<none>")]
+        lines.extend("pushed: {!r}".format(p) for p in self.pushed)
+        lines.extend("local: {!r}".format(p) for p in self.residual)
+        return "\n".join(lines)
+
+
+def plan(predicate: Optional[Predicate]) -> QueryPlan:
+    """Split a predicate into a server filter and local residual checks.
+
+    The top-level conjunction is split term by term; any other predicate
+    is pushed down whole or not at all.
+
+    Args:
+        predicate (Optional[Predicate]): The predicate, or ``None`` for all
+            resources.
+
+    Returns:
+        QueryPlan: The plan.
+    """
+    if predicate is None:
+        return QueryPlan("", [], [])
+    conjuncts = predicate.operands if isinstance(predicate, And) else [predicate]
+    pushed, residual, expressions = [], [], []
+    for conjunct in conjuncts:
+        expression = conjunct.to_filter()
+        if expression:
+            pushed.append(conjunct)
+            expressions.append(expression)
+        else:
+            residual.append(conjunct)
+    if len(expressions) == 1:
+        server_filter = expressions[0]
+    else:
+        server_filter = " AND ".join("({})".format(e) for e in expressions)
+    return QueryPlan(server_filter, pushed, residual)
+
+
+def _filtered(list_method, request, query_plan, **kwargs) -> Iterator[Any]:
+    for resource in list_method(request=request, **kwargs):
+        if query_plan.matches(resource):
+            yield resource
+
+
+def list_memberships(
+    client, parent: str, where: Predicate = None, page_size: int = 0, **kwargs
+) -> Iterator[Any]:
+    """List memberships matching ``where``, pushing down what the server can evaluate.
+
+    Args:
+        client (google.cloud.gkehub_v1.GkeHubClient): The client.
+        parent (str): ``projects/*/locations/*``.
+        where (Predicate): The predicate; ``None`` lists everything.
+        page_size (int): Passed through to the request.
+        kwargs: Passed through to ``list_memberships`` (``retry``,
+            ``timeout``, ``metadata``).
+
+    Yields:
+        google.cloud.gkehub_v1.types.Membership: Matching memberships.
+    """
+    query_plan = plan(where)
+    request = service.ListMembershipsRequest(
+        parent=parent, filter=query_plan.filter, page_size=page_size
+    )
+    return _filtered(client.list_memberships, request, query_plan, **kwargs)
+
+
+def list_features(
+    client, parent: str, where: Predicate = None, page_size: int = 0, **kwargs
+) -> Iterator[Any]:
+    """List features matching ``where``, pushing down what the server can evaluate.
+
+    Args:
+        client (google.cloud.gkehub_v1.GkeHubClient): The client.
+        parent (str): ``projects/*/locations/*``.
+        where (Predicate): The predicate; ``None`` lists everything.
+        page_size (int): Passed through to the request.
+        kwargs: Passed through to ``list_features`` (``retry``,
+            ``timeout``, ``metadata``).
+
+    Yields:
+        google.cloud.gkehub_v1.types.Feature: Matching features.
+    """
+    query_plan = plan(where)
+    request = service.ListFeaturesRequest(
+        parent=parent, filter=query_plan.filter, page_size=page_size
+    )
+    return _filtered(client.list_features, request, query_plan, **kwargs)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""A client holder that survives :func:`os.fork`.
+
+gRPC channels must not be used across a fork. Pre-forking servers
+(gunicorn, :mod:`multiprocessing`) therefore either crash or build a client
+per request. :class:`ForkSafeClient` builds the client lazily, notices when
+it is running in a different process than the one that built it, and
+builds a fresh client (and channel) once per process::
+
+    hub = ForkSafeClient(GkeHubClient)            # at import time
+    ...
+    hub.get_membership(name=name)                 # in any worker
+
+It works with both ``google.cloud.gkehub_v1.GkeHubClient`` and
+``google.cloud.gkehub_v1beta1.GkeHubMembershipServiceClient``.
+"""
+
+import os
+import threading
+from typing import Any, Callable, Optional
+import weakref
+
+_holders = weakref.WeakSet()  # type: weakref.WeakSet
+
+
+def _after_fork_in_child() -> None:
+    for holder in list(_holders):
+        holder._reset()
+
+
+if hasattr(os, "register_at_fork"):  # pragma: NO COVER
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class ForkSafeClient:
+    """Lazily builds one client per process.
+
+    Attribute access is forwarded to the client of the current process, so
+    the holder can be used wherever the client would be.
+    """
+
+    def __init__(self, factory: Callable[..., Any], *args, **kwargs):
+        """Instantiates the holder.
+
+        Args:
+            factory (Callable[..., Any]): The client class, or any callable
+                returning a client.
+            args: Positional arguments for ``factory``.
+            kwargs: Keyword arguments for ``factory``.
+        """
+        self._factory = factory
+        self._args = args
+        self._kwargs = kwargs
+        self._reset()
+        _holders.add(self)
+
+    def _reset(self) -> None:
+        # Drop, without closing, anything inherited from the parent: closing
+        # the parent's channel from the child is not safe either.
+        self._lock = threading.Lock()
+        self._client = None  # type: Optional[Any]
+        self._pid = None  # type: Optional[int]
+
+    def get(self) -> Any:
+        """Returns the client for the current process, building it if needed."""
+        pid = os.getpid()
+        client = self._client
+        if client is not None and self._pid == pid:
+            return client
+        if self._pid is not None and self._pid != pid:
+            # Forked without the at-fork hook (e.g. Python < 3.7).
+            self._reset()
+        with self._lock:
+            if self._client is None:
+                self._client = self._factory(*self._args, **self._kwargs)
+                self._pid = pid
+            return self._client
+
+    @property
+    def pid(self) -> Optional[int]:
+        """Optional[int]: The process that built the current client, if any."""
+        return self._pid
+
+    def close(self) -> None:
+        """Closes the client of the current process, if one was built."""
+        with self._lock:
+            client, self._client, self._pid = self._client, None, None
+        if client is not None:
+            client.transport.close()
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+    def __enter__(self) -> "ForkSafeClient":
+        return self
+
+    def __exit__(self, type, value, traceback) -> None:
+        self.close()
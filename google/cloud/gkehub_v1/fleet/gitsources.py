@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Grouping of memberships by the git source they sync from.
+
+:class:`GitSourceIndex` reads each membership's ``configmanagement``
+``GitConfig`` from ``membership_specs``, normalizes it into a
+:class:`GitSource`, and joins it with the ``SyncState`` tokens reported in
+``membership_states``. The blast radius of a broken repository, or the
+clusters that have not yet synced its head, are then lookups::
+
+    index = GitSourceIndex()
+    index.update_from_feature(client.get_feature(name=configmanagement))
+    for source, failing in index.failing_sources().items():
+        print(source.repo, len(index.members(source)), len(failing))
+"""
+
+import collections
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Set
+
+from google.cloud.gkehub_v1 import configmanagement_v1
+from google.cloud.gkehub_v1.types import feature as gcg_feature
+
+from . import _states
+from .interning import InternTable
+
+_SyncCode = configmanagement_v1.SyncState.SyncCode
+FAILING_CODES = frozenset(
+    (_SyncCode.ERROR, _SyncCode.UNAUTHORIZED, _SyncCode.UNREACHABLE)
+)
+
+_SCP_LIKE = re.compile(r"^(?P<user>[\w.-]+@)(?P<host>[\w.-]+):(?P<path>.*)$")
+_URL = re.compile(
+    r"^(?P<scheme>[a-z][\w+.-]*://)(?P<user>[^@/]*@)?(?P<host>[^/]*)", re.IGNORECASE
+)
+
+
+class GitSource(NamedTuple):
+    """A normalized ``GitConfig``; memberships with equal sources sync alike.
+
+    Attributes:
+        repo (str): ``sync_repo`` with the host lower-cased and any trailing
+            ``/`` or ``.git`` removed.
+        branch (str): ``sync_branch``, ``master`` if unset.
+        policy_dir (str): ``policy_dir`` without leading ``./`` or ``/`` and
+            trailing ``/``; empty for the repository root.
+        sync_rev (str): ``sync_rev``, ``HEAD`` if unset.
+        secret_type (str): ``secret_type``, lower-cased.
+        https_proxy (str): ``https_proxy`` without a trailing ``/``.
+    """
+
+    repo: str
+    branch: str
+    policy_dir: str
+    sync_rev: str
+    secret_type: str
+    https_proxy: str
+
+
+def _normalize_repo(repo: str) -> str:
+    repo = repo.strip().rstrip("/")
+    if repo.endswith(".git"):
+        repo = repo[: -len(".git")]
+    match = _SCP_LIKE.match(repo)
+    if match:
+        return "{}{}:{}".format(
+            match.group("user"), match.group("host").lower(), match.group("path")
+        )
+    match = _URL.match(repo)
+    if match:
+        return "{}{}{}{}".format(
+            match.group("scheme").lower(),
+            match.group("user") or "",
+            match.group("host").lower(),
+            repo[match.end() :],
+        )
+    return repo
+
+
+def _normalize_dir(policy_dir: str) -> str:
+    policy_dir = policy_dir.strip()
+    while policy_dir.startswith("./"):
+        policy_dir = policy_dir[2:]
+    policy_dir = policy_dir.strip("/")
+    return "" if policy_dir == "." else policy_dir
+
+
+def normalize_git_source(git: Any) -> GitSource:
+    """Normalize a ``configmanagement_v1.GitConfig`` (proto-plus or raw).
+
+    Returns:
+        GitSource: The source; equal for configs that differ only in
+            defaults, letter case of the host, or trailing separators.
+    """
+    return GitSource(
+        _normalize_repo(git.sync_repo),
+        git.sync_branch.strip() or "master",
+        _normalize_dir(git.policy_dir),
+        git.sync_rev.strip() or "HEAD",
+        git.secret_type.strip().lower(),
+        git.https_proxy.strip().rstrip("/"),
+    )
+
+
+def _spec_source(spec: Any) -> Optional[GitSource]:
+    if spec is None:
+        return None
+    if isinstance(spec, gcg_feature.MembershipFeatureSpec):
+        pb = gcg_feature.MembershipFeatureSpec.pb(spec)
+        if not pb.HasField("configmanagement"):
+            return None
+        pb = pb.configmanagement
+    elif isinstance(spec, configmanagement_v1.MembershipSpec):
+        pb = configmanagement_v1.MembershipSpec.pb(spec)
+    else:
+        pb = spec
+    if not pb.HasField("config_sync") or not pb.config_sync.HasField("git"):
+        return None
+    return normalize_git_source(pb.config_sync.git)
+
+
+class _Group:
+    __slots__ = ("members", "by_sync_token", "source_tokens", "failing")
+
+    def __init__(self):
+        self.members: Set[str] = set()
+        self.by_sync_token: Dict[str, Set[str]] = {}
+        self.source_tokens = collections.Counter()
+        self.failing: Set[str] = set()
+
+
+class GitSourceIndex:
+    """Memberships grouped by :class:`GitSource`, with their sync tokens.
+
+    Specs and states are updated independently, as they arrive; each update
+    touches only the groups of that membership.
+    """
+
+    def __init__(self, intern_table: InternTable = None):
+        """Instantiates the index.
+
+        Args:
+            intern_table (InternTable): Used to share membership names and
+                tokens. A private table is created if omitted.
+        """
+        self._intern = intern_table if intern_table is not None else InternTable()
+        self._sources: Dict[str, GitSource] = {}
+        self._groups: Dict[GitSource, _Group] = {}
+        # name -> (source_token, sync_token, failing)
+        self._states: Dict[str, tuple] = {}
+        self._heads: Dict[GitSource, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._sources)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._sources
+
+    def _detach(self, name: str) -> None:
+        source = self._sources.get(name)
+        if source is None:
+            return
+        group = self._groups[source]
+        source_token, sync_token, _ = self._states.get(name, ("", "", False))
+        group.members.discard(name)
+        group.failing.discard(name)
+        synced = group.by_sync_token[sync_token]
+        synced.discard(name)
+        if not synced:
+            del group.by_sync_token[sync_token]
+        if source_token:
+            group.source_tokens[source_token] -= 1
+            if not group.source_tokens[source_token]:
+                del group.source_tokens[source_token]
+        if not group.members:
+            del self._groups[source]
+
+    def _attach(self, name: str) -> None:
+        source = self._sources.get(name)
+        if source is None:
+            return
+        group = self._groups.get(source)
+        if group is None:
+            group = self._groups[source] = _Group()
+        source_token, sync_token, failing = self._states.get(name, ("", "", False))
+        group.members.add(name)
+        group.by_sync_token.setdefault(sync_token, set()).add(name)
+        if source_token:
+            group.source_tokens[source_token] += 1
+        if failing:
+            group.failing.add(name)
+
+    def update_spec(self, name: str, spec: Any) -> None:
+        """Sets the git source of one membership.
+
+        Args:
+            name (str): The membership name (the ``membership_specs`` key).
+            spec (Any): Its ``MembershipFeatureSpec`` or
+                ``configmanagement_v1.MembershipSpec``, or ``None``. Specs
+                without a git source remove the membership from its group.
+        """
+        source = _spec_source(spec)
+        if self._sources.get(name) == source:
+            return
+        self._detach(name)
+        if source is None:
+            del self._sources[name]
+            return
+        self._sources[self._intern.intern_name(name)] = source
+        self._attach(name)
+
+    def update_state(self, name: str, state: Any) -> None:
+        """Sets the sync progress of one membership.
+
+        Args:
+            name (str): The membership name (the ``membership_states`` key).
+            state (Any): Its ``MembershipFeatureState`` or
+                ``configmanagement_v1.MembershipState``, or ``None``.
+        """
+        pb = _states.configmanagement_pb(state)
+        if pb is None:
+            value = None
+        else:
+            sync_state = pb.config_sync_state.sync_state
+            intern = self._intern.intern
+            value = (
+                intern(sync_state.source_token),
+                intern(sync_state.sync_token),
+                sync_state.code in FAILING_CODES or len(sync_state.errors) > 0,
+            )
+        if self._states.get(name) == value:
+            return
+        self._detach(name)
+        if value is None:
+            del self._states[name]
+        else:
+            self._states[self._intern.intern_name(name)] = value
+        self._attach(name)
+
+    def remove(self, name: str) -> bool:
+        """Removes a membership; returns whether it had a git source."""
+        self._detach(name)
+        self._states.pop(name, None)
+        return self._sources.pop(name, None) is not None
+
+    def update_from_feature(self, feature: Any, remove_missing: bool = True) -> None:
+        """Indexes the specs and states of a ``configmanagement`` Feature.
+
+        Args:
+            feature (google.cloud.gkehub_v1.types.Feature): The Feature.
+            remove_missing (bool): Also drop memberships that appear in
+                neither ``membership_specs`` nor ``membership_states``.
+        """
+        specs, states = feature.membership_specs, feature.membership_states
+        for name, spec in specs.items():
+            self.update_spec(name, spec)
+        for name, state in states.items():
+            self.update_state(name, state)
+        if remove_missing:
+            known = set(self._sources) | set(self._states)
+            for name in known:
+                if name not in specs and name not in states:
+                    self.remove(name)
+                elif name not in specs:
+                    self.update_spec(name, None)
+                elif name not in states:
+                    self.update_state(name, None)
+
+    def sources(self) -> List[GitSource]:
+        """Returns every source with at least one membership, sorted."""
+        return sorted(self._groups)
+
+    def source_of(self, name: str) -> Optional[GitSource]:
+        """Returns the git source of a membership, if it has one."""
+        return self._sources.get(name)
+
+    def members(self, source: GitSource) -> Set[str]:
+        """Returns the memberships syncing from ``source``."""
+        group = self._groups.get(source)
+        return set(group.members) if group is not None else set()
+
+    def blast_radius(self, name: str) -> Set[str]:
+        """Returns every membership sharing the git source of ``name``."""
+        source = self._sources.get(name)
+        return self.members(source) if source is not None else set()
+
+    def set_head(self, source: GitSource, token: Optional[str]) -> None:
+        """Declares the current head commit of a source.
+
+        Args:
+            source (GitSource): The source.
+            token (Optional[str]): The commit, as reported in
+                ``SyncState.source_token``; ``None`` reverts to the
+                inferred head.
+        """
+        if token is None:
+            self._heads.pop(source, None)
+        else:
+            self._heads[source] = token
+
+    def head(self, source: GitSource) -> Optional[str]:
+        """Returns the head commit of a source.
+
+        This is the token given to :meth:`set_head` or, failing that, the
+        ``source_token`` reported by the most memberships of the source.
+        """
+        if source in self._heads:
+            return self._heads[source]
+        group = self._groups.get(source)
+        if group is None or not group.source_tokens:
+            return None
+        return group.source_tokens.most_common(1)[0][0]
+
+    def synced(self, source: GitSource) -> Set[str]:
+        """Returns the memberships whose ``sync_token`` is the head."""
+        group = self._groups.get(source)
+        head = self.head(source)
+        if group is None or head is None:
+            return set()
+        return set(group.by_sync_token.get(head, ()))
+
+    def behind_count(self, source: GitSource) -> int:
+        """Returns how many memberships of a source have not synced its head."""
+        group = self._groups.get(source)
+        if group is None:
+            return 0
+        head = self.head(source)
+        return len(group.members) - len(group.by_sync_token.get(head, ()))
+
+    def behind(self, source: GitSource) -> Set[str]:
+        """Returns the memberships that have not synced the head.
+
+        Memberships that report no state count as behind.
+        """
+        group = self._groups.get(source)
+        if group is None:
+            return set()
+        return group.members - group.by_sync_token.get(self.head(source), set())
+
+    def failing(self, source: GitSource) -> Set[str]:
+        """Returns the memberships of a source whose sync is failing.
+
+        A sync fails when its code is one of :data:`FAILING_CODES` or it
+        reports errors.
+        """
+        group = self._groups.get(source)
+        return set(group.failing) if group is not None else set()
+
+    def failing_sources(self) -> Dict[GitSource, Set[str]]:
+        """Returns each source with failing memberships, with those memberships."""
+        return {
+            source: set(group.failing)
+            for source, group in self._groups.items()
+            if group.failing
+        }
@@ -0,0 +1,475 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Bulk registration of memberships from a cluster inventory.
+
+An inventory is a CSV, YAML or NDJSON file with one record per cluster::
+
+    parent,resource_link,external_id,issuer,labels
+    projects/p/locations/global,//container.googleapis.com/projects/p/locations/us-central1/clusters/a,,,env=prod;team=x
+
+Recognized keys are ``parent``, ``membership_id`` (derived from the
+cluster when absent), ``resource_link`` (a GKE cluster) or
+``membership_cr_manifest`` (any other Kubernetes cluster),
+``external_id``, ``issuer`` (Workload Identity) and ``labels``.
+
+:class:`MembershipImporter` sends ``create_membership`` calls
+concurrently under a :class:`TokenBucket`, waits on the operations
+together, and records every outcome in a :class:`Journal`. Each request
+has a ``request_id`` derived from its content, so a run resumed after a
+crash skips what is done and safely retries what was in flight::
+
+    importer = MembershipImporter(client, journal=Journal("import.ndjson"))
+    report = importer.run(read_inventory("clusters.csv"))
+
+YAML inventories require PyYAML.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import uuid
+from concurrent import futures
+from typing import IO, Any, Dict, Iterable, Iterator, List, Mapping, Optional, Union
+
+from google.api_core import exceptions as core_exceptions
+from google.cloud.gkehub_v1.types import membership as gcg_membership
+from google.cloud.gkehub_v1.types import service
+
+from .ratelimit import TokenBucket
+
+try:
+    import yaml  # type: ignore
+except ImportError:  # pragma: NO COVER
+    yaml = None
+
+_FORMATS = {
+    ".csv": "csv",
+    ".yaml": "yaml",
+    ".yml": "yaml",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".json": "ndjson",
+}
+_MEMBERSHIP_ID = re.compile(r"^[a-z0-9]([-a-z0-9]*[a-z0-9])?$")
+_REQUEST_NAMESPACE = uuid.UUID("6f1d3a4e-4a55-4a38-9d8e-2f0c8e8a1b6d")
+
+# Journal statuses.
+STARTED = "started"
+CREATED = "created"
+EXISTS = "exists"
+FAILED = "failed"
+_FINISHED = frozenset((CREATED, EXISTS))
+
+
+def _parse_labels(labels: Any) -> Dict[str, str]:
+    if not labels:
+        return {}
+    if isinstance(labels, Mapping):
+        return {str(k): str(v) for k, v in labels.items()}
+    result = {}
+    for item in str(labels).split(";"):
+        if item.strip():
+            key, _, value = item.partition("=")
+            result[key.strip()] = value.strip()
+    return result
+
+
+def read_inventory(
+    source: Union[str, IO[str]], format: str = None
+) -> Iterator[Dict[str, Any]]:
+    """Read cluster records from an inventory.
+
+    Args:
+        source (Union[str, IO[str]]): A path or an open text file.
+        format (str): ``csv``, ``yaml`` or ``ndjson``; inferred from the
+            file extension by default.
+
+    Yields:
+        Dict[str, Any]: One record per cluster, with ``labels`` parsed into
+            a dict and empty values dropped.
+
+    Raises:
+        ValueError: If the format is unknown.
+        ImportError: For YAML inventories without PyYAML installed.
+    """
+    if isinstance(source, str):
+        if format is None:
+            format = _FORMATS.get(os.path.splitext(source)[1].lower())
+        with io.open(source, encoding="utf-8", newline="") as f:
+            yield from read_inventory(f, format)
+        return
+    if format not in ("csv", "yaml", "ndjson"):
+        raise ValueError("Unknown inventory format {!r}.".format(format))
+    if format == "csv":
+        rows: Iterable[Any] = csv.DictReader(source)
+    elif format == "ndjson":
+        rows = (json.loads(line) for line in source if line.strip())
+    else:
+        if yaml is None:
+            raise ImportError("Reading YAML inventories requires PyYAML.")
+        rows = (
+            row
+            for document in yaml.safe_load_all(source)
+            if document
+            for row in (document if isinstance(document, list) else [document])
+        )
+    for row in rows:
+        record = {k: v for k, v in row.items() if v not in (None, "")}
+        if "labels" in record:
+            record["labels"] = _parse_labels(record["labels"])
+        yield record
+
+
+def _slug(value: str) -> str:
+    value = re.sub(r"[^a-z0-9-]+", "-", value.lower()).strip("-")
+    return re.sub(r"-{2,}", "-", value)
+
+
+def membership_id_for(record: Mapping[str, Any]) -> str:
+    """Derive a stable ``membership_id`` for a record.
+
+    An explicit ``membership_id`` is used as is. Otherwise the id is the
+    cluster name from ``resource_link`` (or ``external_id``) followed by a
+    short hash of the cluster's identity, so equal names in different
+    projects or regions do not collide.
+
+    Raises:
+        ValueError: If the id is not a valid RFC 1123 label or the record
+            identifies no cluster.
+    """
+    membership_id = record.get("membership_id")
+    if membership_id is None:
+        identity = (
+            record.get("resource_link")
+            or record.get("external_id")
+            or record.get("membership_cr_manifest")
+        )
+        if not identity:
+            raise ValueError("Record identifies no cluster: {!r}".format(record))
+        digest = hashlib.sha256(identity.encode("utf-8")).hexdigest()[:8]
+        base = identity.rstrip("/").rsplit("/", 1)[-1]
+        if "\n" in identity or not _slug(base):
+            base = "cluster"
+        membership_id = "{}-{}".format(_slug(base)[:54].rstrip("-"), digest)
+    if len(membership_id) > 63 or not _MEMBERSHIP_ID.match(membership_id):
+        raise ValueError("Invalid membership_id {!r}.".format(membership_id))
+    return membership_id
+
+
+def build_request(record: Mapping[str, Any]) -> service.CreateMembershipRequest:
+    """Build the ``CreateMembershipRequest`` for a record.
+
+    The ``request_id`` is a UUID derived from the complete request, so
+    rebuilding the request for the same record yields the same id.
+    """
+    if "parent" not in record:
+        raise ValueError("Record has no parent: {!r}".format(record))
+    resource = gcg_membership.Membership(
+        labels=record.get("labels", {}), external_id=record.get("external_id", "")
+    )
+    if "resource_link" in record:
+        resource.endpoint.gke_cluster.resource_link = record["resource_link"]
+    elif "membership_cr_manifest" in record:
+        resource.endpoint.kubernetes_resource.membership_cr_manifest = record[
+            "membership_cr_manifest"
+        ]
+    if "issuer" in record:
+        resource.authority.issuer = record["issuer"]
+    request = service.CreateMembershipRequest(
+        parent=record["parent"],
+        membership_id=membership_id_for(record),
+        resource=resource,
+    )
+    blob = service.CreateMembershipRequest.pb(request).SerializeToString(
+        deterministic=True
+    )
+    request.request_id = str(
+        uuid.uuid5(_REQUEST_NAMESPACE, hashlib.sha256(blob).hexdigest())
+    )
+    return request
+
+
+def _name(request: service.CreateMembershipRequest) -> str:
+    return "{}/memberships/{}".format(request.parent, request.membership_id)
+
+
+class Journal:
+    """An append-only NDJSON log of import progress.
+
+    Each line records a membership name, its ``request_id`` and a status:
+    ``started``, ``created``, ``exists`` or ``failed``. Reopening the file
+    restores the latest status of every membership.
+    """
+
+    def __init__(self, path: str, fsync: bool = True):
+        """Opens or creates the journal.
+
+        Args:
+            path (str): The journal file.
+            fsync (bool): Flush every line to disk before continuing.
+        """
+        self.path = path
+        self._fsync = fsync
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, str]] = {}
+        torn = False
+        if os.path.exists(path):
+            with io.open(path, encoding="utf-8") as f:
+                for line in f:
+                    torn = not line.endswith("\n")
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line torn by a crash mid-write.
+                        continue
+                    self._entries[entry["membership"]] = entry
+        self._file = io.open(path, "a", encoding="utf-8")
+        if torn:
+            self._file.write("\n")
+
+    def status(self, name: str) -> Optional[str]:
+        """Returns the latest status of a membership, if any."""
+        entry = self._entries.get(name)
+        return entry["status"] if entry is not None else None
+
+    def finished(self, name: str) -> bool:
+        """Returns whether a membership was created or found to exist."""
+        return self.status(name) in _FINISHED
+
+    def record(
+        self, name: str, request_id: str, status: str, error: str = None
+    ) -> None:
+        """Appends an entry."""
+        entry = {"membership": name, "request_id": request_id, "status": status}
+        if error is not None:
+            entry["error"] = error
+        with self._lock:
+            self._entries[name] = entry
+            self._file.write(json.dumps(entry, sort_keys=True) + "\n")
+            self._file.flush()
+            if self._fsync:
+                os.fsync(self._file.fileno())
+
+    def entries(self) -> Dict[str, Dict[str, str]]:
+        """Returns the latest entry of every membership."""
+        with self._lock:
+            return dict(self._entries)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "Journal":
+        return self
+
+    def __exit__(self, type, value, traceback) -> None:
+        self.close()
+
+
+class ImportReport:
+    """The outcome of an import.
+
+    Attributes:
+        created (List[str]): Memberships created by this run.
+        existing (List[str]): Memberships that already existed.
+        skipped (List[str]): Memberships the journal marked as finished.
+        failed (Dict[str, Exception]): Memberships that could not be
+            created, including invalid records keyed by their position.
+    """
+
+    def __init__(self):
+        self.created: List[str] = []
+        self.existing: List[str] = []
+        self.skipped: List[str] = []
+        self.failed: Dict[str, Exception] = {}
+
+    @property
+    def ok(self) -> bool:
+        """bool: Whether no membership failed."""
+        return not self.failed
+
+
+class MembershipImporter:
+    """Creates memberships in bulk, concurrently and resumably."""
+
+    def __init__(
+        self,
+        client: Any,
+        journal: Journal = None,
+        rate: float = 10.0,
+        burst: float = None,
+        max_concurrency: int = 16,
+        max_waiting: int = 256,
+        operation_timeout: float = None,
+        **kwargs
+    ):
+        """Instantiates the importer.
+
+        Args:
+            client (google.cloud.gkehub_v1.GkeHubClient): The client.
+            journal (Journal): Records progress for resumption; progress is
+                only kept in memory if omitted.
+            rate (float): The most ``create_membership`` calls per second.
+            burst (float): The largest burst of calls; see
+                :class:`TokenBucket`.
+            max_concurrency (int): The most ``create_membership`` calls in
+                flight.
+            max_waiting (int): The most operations waited on at once.
+            operation_timeout (float): The longest wait, in seconds, for
+                each operation.
+            kwargs: Passed to ``create_membership`` (``retry``,
+                ``timeout``, ``metadata``).
+        """
+        if max_concurrency < 1 or max_waiting < 1:
+            raise ValueError("max_concurrency and max_waiting must be positive.")
+        self._client = client
+        self._journal = journal
+        self._limiter = TokenBucket(rate, burst)
+        self._max_concurrency = max_concurrency
+        self._max_waiting = max_waiting
+        self._operation_timeout = operation_timeout
+        self._kwargs = kwargs
+
+    def run(self, records: Iterable[Mapping[str, Any]]) -> ImportReport:
+        """Imports every record.
+
+        Records whose membership the journal marks as finished are
+        skipped; duplicates within ``records`` are imported once.
+
+        Args:
+            records (Iterable[Mapping[str, Any]]): Inventory records, e.g.
+                from :func:`read_inventory`.
+
+        Returns:
+            ImportReport: The outcome.
+        """
+        report = ImportReport()
+        lock = threading.Lock()
+        seen = set()
+        calls = futures.ThreadPoolExecutor(max_workers=self._max_concurrency)
+        waits = futures.ThreadPoolExecutor(max_workers=self._max_waiting)
+        pending = set()
+        try:
+            for position, record in enumerate(records):
+                try:
+                    request = build_request(record)
+                except ValueError as exc:
+                    report.failed["#{}".format(position)] = exc
+                    continue
+                name = _name(request)
+                if name in seen:
+                    continue
+                seen.add(name)
+                if self._journal is not None and self._journal.finished(name):
+                    report.skipped.append(name)
+                    continue
+                pending.add(
+                    calls.submit(self._create, request, waits, report, pending, lock)
+                )
+                if len(pending) >= self._max_concurrency + self._max_waiting:
+                    self._drain(pending, lock, futures.FIRST_COMPLETED)
+            self._drain(pending, lock, futures.ALL_COMPLETED)
+        finally:
+            calls.shutdown(wait=True)
+            waits.shutdown(wait=True)
+        return report
+
+    @staticmethod
+    def _drain(pending: set, lock: threading.Lock, return_when: str) -> None:
+        while True:
+            with lock:
+                outstanding = set(pending)
+            if not outstanding:
+                return
+            done, _ = futures.wait(outstanding, return_when=return_when)
+            with lock:
+                pending.difference_update(done)
+            for future in done:
+                # Outcomes are recorded by the tasks; surface anything else.
+                future.result()
+            if return_when == futures.FIRST_COMPLETED:
+                return
+
+    def _record(self, name: str, request_id: str, status: str, error=None) -> None:
+        if self._journal is not None:
+            self._journal.record(
+                name, request_id, status, None if error is None else repr(error)
+            )
+
+    def _create(
+        self,
+        request: service.CreateMembershipRequest,
+        waits: futures.Executor,
+        report: ImportReport,
+        pending: set,
+        lock: threading.Lock,
+    ) -> None:
+        name = _name(request)
+        try:
+            self._limiter.acquire()
+            self._record(name, request.request_id, STARTED)
+            operation = self._client.create_membership(request=request, **self._kwargs)
+        except core_exceptions.AlreadyExists:
+            self._finish(name, request.request_id, report, lock, EXISTS)
+            return
+        except Exception as exc:
+            self._finish(name, request.request_id, report, lock, FAILED, exc)
+            return
+        with lock:
+            pending.add(waits.submit(self._wait, operation, request, report, lock))
+
+    def _wait(
+        self,
+        operation: Any,
+        request: service.CreateMembershipRequest,
+        report: ImportReport,
+        lock: threading.Lock,
+    ) -> None:
+        name = _name(request)
+        try:
+            operation.result(timeout=self._operation_timeout)
+        except core_exceptions.AlreadyExists:
+            self._finish(name, request.request_id, report, lock, EXISTS)
+        except Exception as exc:
+            self._finish(name, request.request_id, report, lock, FAILED, exc)
+        else:
+            self._finish(name, request.request_id, report, lock, CREATED)
+
+    def _finish(
+        self,
+        name: str,
+        request_id: str,
+        report: ImportReport,
+        lock: threading.Lock,
+        status: str,
+        error: Exception = None,
+    ) -> None:
+        try:
+            self._record(name, request_id, status, error)
+        except Exception as exc:
+            # An outcome missing from the journal is not safe to skip on
+            # resume, so it is reported as a failure.
+            status, error = FAILED, exc
+        with lock:
+            if status == CREATED:
+                report.created.append(name)
+            elif status == EXISTS:
+                report.existing.append(name)
+            else:
+                report.failed[name] = error
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""String interning for resource names and labels read from list pages.
+
+Protobuf messages own their string storage, so interning cannot shrink a
+``Membership`` in place. It does dedupe the Python-side copies that fleet
+helpers keep around (indexes, snapshots, caches), where the same project,
+location, label keys and label values otherwise repeat once per resource.
+"""
+
+import sys
+import threading
+from typing import Dict, Iterable, Iterator, Mapping, Optional, Tuple
+
+DEFAULT_MAX_SIZE = 1 << 16
+
+
+class InternTable:
+    """A bounded table of canonical string instances.
+
+    Strings are admitted until ``max_size`` distinct values are held.
+    After that, unseen values are returned as-is rather than evicting
+    existing entries, so the hot set (project ids, locations, common label
+    keys and values) is never churned out by a long tail of unique names.
+    Whole resource names are held in a second table with the same bound, so
+    they cannot crowd out the shared strings either.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE):
+        """Instantiate the table.
+
+        Args:
+            max_size (int): The maximum number of distinct strings held.
+        """
+        if max_size <= 0:
+            raise ValueError("max_size must be positive")
+        self._max_size = max_size
+        self._table = {}  # type: Dict[str, str]
+        self._names = {}  # type: Dict[str, str]
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._rejected = 0
+        self._saved_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def __contains__(self, value: str) -> bool:
+        return value in self._table
+
+    @property
+    def max_size(self) -> int:
+        """int: The maximum number of distinct strings held."""
+        return self._max_size
+
+    def intern(self, value: str) -> str:
+        """Return the canonical instance of ``value``.
+
+        Args:
+            value (str): The string to intern.
+
+        Returns:
+            str: An equal string, shared with every previous caller that
+                interned the same value while it was admitted.
+        """
+        return self._intern(self._table, value)
+
+    def _intern(self, table: Dict[str, str], value: str) -> str:
+        with self._lock:
+            canonical = table.get(value)
+            if canonical is not None:
+                self._hits += 1
+                if canonical is not value:
+                    self._saved_bytes += sys.getsizeof(value)
+                return canonical
+            if len(table) >= self._max_size:
+                self._rejected += 1
+                return value
+            self._misses += 1
+            table[value] = value
+            return value
+
+    def name_components(self, name: str) -> Tuple[str, ...]:
+        """Split a resource name into segments, interning the shared ones.
+
+        Collection names and parent ids such as the project and location
+        repeat across a fleet and are interned. The final segment, the
+        resource's own id, is unique and is returned as-is so that it does
+        not take up a slot of the bounded table.
+
+        Args:
+            name (str): A resource name such as
+                ``projects/p/locations/l/memberships/m``.
+
+        Returns:
+            Tuple[str, ...]: The ``/``-separated segments.
+        """
+        parts = name.split("/")
+        intern = self.intern
+        return tuple(intern(part) for part in parts[:-1]) + (parts[-1],)
+
+    def intern_name(self, name: str) -> str:
+        """Return the canonical instance of a resource name.
+
+        Names are held apart from the strings interned by :meth:`intern`, so
+        a fleet of 100k memberships does not crowd out the label keys and
+        values that repeat.
+
+        Args:
+            name (str): A resource name.
+
+        Returns:
+            str: An equal string, shared with every previous caller that
+                interned the same name while it was admitted.
+        """
+        return self._intern(self._names, name)
+
+    def intern_labels(self, labels: Mapping[str, str]) -> Dict[str, str]:
+        """Copy a label map with interned keys and values.
+
+        Args:
+            labels (Mapping[str, str]): The labels, e.g. ``Membership.labels``.
+
+        Returns:
+            Dict[str, str]: A plain dictionary sharing its strings with
+                every other map interned through this table.
+        """
+        intern = self.intern
+        return {intern(key): intern(value) for key, value in labels.items()}
+
+    def stats(self) -> Dict[str, int]:
+        """Return counters describing how effective the table has been.
+
+        Returns:
+            Dict[str, int]: ``size``, ``names``, ``hits``, ``misses``,
+                ``rejected`` and ``saved_bytes``, the total size of the
+                duplicate strings that callers could drop in favour of a
+                canonical instance.
+        """
+        with self._lock:
+            return {
+                "size": len(self._table),
+                "names": len(self._names),
+                "hits": self._hits,
+                "misses": self._misses,
+                "rejected": self._rejected,
+                "saved_bytes": self._saved_bytes,
+            }
+
+    def clear(self) -> None:
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._table.clear()
+            self._names.clear()
+            self._hits = self._misses = self._rejected = self._saved_bytes = 0
+
+
+_default_table: Optional[InternTable] = None
+_default_table_lock = threading.Lock()
+
+
+def default_intern_table() -> InternTable:
+    """Return the process-wide table shared by the fleet helpers.
+
+    Returns:
+        InternTable: The shared table, created on first use.
+    """
+    global _default_table
+    if _default_table is None:
+        with _default_table_lock:
+            if _default_table is None:
+                _default_table = InternTable()
+    return _default_table
+
+
+def iter_interned_memberships(
+    memberships: Iterable,
+    table: InternTable = None,
+) -> Iterator[Tuple[str, Dict[str, str]]]:
+    """Stream ``(name, labels)`` pairs with interned strings.
+
+    Args:
+        memberships (Iterable[google.cloud.gkehub_v1.types.Membership]):
+            Memberships to read, typically a
+            :class:`~google.cloud.gkehub_v1.services.gke_hub.pagers.ListMembershipsPager`
+            or a :class:`~google.cloud.gkehub_v1.fleet.paging.Listing`.
+            Any message with ``name`` and ``labels`` fields works.
+        table (InternTable): The table to intern through. Defaults to
+            :func:`default_intern_table`.
+
+    Yields:
+        Tuple[str, Dict[str, str]]: The interned name and labels of each
+            membership, in listing order.
+    """
+    if table is None:
+        table = default_intern_table()
+    for resource in memberships:
+        yield table.intern_name(resource.name), table.intern_labels(resource.labels)
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Joining a Feature's per-membership maps with a membership listing.
+
+``Feature.membership_specs`` and ``Feature.membership_states`` are keyed by
+``projects/{project_number}/locations/{l}/memberships/{m}`` while
+``list_memberships`` usually reports the project id. The helpers here learn
+the number/id correspondence once and reuse it for every later join.
+"""
+
+from collections import OrderedDict
+import json
+import os
+import threading
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from google.cloud.gkehub_v1.types import feature as gcg_feature
+from google.cloud.gkehub_v1.types import membership as gcg_membership
+
+from . import _files
+from .names import parse_membership_path
+
+
+class ProjectAliasCache:
+    """A bounded, optionally persistent map between project numbers and ids.
+
+    Once ``max_size`` pairs are held the oldest entry is evicted; learning
+    a pair again or looking it up with :meth:`project_id` refreshes it.
+    """
+
+    def __init__(self, max_size: int = 10000, path: str = None):
+        """Instantiate the cache.
+
+        Args:
+            max_size (int): The maximum number of number/id pairs held.
+            path (str): A JSON file to load entries from, and that
+                :meth:`save` writes to. A missing file is not an error.
+        """
+        if max_size <= 0:
+            raise ValueError("max_size must be positive")
+        self._max_size = max_size
+        self._path = path
+        self._by_number = OrderedDict()  # type: OrderedDict[str, str]
+        self._by_id = {}  # type: Dict[str, str]
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self._by_number)
+
+    def learn(self, project_number: str, project_id: str) -> None:
+        """Record that ``project_number`` and ``project_id`` name one project."""
+        project_number, project_id = str(project_number), str(project_id)
+        if project_number == project_id:
+            return
+        with self._lock:
+            previous = self._by_number.pop(project_number, None)
+            if previous is not None:
+                self._by_id.pop(previous, None)
+            stale = self._by_id.pop(project_id, None)
+            if stale is not None:
+                self._by_number.pop(stale, None)
+            self._by_number[project_number] = project_id
+            self._by_id[project_id] = project_number
+            while len(self._by_number) > self._max_size:
+                _, evicted = self._by_number.popitem(last=False)
+                self._by_id.pop(evicted, None)
+
+    def project_id(self, project_number: str) -> Optional[str]:
+        """Return the project id for a number, or ``None`` if unknown."""
+        with self._lock:
+            project_id = self._by_number.get(project_number)
+            if project_id is not None:
+                self._by_number.move_to_end(project_number)
+            return project_id
+
+    def project_number(self, project_id: str) -> Optional[str]:
+        """Return the project number for an id, or ``None`` if unknown."""
+        return self._by_id.get(project_id)
+
+    def canonical(self, project: str) -> str:
+        """Return the project number for ``project`` when it is known.
+
+        Args:
+            project (str): A project id or number.
+
+        Returns:
+            str: The project number if ``project`` is a known id, otherwise
+                ``project`` unchanged.
+        """
+        return self._by_id.get(project, project)
+
+    def load(self, path: str) -> None:
+        """Merge entries from a JSON file written by :meth:`save`."""
+        with open(path) as fh:
+            entries = json.load(fh)
+        for project_number, project_id in entries.items():
+            self.learn(project_number, project_id)
+
+    def save(self, path: str = None) -> None:
+        """Atomically write the entries to a JSON file.
+
+        Args:
+            path (str): Destination; defaults to the path given at
+                construction time.
+
+        Raises:
+            ValueError: If no path was given here or at construction time.
+        """
+        path = path or self._path
+        if not path:
+            raise ValueError("No path to save the project alias cache to.")
+        with self._lock:
+            entries = dict(self._by_number)
+        _files.write_atomically(path, json.dumps(entries))
+
+
+class JoinedMembership(NamedTuple):
+    """A membership together with its entries in a Feature's maps.
+
+    Attributes:
+        name (str): The membership name as listed, or the Feature map key
+            when the membership was not part of the listing.
+        key (str): The Feature map key, or ``None`` if the Feature has no
+            entry for this membership.
+        membership (google.cloud.gkehub_v1.types.Membership): The listed
+            membership, or ``None``.
+        spec (google.cloud.gkehub_v1.types.MembershipFeatureSpec): The
+            entry from ``membership_specs``, or ``None``.
+        state (google.cloud.gkehub_v1.types.MembershipFeatureState): The
+            entry from ``membership_states``, or ``None``.
+    """
+
+    name: str
+    key: Optional[str]
+    membership: Optional[gcg_membership.Membership]
+    spec: Optional[gcg_feature.MembershipFeatureSpec]
+    state: Optional[gcg_feature.MembershipFeatureState]
+
+
+def join_feature_memberships(
+    feature: gcg_feature.Feature,
+    memberships: Iterable[gcg_membership.Membership],
+    cache: ProjectAliasCache = None,
+    include_orphans: bool = False,
+) -> Iterator[JoinedMembership]:
+    """Stream memberships joined with a Feature's per-membership entries.
+
+    The Feature's map keys are indexed once; the listing is then consumed
+    lazily, so a pager is read page by page and each record is yielded as
+    soon as its membership arrives. The join is ``O(n + m)``.
+
+    When neither a listed membership's project id nor a Feature key's
+    project number is known to ``cache``, a Feature key with the same
+    location and membership id is used to learn the project number/id
+    pair, provided the match is unambiguous.
+
+    Args:
+        feature (google.cloud.gkehub_v1.types.Feature): The Feature.
+        memberships (Iterable[google.cloud.gkehub_v1.types.Membership]):
+            The listing, typically a ``ListMembershipsPager``.
+        cache (ProjectAliasCache): Known project aliases. Learned pairs are
+            added to it. A private cache is used when omitted.
+        include_orphans (bool): Also yield records for Feature keys that no
+            listed membership matched, after the listing is exhausted.
+
+    Yields:
+        JoinedMembership: One record per listed membership, then the orphans.
+    """
+    if cache is None:
+        cache = ProjectAliasCache()
+    specs = feature.membership_specs
+    states = feature.membership_states
+
+    by_path: Dict[Tuple[str, str, str], str] = {}
+    by_suffix: Dict[Tuple[str, str], Optional[str]] = {}
+    for key in set(specs.keys()) | set(states.keys()):
+        parsed = parse_membership_path(key)
+        if not parsed:
+            continue
+        project, location, name = (
+            parsed["project"],
+            parsed["location"],
+            parsed["membership"],
+        )
+        by_path[(cache.canonical(project), location, name)] = key
+        # ``None`` marks a suffix shared by several projects; it cannot be
+        # used to learn an alias.
+        by_suffix[(location, name)] = None if (location, name) in by_suffix else key
+
+    matched = set()
+    for resource in memberships:
+        parsed = parse_membership_path(resource.name)
+        key = None
+        if parsed:
+            project, location, name = (
+                parsed["project"],
+                parsed["location"],
+                parsed["membership"],
+            )
+            key = by_path.get((cache.canonical(project), location, name))
+            if key is None and cache.project_number(project) is None:
+                candidate = by_suffix.get((location, name))
+                if candidate is not None and candidate not in matched:
+                    key_project = parse_membership_path(candidate)["project"]
+                    if (
+                        key_project.isdigit()
+                        and not project.isdigit()
+                        and cache.project_id(key_project) is None
+                    ):
+                        cache.learn(key_project, project)
+                        key = candidate
+        if key is not None:
+            matched.add(key)
+        yield JoinedMembership(
+            name=resource.name,
+            key=key,
+            membership=resource,
+            spec=specs.get(key) if key is not None else None,
+            state=states.get(key) if key is not None else None,
+        )
+
+    if include_orphans:
+        for key in by_path.values():
+            if key in matched:
+                continue
+            yield JoinedMembership(
+                name=key,
+                key=key,
+                membership=None,
+                spec=specs.get(key),
+                state=states.get(key),
+            )
@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""A content-addressed on-disk cache of Connect agent manifests.
+
+``generate_connect_manifest`` returns a list of ``ConnectAgentResource``
+objects that is largely the same for every cluster installed with the same
+version, namespace, registry and proxy. :class:`ManifestCache` keys each
+response on a hash of the complete request, stores every distinct
+resource once as a zlib-compressed blob named by its SHA-256, and serves
+repeated requests from disk until ``ttl`` expires::
+
+    cache = ManifestCache("~/.cache/gkehub-manifests")
+    response = cache.generate(client, request)
+
+Both the v1 and v1beta1 request types are supported. The directory is
+bounded by ``max_bytes``; the least recently used responses are evicted
+first, and blobs no response refers to are deleted with them.
+
+Blobs are stored unencrypted. A request with ``image_pull_secret_content``
+returns the pull secret as a ``Secret`` resource, so such requests are
+never cached: :meth:`ManifestCache.generate` passes them straight to the
+client and :meth:`ManifestCache.put` ignores them. The cache directory is
+created readable by its owner only.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from google.cloud.gkehub_v1.types import service
+from google.cloud.gkehub_v1beta1.types import membership as v1beta1_membership
+
+from . import _files
+
+# request type -> (response type, resource type)
+_TYPES: Dict[type, Tuple[type, type]] = {
+    service.GenerateConnectManifestRequest: (
+        service.GenerateConnectManifestResponse,
+        service.ConnectAgentResource,
+    ),
+    v1beta1_membership.GenerateConnectManifestRequest: (
+        v1beta1_membership.GenerateConnectManifestResponse,
+        v1beta1_membership.ConnectAgentResource,
+    ),
+}
+
+
+def _remove(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class _Entry:
+    __slots__ = ("created", "blobs", "size")
+
+    def __init__(self, created: float, blobs: List[str], size: int):
+        self.created = created
+        self.blobs = blobs
+        self.size = size
+
+
+class ManifestCache:
+    """Connect manifests by request, deduplicated and compressed on disk.
+
+    Attributes:
+        hits (int): Requests served from the cache.
+        misses (int): Requests not found, or found expired.
+        evictions (int): Responses evicted to stay under ``max_bytes``.
+        bypassed (int): Requests not cached because they carry
+            ``image_pull_secret_content``.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        ttl: float = 3600.0,
+        max_bytes: int = 256 * 1024 * 1024,
+        compression_level: int = 6,
+        clock: Callable[[], float] = time.time,
+    ):
+        """Opens or creates the cache.
+
+        Args:
+            directory (str): Where to keep the cache; created if missing.
+            ttl (float): Seconds a response is served after it was stored.
+            max_bytes (int): The most bytes of index and blob files kept.
+            compression_level (int): The zlib level for blobs.
+            clock (Callable[[], float]): Returns the current time in seconds
+                since the epoch.
+        """
+        if ttl <= 0 or max_bytes <= 0:
+            raise ValueError("ttl and max_bytes must be positive.")
+        self._directory = os.path.expanduser(directory)
+        self._index_dir = os.path.join(self._directory, "index")
+        self._blob_dir = os.path.join(self._directory, "blobs")
+        os.makedirs(self._directory, mode=0o700, exist_ok=True)
+        os.makedirs(self._index_dir, mode=0o700, exist_ok=True)
+        os.makedirs(self._blob_dir, mode=0o700, exist_ok=True)
+        self._ttl = ttl
+        self._max_bytes = max_bytes
+        self._level = compression_level
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> entry, least recently used first
+        self._entries = OrderedDict()  # type: OrderedDict[str, _Entry]
+        self._blob_refs: Dict[str, int] = {}
+        self._blob_sizes: Dict[str, int] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bypassed = 0
+        self._load()
+
+    def _index_path(self, key: str) -> str:
+        return os.path.join(self._index_dir, key + ".json")
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self._blob_dir, digest + ".z")
+
+    def _load(self) -> None:
+        loaded = []
+        for filename in os.listdir(self._index_dir):
+            path = os.path.join(self._index_dir, filename)
+            if not filename.endswith(".json"):
+                _remove(path)
+                continue
+            try:
+                with open(path, "rb") as fh:
+                    data = json.loads(fh.read().decode("utf-8"))
+                stat = os.stat(path)
+            except (OSError, ValueError):
+                _remove(path)
+                continue
+            loaded.append((stat.st_mtime_ns, filename[: -len(".json")], data, stat))
+        blob_sizes = {}
+        for filename in os.listdir(self._blob_dir):
+            path = os.path.join(self._blob_dir, filename)
+            if filename.endswith(".z"):
+                blob_sizes[filename[: -len(".z")]] = os.path.getsize(path)
+            else:
+                _remove(path)
+        for _, key, data, stat in sorted(loaded):
+            if not all(digest in blob_sizes for digest in data["blobs"]):
+                _remove(self._index_path(key))
+                continue
+            self._add(key, _Entry(data["created"], data["blobs"], stat.st_size))
+            for digest in data["blobs"]:
+                self._blob_sizes.setdefault(digest, blob_sizes[digest])
+        for digest in set(blob_sizes) - set(self._blob_refs):
+            _remove(self._blob_path(digest))
+        self._bytes = sum(e.size for e in self._entries.values()) + sum(
+            self._blob_sizes.values()
+        )
+
+    def _add(self, key: str, entry: _Entry) -> None:
+        self._entries[key] = entry
+        for digest in entry.blobs:
+            self._blob_refs[digest] = self._blob_refs.get(digest, 0) + 1
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        _remove(self._index_path(key))
+        self._bytes -= entry.size
+        for digest in entry.blobs:
+            self._blob_refs[digest] -= 1
+            if not self._blob_refs[digest]:
+                del self._blob_refs[digest]
+                self._bytes -= self._blob_sizes.pop(digest)
+                _remove(self._blob_path(digest))
+
+    @staticmethod
+    def key(request: Any) -> str:
+        """Returns the cache key of a request: a hash of all its fields."""
+        request_type = type(request)
+        if request_type not in _TYPES:
+            raise TypeError(
+                "Unsupported request type {}.".format(request_type.__name__)
+            )
+        pb = request_type.pb(request)
+        digest = hashlib.sha256(pb.DESCRIPTOR.full_name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(pb.SerializeToString(deterministic=True))
+        return digest.hexdigest()
+
+    @staticmethod
+    def cacheable(request: Any) -> bool:
+        """Returns whether a request's response may be stored on disk."""
+        return not request.image_pull_secret_content
+
+    def get(self, request: Any) -> Optional[Any]:
+        """Returns the cached response to a request, if fresh.
+
+        Args:
+            request (Any): A v1 or v1beta1 ``GenerateConnectManifestRequest``.
+
+        Returns:
+            Optional[Any]: The matching ``GenerateConnectManifestResponse``,
+                or ``None``.
+        """
+        key = self.key(request)
+        response_type, resource_type = _TYPES[type(request)]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._clock() - entry.created > self._ttl:
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            try:
+                resources = []
+                for digest in entry.blobs:
+                    with open(self._blob_path(digest), "rb") as fh:
+                        blob = zlib.decompress(fh.read())
+                    resources.append(resource_type.deserialize(blob))
+            except (OSError, zlib.error):
+                # Removed or damaged underneath us; fetch it again.
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            try:
+                os.utime(self._index_path(key))
+            except OSError:
+                pass
+            self.hits += 1
+        return response_type(manifest=resources)
+
+    def put(self, request: Any, response: Any) -> None:
+        """Stores the response to a request.
+
+        Resources already stored for other requests are not written again.
+        Responses to requests that are not :meth:`cacheable` are ignored.
+        """
+        key = self.key(request)
+        if not self.cacheable(request):
+            return
+        blobs = []
+        pending = {}
+        for resource in response.manifest:
+            data = type(resource).serialize(resource)
+            digest = hashlib.sha256(data).hexdigest()
+            blobs.append(digest)
+            pending[digest] = data
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            for digest, data in pending.items():
+                if digest in self._blob_refs:
+                    continue
+                compressed = zlib.compress(data, self._level)
+                _files.write_atomically(self._blob_path(digest), compressed)
+                self._blob_sizes[digest] = len(compressed)
+                self._bytes += len(compressed)
+            created = self._clock()
+            index = json.dumps({"created": created, "blobs": blobs}).encode("utf-8")
+            _files.write_atomically(self._index_path(key), index)
+            self._add(key, _Entry(created, blobs, len(index)))
+            self._bytes += len(index)
+            while self._bytes > self._max_bytes and len(self._entries) > 1:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def generate(self, client: Any, request: Any, **kwargs) -> Any:
+        """Returns a cached response, or calls ``generate_connect_manifest``.
+
+        Args:
+            client (Any): A v1 ``GkeHubClient`` or v1beta1
+                ``GkeHubMembershipServiceClient`` matching the request.
+            request (Any): The request.
+            kwargs: Passed to ``generate_connect_manifest`` (``retry``,
+                ``timeout``, ``metadata``).
+
+        Returns:
+            Any: The ``GenerateConnectManifestResponse``.
+        """
+        if not self.cacheable(request):
+            with self._lock:
+                self.bypassed += 1
+            return client.generate_connect_manifest(request=request, **kwargs)
+        response = self.get(request)
+        if response is None:
+            response = client.generate_connect_manifest(request=request, **kwargs)
+            self.put(request, response)
+        return response
+
+    def clear(self) -> None:
+        """Removes every cached response and blob."""
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the counters and current sizes."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "bypassed": self.bypassed,
+                "responses": len(self._entries),
+                "blobs": len(self._blob_sizes),
+                "bytes": self._bytes,
+            }
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Process-parallel map/reduce over streamed list pages.
+
+Pages are shipped to worker processes as serialized protobuf bytes, which
+are much cheaper to pickle than proto-plus wrappers, and are deserialized
+and mapped in the worker. Each worker folds its page into a partial result
+so only partials cross back to the parent.
+"""
+
+import collections
+from concurrent import futures
+import functools
+import itertools
+import os
+from typing import Any, Callable, Iterable, Iterator, List, Sequence, Tuple
+
+_NO_VALUE = object()
+
+
+def _serialize(resource: Any) -> bytes:
+    serialize = getattr(type(resource), "serialize", None)
+    if serialize is not None:
+        return serialize(resource)
+    return resource.SerializeToString()
+
+
+def _deserialize(message_type: Any, blob: bytes) -> Any:
+    deserialize = getattr(message_type, "deserialize", None)
+    if deserialize is not None:
+        return deserialize(blob)
+    return message_type.FromString(blob)
+
+
+def _map_page(
+    message_type: Any,
+    blobs: Sequence[bytes],
+    map_fn: Callable[[Any], Any],
+    reduce_fn: Callable[[Any, Any], Any],
+) -> Any:
+    mapped = (map_fn(_deserialize(message_type, blob)) for blob in blobs)
+    return functools.reduce(reduce_fn, mapped)
+
+
+def _pages(source: Any, page_size: int) -> Iterator[Tuple[Any, List[bytes]]]:
+    if hasattr(source, "pages"):
+        for page in source.pages:
+            resources = list(page.resources)
+            if resources:
+                yield type(resources[0]), [_serialize(r) for r in resources]
+        return
+    iterator = iter(source)
+    while True:
+        chunk = list(itertools.islice(iterator, page_size))
+        if not chunk:
+            return
+        yield type(chunk[0]), [_serialize(r) for r in chunk]
+
+
+def iter_partials(
+    source: Iterable,
+    map_fn: Callable[[Any], Any],
+    reduce_fn: Callable[[Any, Any], Any],
+    workers: int = None,
+    executor: futures.Executor = None,
+    page_size: int = 500,
+    max_pending: int = None,
+) -> Iterator[Any]:
+    """Map and reduce each page in parallel, yielding partials in page order.
+
+    Args:
+        source (Iterable): A list pager such as ``ListMembershipsPager``
+            (its ``pages`` are used as the unit of work) or any iterable of
+            protobuf or proto-plus messages (chunked by ``page_size``).
+        map_fn (Callable[[Any], Any]): Applied to every resource in a
+            worker process. Must be picklable, i.e. a module-level function.
+        reduce_fn (Callable[[Any, Any], Any]): An associative function that
+            combines two mapped values (or partials) into one. Values are
+            combined in listing order, so it need not be commutative. Must
+            be picklable.
+        workers (int): The number of worker processes. ``0`` maps in the
+            calling process, which is useful for debugging. Defaults to the
+            number of CPUs. Ignored when ``executor`` is given.
+        executor (concurrent.futures.Executor): An executor to reuse
+            instead of creating a process pool.
+        page_size (int): Chunk size for sources without ``pages``.
+        max_pending (int): The most pages submitted but not yet yielded.
+            Bounds memory; defaults to twice ``workers``, or twice the
+            number of CPUs.
+
+    Yields:
+        Any: One partial reduction per non-empty page, in page order.
+    """
+    pages = _pages(source, page_size)
+    if executor is None and workers == 0:
+        for message_type, blobs in pages:
+            yield _map_page(message_type, blobs, map_fn, reduce_fn)
+        return
+
+    if max_pending is None:
+        max_pending = 2 * (workers or os.cpu_count() or 1)
+    if max_pending < 1:
+        raise ValueError("max_pending must be positive.")
+    owned = executor is None
+    if owned:
+        executor = futures.ProcessPoolExecutor(max_workers=workers)
+    # Submission order, so partials are combined in listing order.
+    pending = collections.deque()  # type: collections.deque
+    try:
+        for message_type, blobs in pages:
+            pending.append(
+                executor.submit(_map_page, message_type, blobs, map_fn, reduce_fn)
+            )
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if owned:
+            executor.shutdown(wait=True)
+
+
+def fleet_map_reduce(
+    source: Iterable,
+    map_fn: Callable[[Any], Any],
+    reduce_fn: Callable[[Any, Any], Any],
+    workers: int = None,
+    initial: Any = _NO_VALUE,
+    **kwargs
+) -> Any:
+    """Map every resource of a listing in parallel and reduce the results.
+
+    Args:
+        source (Iterable): A list pager or an iterable of messages; see
+            :func:`iter_partials`.
+        map_fn (Callable[[Any], Any]): Applied to every resource in a
+            worker process.
+        reduce_fn (Callable[[Any, Any], Any]): An associative combiner for
+            mapped values and partials, applied in listing order.
+        workers (int): The number of worker processes.
+        initial (Any): The result for an empty listing, and the starting
+            value of the final reduction.
+        kwargs: Passed to :func:`iter_partials`.
+
+    Returns:
+        Any: The reduction of every mapped resource.
+
+    Raises:
+        ValueError: If the listing is empty and no ``initial`` was given.
+    """
+    result = initial
+    for partial in iter_partials(source, map_fn, reduce_fn, workers=workers, **kwargs):
+        result = partial if result is _NO_VALUE else reduce_fn(result, partial)
+    if result is _NO_VALUE:
+        raise ValueError("Empty listing and no initial value.")
+    return result
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Bulk resource-name parsing and a hierarchical membership name index."""
+
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .interning import InternTable
+
+_MEMBERSHIP_PATH_RE = re.compile(
+    r"^projects/(?P<project>.+?)/locations/(?P<location>.+?)/memberships/(?P<membership>.+?)$"
+)
+_FEATURE_PATH_RE = re.compile(
+    r"^projects/(?P<project>.+?)/locations/(?P<location>.+?)/features/(?P<feature>.+?)$"
+)
+
+
+def _parse(path: str, collection: str, key: str, pattern) -> Dict[str, str]:
+    # Fast path for the canonical six-segment form; anything else (ids with
+    # embedded slashes, malformed names) goes through the compiled pattern so
+    # results always match ``GkeHubClient.parse_*_path``.
+    parts = path.split("/")
+    if (
+        len(parts) == 6
+        and parts[0] == "projects"
+        and parts[2] == "locations"
+        and parts[4] == collection
+        and parts[1]
+        and parts[3]
+        and parts[5]
+    ):
+        return {"project": parts[1], "location": parts[3], key: parts[5]}
+    m = pattern.match(path)
+    return m.groupdict() if m else {}
+
+
+def parse_membership_path(path: str) -> Dict[str, str]:
+    """Parses a membership path into its component segments.
+
+    Equivalent to :meth:`GkeHubClient.parse_membership_path`, without
+    recompiling or looking up the pattern on every call.
+    """
+    return _parse(path, "memberships", "membership", _MEMBERSHIP_PATH_RE)
+
+
+def parse_feature_path(path: str) -> Dict[str, str]:
+    """Parses a feature path into its component segments.
+
+    Equivalent to :meth:`GkeHubClient.parse_feature_path`, without
+    recompiling or looking up the pattern on every call.
+    """
+    return _parse(path, "features", "feature", _FEATURE_PATH_RE)
+
+
+def parse_membership_paths(paths: Iterable[str]) -> List[Dict[str, str]]:
+    """Parses many membership paths.
+
+    Args:
+        paths (Iterable[str]): Membership resource names.
+
+    Returns:
+        List[Dict[str, str]]: One result per input, in order. Names that
+            do not match yield an empty dictionary.
+    """
+    return [parse_membership_path(path) for path in paths]
+
+
+def parse_feature_paths(paths: Iterable[str]) -> List[Dict[str, str]]:
+    """Parses many feature paths.
+
+    Args:
+        paths (Iterable[str]): Feature resource names.
+
+    Returns:
+        List[Dict[str, str]]: One result per input, in order. Names that
+            do not match yield an empty dictionary.
+    """
+    return [parse_feature_path(path) for path in paths]
+
+
+class MembershipNameIndex:
+    """An index of membership names keyed by project, location and id.
+
+    Values default to the membership name itself, but any payload may be
+    stored (a ``Membership``, a spec, an ordinal). Prefix queries walk only
+    the matching subtree, so they cost time proportional to the result.
+    """
+
+    def __init__(self, intern_table: InternTable = None):
+        """Instantiate the index.
+
+        Args:
+            intern_table (InternTable): When given, name segments are
+                interned through it so that repeated project and location
+                ids share storage.
+        """
+        self._tree = {}  # type: Dict[str, Dict[str, Dict[str, Any]]]
+        self._intern = intern_table.intern if intern_table is not None else None
+        self._size = 0
+
+    def _split(self, name: str) -> Optional[Tuple[str, str, str]]:
+        parsed = parse_membership_path(name)
+        if not parsed:
+            return None
+        project, location, membership = (
+            parsed["project"],
+            parsed["location"],
+            parsed["membership"],
+        )
+        if self._intern is not None:
+            project, location = self._intern(project), self._intern(location)
+        return project, location, membership
+
+    def add(self, name: str, value: Any = None) -> None:
+        """Add or replace an entry.
+
+        Args:
+            name (str): A membership resource name.
+            value (Any): The payload to store. Defaults to ``name``.
+
+        Raises:
+            ValueError: If ``name`` is not a membership resource name.
+        """
+        key = self._split(name)
+        if key is None:
+            raise ValueError("Not a membership resource name: {!r}".format(name))
+        project, location, membership = key
+        memberships = self._tree.setdefault(project, {}).setdefault(location, {})
+        if membership not in memberships:
+            self._size += 1
+        memberships[membership] = name if value is None else value
+
+    def update(self, names: Iterable[str]) -> None:
+        """Add many names, each storing itself as the value."""
+        for name in names:
+            self.add(name)
+
+    def remove(self, name: str) -> bool:
+        """Remove an entry.
+
+        Args:
+            name (str): A membership resource name.
+
+        Returns:
+            bool: Whether an entry was removed.
+        """
+        key = self._split(name)
+        if key is None:
+            return False
+        project, location, membership = key
+        locations = self._tree.get(project)
+        memberships = locations.get(location) if locations else None
+        if not memberships or membership not in memberships:
+            return False
+        del memberships[membership]
+        self._size -= 1
+        if not memberships:
+            del locations[location]
+            if not locations:
+                del self._tree[project]
+        return True
+
+    def get(self, name: str, default: Any = None) -> Any:
+        """Return the value stored for ``name``, or ``default``."""
+        key = self._split(name)
+        if key is None:
+            return default
+        project, location, membership = key
+        return self._tree.get(project, {}).get(location, {}).get(membership, default)
+
+    def lookup(self, project: str, location: str, membership: str) -> Any:
+        """Return the value stored for the given segments, or ``None``."""
+        return self._tree.get(project, {}).get(location, {}).get(membership)
+
+    def projects(self) -> List[str]:
+        """Return the projects that have at least one entry."""
+        return list(self._tree)
+
+    def locations(self, project: str) -> List[str]:
+        """Return the locations of ``project`` that have at least one entry."""
+        return list(self._tree.get(project, ()))
+
+    def query(self, project: str, location: str = None) -> Iterator[Any]:
+        """Iterate the values under a project, or a project and location.
+
+        Args:
+            project (str): The project id or number, as it appears in names.
+            location (str): Restrict results to this location.
+
+        Yields:
+            Any: The stored values.
+        """
+        locations = self._tree.get(project)
+        if not locations:
+            return
+        if location is not None:
+            yield from locations.get(location, {}).values()
+            return
+        for memberships in locations.values():
+            yield from memberships.values()
+
+    def __contains__(self, name: str) -> bool:
+        key = self._split(name)
+        if key is None:
+            return False
+        project, location, membership = key
+        return membership in self._tree.get(project, {}).get(location, {})
+
+    def __iter__(self) -> Iterator[Any]:
+        for locations in self._tree.values():
+            for memberships in locations.values():
+                yield from memberships.values()
+
+    def __len__(self) -> int:
+        return self._size
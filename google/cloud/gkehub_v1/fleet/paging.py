@@ -0,0 +1,432 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Paging extensions for the generated list methods.
+
+The pagers in ``services/*/pagers.py`` are regenerated from the API
+definition, so nothing is added to them. :class:`Listing` and
+:class:`AsyncListing` instead call a list method of a v1 or v1beta1
+client once per page. They can checkpoint their position, so an
+interrupted listing resumes where it stopped, and can let ``page_size``
+adapt between pages::
+
+    checkpoints = CheckpointFile("memberships.ckpt")
+    saved = checkpoints.load()
+    if saved is None:
+        listing = Listing(
+            client.list_memberships,
+            service.ListMembershipsRequest(parent=parent),
+            tuner=PageSizeTuner(),
+        )
+    else:
+        listing = Listing.from_checkpoint(client.list_memberships, saved)
+    for membership in checkpoints.track(listing):
+        ...
+"""
+
+import base64
+import itertools
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, NamedTuple, Optional
+
+from google.cloud.gkehub_v1.types import service
+from google.cloud.gkehub_v1beta1.types import membership as v1beta1_membership
+
+from . import _files
+
+# The list requests a checkpoint can be resumed for, by proto name.
+_REQUEST_TYPES = {
+    request_type.pb().DESCRIPTOR.full_name: request_type
+    for request_type in (
+        service.ListMembershipsRequest,
+        service.ListFeaturesRequest,
+        v1beta1_membership.ListMembershipsRequest,
+    )
+}
+
+
+class PagerCheckpoint(NamedTuple):
+    """A resumable position within a listing.
+
+    Attributes:
+        request_type (str): The full proto name of the request, e.g.
+            ``google.cloud.gkehub.v1.ListMembershipsRequest``.
+        request (bytes): The serialized request for the current page,
+            including its ``page_token``.
+        page_token (str): The token of the current page; empty for the
+            first page.
+        offset (int): The number of resources of the current page that
+            had already been yielded.
+    """
+
+    request_type: str
+    request: bytes
+    page_token: str
+    offset: int
+
+    def to_request(self) -> Any:
+        """Deserializes the request."""
+        request_type = _REQUEST_TYPES.get(self.request_type)
+        if request_type is None:
+            raise ValueError("Cannot resume a {} listing.".format(self.request_type))
+        return request_type.deserialize(self.request)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns a JSON-serializable representation."""
+        return {
+            "request_type": self.request_type,
+            "request": base64.b64encode(self.request).decode("ascii"),
+            "page_token": self.page_token,
+            "offset": self.offset,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PagerCheckpoint":
+        """Builds a checkpoint from the output of :meth:`to_dict`."""
+        return cls(
+            request_type=data["request_type"],
+            request=base64.b64decode(data["request"]),
+            page_token=data["page_token"],
+            offset=int(data["offset"]),
+        )
+
+
+class CheckpointFile:
+    """Periodically persists a listing's checkpoint to a local file.
+
+    Wrap a :class:`Listing` with :meth:`track` (or an
+    :class:`AsyncListing` with :meth:`track_async`) and iterate the result
+    instead. A checkpoint is written once every ``every`` resources or
+    ``interval`` seconds, whichever comes first, and only after the
+    consumer has asked for the next resource, so everything before the
+    checkpoint has been fully handled. The file is removed when the
+    listing completes.
+    """
+
+    def __init__(self, path: str, every: int = 1000, interval: float = 30.0):
+        """Instantiates the checkpoint file.
+
+        Args:
+            path (str): The file to write checkpoints to.
+            every (int): Save after this many resources.
+            interval (float): Save after this many seconds.
+        """
+        self._path = path
+        self._every = every
+        self._interval = interval
+
+    def load(self) -> Optional[PagerCheckpoint]:
+        """Returns the saved checkpoint, or ``None`` if there is none."""
+        try:
+            with open(self._path) as fh:
+                return PagerCheckpoint.from_dict(json.load(fh))
+        except FileNotFoundError:
+            return None
+
+    def save(self, checkpoint: PagerCheckpoint) -> None:
+        """Atomically replaces the saved checkpoint."""
+        _files.write_atomically(self._path, json.dumps(checkpoint.to_dict()))
+
+    def clear(self) -> None:
+        """Removes the saved checkpoint, if any."""
+        try:
+            os.unlink(self._path)
+        except FileNotFoundError:
+            pass
+
+    def _due(self, count: int, since: float) -> bool:
+        return count >= self._every or time.monotonic() - since >= self._interval
+
+    def track(self, listing: "Listing") -> Iterator[Any]:
+        """Iterates a listing, saving checkpoints as resources are consumed."""
+        count, since = 0, time.monotonic()
+        for resource in listing:
+            yield resource
+            count += 1
+            if self._due(count, since):
+                self.save(listing.checkpoint())
+                count, since = 0, time.monotonic()
+        self.clear()
+
+    async def track_async(self, listing: "AsyncListing") -> AsyncIterator[Any]:
+        """Iterates an async listing, saving checkpoints as resources are consumed."""
+        count, since = 0, time.monotonic()
+        async for resource in listing:
+            yield resource
+            count += 1
+            if self._due(count, since):
+                self.save(listing.checkpoint())
+                count, since = 0, time.monotonic()
+        self.clear()
+
+
+class PageSizeTuner:
+    """Adjusts ``page_size`` between pages toward byte and latency targets.
+
+    After each page the tuner estimates the serialized size and fetch
+    latency per resource, and picks the largest page that is expected to
+    stay within both ``target_bytes`` and ``latency_budget``. Growth is
+    limited to ``max_growth`` times the previous size per step so one small
+    page cannot cause a huge jump; shrinking is immediate.
+    """
+
+    def __init__(
+        self,
+        target_bytes: int = 4 * 1024 * 1024,
+        latency_budget: float = 2.0,
+        min_page_size: int = 10,
+        max_page_size: int = 1000,
+        max_growth: float = 2.0,
+        smoothing: float = 0.5,
+    ):
+        """Instantiates the tuner.
+
+        Args:
+            target_bytes (int): The desired serialized size of each page.
+            latency_budget (float): The desired fetch latency of each page,
+                in seconds.
+            min_page_size (int): The smallest page size to request.
+            max_page_size (int): The largest page size to request.
+            max_growth (float): The largest factor by which the page size
+                may grow between two pages.
+            smoothing (float): Weight of the newest page in the running
+                per-resource estimates, between 0 and 1.
+        """
+        if not 0 < min_page_size <= max_page_size:
+            raise ValueError("Expected 0 < min_page_size <= max_page_size.")
+        self.target_bytes = target_bytes
+        self.latency_budget = latency_budget
+        self.min_page_size = min_page_size
+        self.max_page_size = max_page_size
+        self.max_growth = max_growth
+        self.smoothing = smoothing
+        self._bytes_per_item = None  # type: Optional[float]
+        self._seconds_per_item = None  # type: Optional[float]
+        self.pages = 0
+        self.total_bytes = 0
+        self.total_latency = 0.0
+
+    def _smooth(self, current: Optional[float], sample: float) -> float:
+        if current is None:
+            return sample
+        return self.smoothing * sample + (1 - self.smoothing) * current
+
+    def next_page_size(
+        self, page_size: int, response: Any, latency: Optional[float]
+    ) -> int:
+        """Records a page and returns the page size for the next request.
+
+        Args:
+            page_size (int): The page size the page was requested with; 0
+                if unspecified.
+            response (Any): The list response that was received.
+            latency (Optional[float]): How long the page took to fetch, in
+                seconds, or ``None`` if unknown.
+
+        Returns:
+            int: The page size to request next.
+        """
+        items = len(response.resources)
+        size = type(response).pb(response).ByteSize()
+        self.pages += 1
+        self.total_bytes += size
+        if latency is not None:
+            self.total_latency += latency
+        if not items:
+            return page_size
+        self._bytes_per_item = self._smooth(self._bytes_per_item, size / items)
+        candidates = [self.target_bytes / self._bytes_per_item]
+        if latency is not None:
+            self._seconds_per_item = self._smooth(
+                self._seconds_per_item, latency / items
+            )
+        if self._seconds_per_item:
+            candidates.append(self.latency_budget / self._seconds_per_item)
+        proposed = min(candidates)
+        proposed = min(proposed, (page_size or items) * self.max_growth)
+        return int(max(self.min_page_size, min(self.max_page_size, proposed)))
+
+
+class _ListingBase:
+    def __init__(
+        self,
+        method: Callable[..., Any],
+        request: Any,
+        tuner: PageSizeTuner = None,
+        **kwargs
+    ):
+        request_type = type(request)
+        # A copy, since page_token and page_size change as pages are read.
+        self._request = request_type.deserialize(request_type.serialize(request))
+        self._method = method
+        self._tuner = tuner
+        self._kwargs = kwargs
+        self._response = None  # type: Any
+        self._latency = None  # type: Optional[float]
+        # Resources of the current page already yielded, or to be skipped
+        # when resuming before the first page arrives.
+        self._offset = 0
+
+    @classmethod
+    def from_checkpoint(
+        cls,
+        method: Callable[..., Any],
+        checkpoint: PagerCheckpoint,
+        tuner: PageSizeTuner = None,
+        **kwargs
+    ) -> Any:
+        """Resumes a listing from a checkpoint.
+
+        Args:
+            method (Callable[..., Any]): The client list method the
+                checkpoint was taken with.
+            checkpoint (PagerCheckpoint): The checkpoint to resume from.
+            tuner (PageSizeTuner): Adapts ``page_size`` between pages when
+                given.
+            kwargs: Passed to every call (``retry``, ``timeout``,
+                ``metadata``).
+
+        Returns:
+            The listing, positioned at the first resource not yet yielded
+            when the checkpoint was taken.
+        """
+        listing = cls(method, checkpoint.to_request(), tuner, **kwargs)
+        listing._offset = checkpoint.offset
+        return listing
+
+    def checkpoint(self) -> PagerCheckpoint:
+        """Returns the current position of the listing.
+
+        Every resource already yielded counts as consumed. When iterating
+        ``pages`` directly, the checkpoint refers to the start of the
+        current page.
+
+        Returns:
+            PagerCheckpoint: A checkpoint for :meth:`from_checkpoint`.
+        """
+        request_type = type(self._request)
+        return PagerCheckpoint(
+            request_type=request_type.pb().DESCRIPTOR.full_name,
+            request=request_type.serialize(self._request),
+            page_token=self._request.page_token,
+            offset=self._offset,
+        )
+
+    def _prepare(self) -> bool:
+        # Sets up the request for the next page; False once there is none.
+        if self._response is None:
+            return True
+        if not self._response.next_page_token:
+            return False
+        self._request.page_token = self._response.next_page_token
+        self._offset = 0
+        if self._tuner is not None:
+            self._request.page_size = self._tuner.next_page_size(
+                self._request.page_size, self._response, self._latency
+            )
+        return True
+
+    def __getattr__(self, name: str) -> Any:
+        if self._response is None:
+            raise AttributeError(name)
+        return getattr(self._response, name)
+
+
+class Listing(_ListingBase):
+    """Iterates a list method page by page.
+
+    Each page is fetched with its own call to ``method``, so ``retry`` and
+    ``timeout`` apply per page.
+    """
+
+    def __init__(
+        self,
+        method: Callable[..., Any],
+        request: Any,
+        tuner: PageSizeTuner = None,
+        **kwargs
+    ):
+        """Instantiates the listing; nothing is fetched until iterated.
+
+        Args:
+            method (Callable[..., Any]): A client list method, e.g.
+                ``client.list_memberships``.
+            request (Any): The list request message, e.g.
+                ``service.ListMembershipsRequest``.
+            tuner (PageSizeTuner): Adapts ``page_size`` between pages when
+                given.
+            kwargs: Passed to every call (``retry``, ``timeout``,
+                ``metadata``).
+        """
+        super().__init__(method, request, tuner, **kwargs)
+
+    @property
+    def pages(self) -> Iterator[Any]:
+        while self._prepare():
+            started = time.monotonic()
+            pager = self._method(request=self._request, **self._kwargs)
+            self._latency = time.monotonic() - started
+            self._response = pager.raw_page
+            yield self._response
+
+    def __iter__(self) -> Iterator[Any]:
+        for page in self.pages:
+            for resource in itertools.islice(page.resources, self._offset, None):
+                self._offset += 1
+                yield resource
+
+
+class AsyncListing(_ListingBase):
+    """Iterates an async list method page by page; see :class:`Listing`."""
+
+    def __init__(
+        self,
+        method: Callable[..., Any],
+        request: Any,
+        tuner: PageSizeTuner = None,
+        **kwargs
+    ):
+        """Instantiates the listing; nothing is fetched until iterated.
+
+        Args:
+            method (Callable[..., Any]): An async client list method, e.g.
+                ``async_client.list_memberships``.
+            request (Any): The list request message.
+            tuner (PageSizeTuner): Adapts ``page_size`` between pages when
+                given.
+            kwargs: Passed to every call (``retry``, ``timeout``,
+                ``metadata``).
+        """
+        super().__init__(method, request, tuner, **kwargs)
+
+    @property
+    async def pages(self) -> AsyncIterator[Any]:
+        while self._prepare():
+            started = time.monotonic()
+            pager = await self._method(request=self._request, **self._kwargs)
+            self._latency = time.monotonic() - started
+            self._response = pager.raw_page
+            yield self._response
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        async def async_generator():
+            async for page in self.pages:
+                for resource in itertools.islice(page.resources, self._offset, None):
+                    self._offset += 1
+                    yield resource
+
+        return async_generator()
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""A staged asyncio pipeline with bounded queues between stages.
+
+Typical use chains a ``GkeHubAsyncClient`` listing into per-item calls::
+
+    pipeline = Pipeline(client.list_memberships(parent=parent))
+    pipeline.stage("state", get_state, concurrency=16)
+    pipeline.stage("update", apply_update, concurrency=4, queue_size=32)
+    async for result in pipeline.results():
+        ...
+
+Each stage runs ``concurrency`` workers. Stages are connected by queues of
+at most ``queue_size`` items, so a slow stage makes its upstream wait
+instead of buffering without bound. The first error in any stage cancels
+every stage and is raised from :meth:`Pipeline.results`; abandoning the
+iteration cancels the pipeline as well.
+"""
+
+import asyncio
+import inspect
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+DROP = object()
+"""Return this from a stage function to drop the item."""
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+class StageMetrics:
+    """Counters for a single pipeline stage.
+
+    Attributes:
+        name (str): The stage name.
+        concurrency (int): The number of workers.
+        processed (int): Items the stage function completed.
+        dropped (int): Items for which it returned :data:`DROP`.
+        in_flight (int): Items currently being processed.
+        max_queue_depth (int): The deepest the input queue has been.
+        busy_seconds (float): Total time spent inside the stage function,
+            summed over workers.
+    """
+
+    def __init__(self, name: str, concurrency: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.processed = 0
+        self.dropped = 0
+        self.in_flight = 0
+        self.max_queue_depth = 0
+        self.busy_seconds = 0.0
+        self._queue = None  # type: Optional[asyncio.Queue]
+        self._started = None  # type: Optional[float]
+
+    @property
+    def queue_depth(self) -> int:
+        """int: The number of items waiting in the input queue."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def throughput(self) -> float:
+        """float: Items processed per second since the pipeline started."""
+        if self._started is None:
+            return 0.0
+        elapsed = time.monotonic() - self._started
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns the counters as a dictionary."""
+        return {
+            "name": self.name,
+            "concurrency": self.concurrency,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "busy_seconds": self.busy_seconds,
+            "throughput": self.throughput,
+        }
+
+
+class _Stage:
+    def __init__(
+        self, name: str, function: Callable, concurrency: int, queue_size: int
+    ):
+        self.name = name
+        self.function = function
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.metrics = StageMetrics(name, concurrency)
+
+
+class Pipeline:
+    """A streaming pipeline of asynchronous stages."""
+
+    def __init__(self, source: Any, output_queue_size: int = 100):
+        """Instantiates the pipeline.
+
+        Args:
+            source (Any): An async iterable (such as a
+                ``ListMembershipsAsyncPager``), an awaitable that resolves
+                to one (such as ``client.list_memberships(...)``), or a
+                plain iterable.
+            output_queue_size (int): Capacity of the queue between the last
+                stage and the consumer.
+        """
+        self._source = source
+        self._output_queue_size = output_queue_size
+        self._stages = []  # type: List[_Stage]
+        self._started = False
+
+    def stage(
+        self,
+        name: str,
+        function: Callable[[Any], Any],
+        concurrency: int = 1,
+        queue_size: int = 100,
+    ) -> "Pipeline":
+        """Appends a stage.
+
+        Args:
+            name (str): A name, used as the key in :attr:`metrics`.
+            function (Callable[[Any], Any]): Called with each item; may be a
+                coroutine function. Its result is passed downstream unless it
+                is :data:`DROP`.
+            concurrency (int): The number of concurrent workers.
+            queue_size (int): Capacity of the queue feeding this stage.
+
+        Returns:
+            Pipeline: This pipeline, for chaining.
+        """
+        if concurrency < 1 or queue_size < 1:
+            raise ValueError("concurrency and queue_size must be positive.")
+        if name in self.metrics:
+            raise ValueError("Duplicate stage name {!r}.".format(name))
+        self._stages.append(_Stage(name, function, concurrency, queue_size))
+        return self
+
+    @property
+    def metrics(self) -> Dict[str, StageMetrics]:
+        """Dict[str, StageMetrics]: Per-stage metrics, keyed by stage name."""
+        return {stage.name: stage.metrics for stage in self._stages}
+
+    @staticmethod
+    async def _put(
+        queue: asyncio.Queue, item: Any, metrics: Optional[StageMetrics]
+    ) -> None:
+        await queue.put(item)
+        if metrics is not None and queue.qsize() > metrics.max_queue_depth:
+            metrics.max_queue_depth = queue.qsize()
+
+    async def _feed(
+        self, queue: asyncio.Queue, workers: int, metrics: Optional[StageMetrics]
+    ) -> None:
+        source = self._source
+        if inspect.isawaitable(source):
+            source = await source
+        if hasattr(source, "__aiter__"):
+            async for item in source:
+                await self._put(queue, item, metrics)
+        else:
+            for item in source:
+                await self._put(queue, item, metrics)
+        for _ in range(workers):
+            await queue.put(_DONE)
+
+    async def _work(
+        self,
+        stage: _Stage,
+        inbox: asyncio.Queue,
+        outbox: asyncio.Queue,
+        remaining: List[int],
+        downstream_workers: int,
+        downstream_metrics: Optional[StageMetrics],
+    ) -> None:
+        metrics = stage.metrics
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    for _ in range(downstream_workers):
+                        await outbox.put(_DONE)
+                return
+            metrics.in_flight += 1
+            started = time.monotonic()
+            try:
+                result = stage.function(item)
+                if inspect.isawaitable(result):
+                    result = await result
+            finally:
+                metrics.in_flight -= 1
+                metrics.busy_seconds += time.monotonic() - started
+            metrics.processed += 1
+            if result is DROP:
+                metrics.dropped += 1
+                continue
+            await self._put(outbox, result, downstream_metrics)
+
+    async def _supervise(self, tasks: List[asyncio.Future], output) -> None:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        failure = None
+        for task in done:
+            if not task.cancelled() and task.exception() is not None:
+                failure = task.exception()
+                break
+        if failure is not None:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            await output.put(_Failure(failure))
+        else:
+            await output.put(_DONE)
+
+    async def results(self) -> AsyncIterator[Any]:
+        """Runs the pipeline, yielding the outputs of the last stage.
+
+        Outputs arrive in completion order, not source order.
+
+        Raises:
+            Exception: The first error raised by the source or any stage.
+        """
+        if self._started:
+            raise RuntimeError("A pipeline can only be run once.")
+        self._started = True
+        output = asyncio.Queue(maxsize=self._output_queue_size)
+        queues = [asyncio.Queue(maxsize=stage.queue_size) for stage in self._stages]
+        queues.append(output)
+        now = time.monotonic()
+        stages = self._stages
+        tasks = [
+            asyncio.ensure_future(
+                self._feed(
+                    queues[0],
+                    stages[0].concurrency if stages else 0,
+                    stages[0].metrics if stages else None,
+                )
+            )
+        ]
+        for index, stage in enumerate(stages):
+            stage.metrics._queue = queues[index]
+            stage.metrics._started = now
+            downstream = stages[index + 1] if index + 1 < len(stages) else None
+            remaining = [stage.concurrency]
+            for _ in range(stage.concurrency):
+                worker = self._work(
+                    stage,
+                    queues[index],
+                    queues[index + 1],
+                    remaining,
+                    downstream.concurrency if downstream else 0,
+                    downstream.metrics if downstream else None,
+                )
+                tasks.append(asyncio.ensure_future(worker))
+        supervisor = asyncio.ensure_future(self._supervise(tasks, output))
+        try:
+            while True:
+                item = await output.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.exc
+                yield item
+        finally:
+            supervisor.cancel()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(supervisor, *tasks, return_exceptions=True)
+
+    async def run(self) -> int:
+        """Runs the pipeline to completion, discarding outputs.
+
+        Returns:
+            int: The number of outputs produced by the last stage.
+        """
+        count = 0
+        async for _ in self.results():
+            count += 1
+        return count
+
+    async def collect(self) -> List[Any]:
+        """Runs the pipeline to completion.
+
+        Returns:
+            List[Any]: The outputs of the last stage, in completion order.
+        """
+        return [item async for item in self.results()]
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""A thread-safe token bucket for pacing bulk RPCs under a quota."""
+
+import threading
+import time
+from typing import Callable
+
+
+class TokenBucket:
+    """Allows ``rate`` acquisitions per second, in bursts of ``capacity``.
+
+    Attributes:
+        waited (float): Total seconds callers spent blocked in
+            :meth:`acquire`.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """Instantiates a full bucket.
+
+        Args:
+            rate (float): Tokens added per second.
+            capacity (float): The most tokens held, i.e. the largest burst;
+                defaults to ``max(rate, 1)``.
+            clock (Callable[[], float]): Returns the current time in seconds.
+            sleep (Callable[[float], None]): Blocks for a number of seconds.
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive.")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        if self.capacity < 1:
+            raise ValueError("capacity must be at least 1.")
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def _reserve(self, tokens: float) -> float:
+        # Takes the tokens, possibly going into debt, and returns how long
+        # the caller must wait for the debt to be repaid.
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate)
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Takes tokens if they are available now, without blocking."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            if self._tokens < tokens:
+                return False
+            self._tokens -= tokens
+            return True
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Takes tokens, blocking until the rate allows it.
+
+        Callers are served in arrival order: each reserves its tokens
+        immediately and sleeps until they would have accrued.
+
+        Returns:
+            float: The seconds spent waiting.
+        """
+        if tokens > self.capacity:
+            raise ValueError("Cannot acquire more tokens than the capacity.")
+        delay = self._reserve(tokens)
+        if delay > 0:
+            self._sleep(delay)
+            with self._lock:
+                self.waited += delay
+        return delay
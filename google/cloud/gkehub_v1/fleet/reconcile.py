@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Declarative reconciliation of Config Management membership specs.
+
+:class:`ConfigManagementReconciler` reads the ``configmanagement`` Feature
+once, compares each membership's ``configmanagement.MembershipSpec`` with
+the desired one, and writes only the entries that differ. Changes are
+grouped into ``update_feature`` calls whose masks name exactly those
+entries, and rolled out in waves::
+
+    reconciler = ConfigManagementReconciler(
+        client, "projects/p/locations/global/features/configmanagement",
+        waves=(5, 100),
+    )
+    report = reconciler.reconcile(desired_specs)
+
+A run with nothing to change makes a single ``get_feature`` call.
+"""
+
+from concurrent import futures
+import math
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from google.cloud.gkehub_v1 import configmanagement_v1
+from google.cloud.gkehub_v1.types import feature as gcg_feature
+
+from . import _masks
+from .joins import ProjectAliasCache
+from .names import parse_membership_path
+
+
+class SpecChange(NamedTuple):
+    """A membership whose spec differs from the desired one.
+
+    Attributes:
+        membership (str): The ``membership_specs`` key.
+        actual (Optional[configmanagement_v1.MembershipSpec]): The current
+            spec, or ``None`` if there is none.
+        desired (Optional[configmanagement_v1.MembershipSpec]): The desired
+            spec, or ``None`` to remove the entry.
+    """
+
+    membership: str
+    actual: Optional[configmanagement_v1.MembershipSpec]
+    desired: Optional[configmanagement_v1.MembershipSpec]
+
+
+def _coerce(spec: Any) -> Optional[configmanagement_v1.MembershipSpec]:
+    if spec is None or isinstance(spec, configmanagement_v1.MembershipSpec):
+        return spec
+    return configmanagement_v1.MembershipSpec(spec)
+
+
+def _membership_key(key: str, cache: ProjectAliasCache) -> Tuple[str, ...]:
+    parsed = parse_membership_path(key)
+    if not parsed:
+        return (key,)
+    return (
+        cache.canonical(parsed["project"]),
+        parsed["location"],
+        parsed["membership"],
+    )
+
+
+def _diff(
+    feature: gcg_feature.Feature,
+    desired: Mapping[str, Any],
+    prune: bool,
+    cache: ProjectAliasCache,
+) -> Tuple[List[SpecChange], int]:
+    actual = {}
+    by_key: Dict[Tuple[str, ...], str] = {}
+    by_suffix: Dict[Tuple[str, str], Optional[str]] = {}
+    for key, spec in feature.membership_specs.items():
+        actual[key] = spec.configmanagement if "configmanagement" in spec else None
+        by_key[_membership_key(key, cache)] = key
+        parsed = parse_membership_path(key)
+        if parsed:
+            suffix = (parsed["location"], parsed["membership"])
+            # ``None`` marks a suffix shared by several projects.
+            by_suffix[suffix] = None if suffix in by_suffix else key
+
+    # desired key -> the ``membership_specs`` key naming the same cluster
+    matched: Dict[str, str] = {}
+    taken = set()
+
+    def match(key: str) -> bool:
+        actual_key = by_key.get(_membership_key(key, cache))
+        if actual_key is None:
+            return False
+        if actual_key in taken:
+            raise ValueError(
+                "{!r} names the same membership as another desired "
+                "entry.".format(key)
+            )
+        matched[key] = actual_key
+        taken.add(actual_key)
+        return True
+
+    for key in desired:
+        match(key)
+    for key in desired:
+        if key in matched:
+            continue
+        # The listing gives project ids, the Feature project numbers: learn
+        # the pair from an unambiguous match, as join_feature_memberships
+        # does.
+        parsed = parse_membership_path(key)
+        if not parsed or parsed["project"].isdigit():
+            continue
+        if cache.project_number(parsed["project"]) is not None:
+            # Possibly learned from an earlier entry of this loop.
+            match(key)
+            continue
+        candidate = by_suffix.get((parsed["location"], parsed["membership"]))
+        if candidate is None or candidate in taken:
+            continue
+        number = parse_membership_path(candidate)["project"]
+        if number.isdigit() and cache.project_id(number) is None:
+            cache.learn(number, parsed["project"])
+            matched[key] = candidate
+            taken.add(candidate)
+
+    changes = []
+    unchanged = 0
+    for key, spec in desired.items():
+        spec = _coerce(spec)
+        target = matched.get(key, key)
+        current = actual.get(target)
+        if spec != current:
+            changes.append(SpecChange(target, current, spec))
+        else:
+            unchanged += 1
+    if prune:
+        changes.extend(
+            SpecChange(key, spec, None)
+            for key, spec in actual.items()
+            if key not in taken
+        )
+    changes.sort(key=lambda change: change.membership)
+    return changes, unchanged
+
+
+def diff_membership_specs(
+    feature: gcg_feature.Feature,
+    desired: Mapping[str, Any],
+    prune: bool = False,
+    cache: ProjectAliasCache = None,
+) -> List[SpecChange]:
+    """Compare the actual Config Management specs with the desired ones.
+
+    The Feature keys its entries by project number while desired entries
+    are usually keyed by project id; both are matched through ``cache``.
+
+    Args:
+        feature (google.cloud.gkehub_v1.types.Feature): The
+            ``configmanagement`` Feature.
+        desired (Mapping[str, Any]): Membership name to desired
+            ``configmanagement_v1.MembershipSpec`` (or an equivalent dict),
+            or to ``None`` to remove the entry.
+        prune (bool): Also remove entries of memberships absent from
+            ``desired``.
+        cache (ProjectAliasCache): Known project aliases. Pairs learned
+            from unambiguous matches are added to it. A private cache is
+            used when omitted.
+
+    Returns:
+        List[SpecChange]: The changes, sorted by membership. A change to an
+            existing entry uses the Feature's own key.
+
+    Raises:
+        ValueError: If two desired entries name the same membership.
+    """
+    if cache is None:
+        cache = ProjectAliasCache()
+    return _diff(feature, desired, prune, cache)[0]
+
+
+def split_waves(items: Sequence[Any], waves: Sequence[float]) -> List[List[Any]]:
+    """Split items into waves by cumulative percentage.
+
+    For example ``waves=(5, 25, 100)`` puts 5% of the items (at least one)
+    in the first wave, the next 20% in the second and the rest in the last.
+    Empty waves are dropped.
+
+    Args:
+        items (Sequence[Any]): The items, in rollout order.
+        waves (Sequence[float]): Increasing cumulative percentages; the last
+            is taken to be 100.
+
+    Returns:
+        List[List[Any]]: The waves.
+    """
+    if not waves or any(b < a for a, b in zip(waves, waves[1:])):
+        raise ValueError("waves must be increasing percentages.")
+    result, start = [], 0
+    for index, percent in enumerate(waves):
+        if index == len(waves) - 1:
+            end = len(items)
+        else:
+            end = min(len(items), max(start + 1, math.ceil(len(items) * percent / 100)))
+        if end > start:
+            result.append(list(items[start:end]))
+        start = end
+    return result
+
+
+class ReconcileReport:
+    """The outcome of a reconciliation.
+
+    Attributes:
+        changes (List[SpecChange]): Every difference found.
+        unchanged (int): Desired entries that already matched.
+        waves (List[List[str]]): The memberships of each wave, in order.
+        applied (List[str]): Memberships whose update succeeded.
+        failed (Dict[str, Exception]): Memberships whose update failed.
+        pending (List[str]): Memberships not attempted because an earlier
+            wave failed or was halted.
+        calls (int): RPCs made, counting the initial read.
+    """
+
+    def __init__(self):
+        self.changes: List[SpecChange] = []
+        self.unchanged = 0
+        self.waves: List[List[str]] = []
+        self.applied: List[str] = []
+        self.failed: Dict[str, Exception] = {}
+        self.pending: List[str] = []
+        self.calls = 0
+
+    @property
+    def ok(self) -> bool:
+        """bool: Whether every change was applied."""
+        return not self.failed and not self.pending
+
+
+class ConfigManagementReconciler:
+    """Rolls desired ``configmanagement`` membership specs out to a Feature."""
+
+    def __init__(
+        self,
+        client: Any,
+        feature: str,
+        batch_size: int = 100,
+        waves: Sequence[float] = (100.0,),
+        max_concurrency: int = 4,
+        operation_timeout: float = None,
+        prune: bool = False,
+        between_waves: Callable[[int, List[SpecChange]], bool] = None,
+        cache: ProjectAliasCache = None,
+        **kwargs
+    ):
+        """Instantiates the reconciler.
+
+        Args:
+            client (google.cloud.gkehub_v1.GkeHubClient): The client.
+            feature (str): The Feature name,
+                ``projects/*/locations/*/features/configmanagement``.
+            batch_size (int): The most entries per ``update_feature`` call.
+            waves (Sequence[float]): Cumulative rollout percentages, e.g.
+                ``(5, 100)`` for a 5% canary wave followed by the rest.
+            max_concurrency (int): The most calls, and operations waited
+                on, at once within a wave.
+            operation_timeout (float): The longest wait, in seconds, for
+                each operation.
+            prune (bool): Remove entries of memberships absent from the
+                desired state.
+            between_waves (Callable[[int, List[SpecChange]], bool]): Called
+                after each wave but the last with the wave's index and its
+                changes. It only runs once every change in the wave has been
+                applied, since a failed update stops the rollout first;
+                returning ``False`` halts the rollout.
+            cache (ProjectAliasCache): Matches desired keys written with
+                project ids to the Feature's project-number keys; see
+                :func:`diff_membership_specs`.
+            kwargs: Passed to ``get_feature`` and ``update_feature``
+                (``retry``, ``timeout``, ``metadata``).
+        """
+        if batch_size < 1 or max_concurrency < 1:
+            raise ValueError("batch_size and max_concurrency must be positive.")
+        split_waves([], waves)
+        self._client = client
+        self._feature = feature
+        self._batch_size = batch_size
+        self._waves = tuple(waves)
+        self._max_concurrency = max_concurrency
+        self._operation_timeout = operation_timeout
+        self._prune = prune
+        self._between_waves = between_waves
+        self._cache = cache if cache is not None else ProjectAliasCache()
+        self._kwargs = kwargs
+
+    def plan(self, desired: Mapping[str, Any]) -> ReconcileReport:
+        """Reads the Feature and computes the changes without applying them.
+
+        Args:
+            desired (Mapping[str, Any]): See :func:`diff_membership_specs`.
+
+        Returns:
+            ReconcileReport: A report with ``changes``, ``unchanged`` and
+                ``waves`` filled in and everything pending.
+        """
+        report = ReconcileReport()
+        feature = self._client.get_feature(name=self._feature, **self._kwargs)
+        report.calls += 1
+        report.changes, report.unchanged = _diff(
+            feature, desired, self._prune, self._cache
+        )
+        report.waves = [
+            [change.membership for change in wave]
+            for wave in split_waves(report.changes, self._waves)
+        ]
+        report.pending = [change.membership for change in report.changes]
+        return report
+
+    def reconcile(self, desired: Mapping[str, Any]) -> ReconcileReport:
+        """Applies the changes wave by wave.
+
+        A wave with any failed update stops the rollout; its successful
+        updates stay applied.
+
+        Args:
+            desired (Mapping[str, Any]): See :func:`diff_membership_specs`.
+
+        Returns:
+            ReconcileReport: The outcome.
+        """
+        report = self.plan(desired)
+        waves = split_waves(report.changes, self._waves)
+        with futures.ThreadPoolExecutor(max_workers=self._max_concurrency) as pool:
+            for index, wave in enumerate(waves):
+                self._apply_wave(pool, wave, report)
+                done = {change.membership for change in wave}
+                report.pending = [m for m in report.pending if m not in done]
+                if report.failed:
+                    break
+                if index < len(waves) - 1 and self._between_waves is not None:
+                    if self._between_waves(index, wave) is False:
+                        break
+        return report
+
+    def _apply_wave(
+        self, pool: futures.Executor, wave: List[SpecChange], report: ReconcileReport
+    ) -> None:
+        batches = [
+            wave[i : i + self._batch_size]
+            for i in range(0, len(wave), self._batch_size)
+        ]
+        submitted = {pool.submit(self._apply_batch, batch): batch for batch in batches}
+        for future in futures.as_completed(submitted):
+            batch = submitted[future]
+            report.calls += 1
+            error = future.exception()
+            for change in batch:
+                if error is None:
+                    report.applied.append(change.membership)
+                else:
+                    report.failed[change.membership] = error
+
+    def _apply_batch(self, batch: List[SpecChange]) -> Any:
+        specs = {
+            change.membership: gcg_feature.MembershipFeatureSpec(
+                configmanagement=change.desired
+            )
+            for change in batch
+            if change.desired is not None
+        }
+        mask = _masks.field_mask(
+            _masks.map_key_path("membership_specs", change.membership)
+            for change in batch
+        )
+        operation = self._client.update_feature(
+            name=self._feature,
+            resource=gcg_feature.Feature(name=self._feature, membership_specs=specs),
+            update_mask=mask,
+            **self._kwargs
+        )
+        return operation.result(timeout=self._operation_timeout)
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Proactive refresh of access tokens ahead of their expiry.
+
+By default a token is refreshed by the first RPC that finds it expired,
+and every RPC issued meanwhile waits for it. A refresher renews the token
+in the background ``margin`` seconds before it expires instead::
+
+    refresher = CredentialsRefresher.attach(client)
+    ...
+    refresher.stop()
+
+The asyncio flavour, :class:`AsyncCredentialsRefresher`, runs as a task on
+the event loop and performs the blocking refresh in the default executor.
+
+The refresher renews ``client.transport._credentials`` in place, which is
+the object the channel authenticates with unless the channel was built
+from a copy of it, as happens when ``quota_project_id`` is set in the client
+options. Service account credentials used with self-signed JWTs never
+fetch a token and gain nothing from a refresher.
+"""
+
+import asyncio
+import datetime
+import threading
+from typing import Any, Callable, Optional
+
+from google.auth.transport import requests as google_auth_requests
+
+
+def _transport_credentials(client: Any) -> Any:
+    transport = getattr(client, "transport", client)
+    return transport._credentials
+
+
+class _Schedule:
+    def __init__(
+        self,
+        credentials: Any,
+        margin: float,
+        interval: float,
+        retry_delay: float,
+        max_retry_delay: float,
+        request: Optional[Callable],
+    ):
+        if margin < 0 or interval <= 0 or retry_delay <= 0:
+            raise ValueError("margin, interval and retry_delay must be positive.")
+        self.credentials = credentials
+        self.margin = margin
+        self.interval = interval
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.refreshes = 0
+        self.failures = 0
+        self.last_error = None  # type: Optional[Exception]
+        self._request = request
+        self._backoff = retry_delay
+
+    def delay(self) -> float:
+        """Returns the number of seconds until the next refresh is due."""
+        credentials = self.credentials
+        if credentials.token is None:
+            return 0.0
+        expiry = credentials.expiry
+        if expiry is None:
+            return self.interval
+        if expiry.tzinfo is None:
+            now = datetime.datetime.utcnow()
+        else:
+            now = datetime.datetime.now(datetime.timezone.utc)
+        remaining = (expiry - now).total_seconds() - self.margin
+        return min(max(remaining, 0.0), self.interval)
+
+    def refresh(self) -> None:
+        request = self._request or google_auth_requests.Request()
+        try:
+            self.credentials.refresh(request)
+        except Exception as exc:
+            self.failures += 1
+            self.last_error = exc
+            raise
+        self.refreshes += 1
+        self.last_error = None
+
+    def failed(self) -> float:
+        delay, self._backoff = (
+            self._backoff,
+            min(self._backoff * 2, self.max_retry_delay),
+        )
+        return delay
+
+    def succeeded(self) -> float:
+        # Tokens living shorter than the margin would otherwise be
+        # refreshed in a tight loop.
+        self._backoff = self.retry_delay
+        return max(self.delay(), self.retry_delay)
+
+
+class CredentialsRefresher:
+    """Refreshes credentials on a background thread ahead of expiry.
+
+    Attributes:
+        refreshes (int): Successful refreshes so far.
+        failures (int): Failed refreshes so far.
+        last_error (Optional[Exception]): The error of the last refresh, if
+            it failed.
+    """
+
+    def __init__(
+        self,
+        credentials: Any,
+        margin: float = 300.0,
+        interval: float = 60.0,
+        retry_delay: float = 1.0,
+        max_retry_delay: float = 60.0,
+        request: Callable = None,
+    ):
+        """Instantiates the refresher; call :meth:`start` to run it.
+
+        Args:
+            credentials (google.auth.credentials.Credentials): The
+                credentials to keep fresh.
+            margin (float): Refresh this many seconds before expiry.
+            interval (float): The longest time between checks; also the
+                check period for credentials without an expiry.
+            retry_delay (float): The first delay after a failed refresh,
+                doubled on every further failure.
+            max_retry_delay (float): The longest delay after failures.
+            request (Callable): A ``google.auth.transport.Request``. A
+                ``google.auth.transport.requests.Request`` is created per
+                refresh by default.
+        """
+        self._schedule = _Schedule(
+            credentials, margin, interval, retry_delay, max_retry_delay, request
+        )
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None  # type: Optional[threading.Thread]
+
+    @classmethod
+    def attach(cls, client: Any, **kwargs) -> "CredentialsRefresher":
+        """Starts a refresher for the credentials of a client's transport.
+
+        Args:
+            client (Any): A client, or a transport.
+            kwargs: Passed to the constructor.
+
+        Returns:
+            CredentialsRefresher: The running refresher.
+        """
+        refresher = cls(_transport_credentials(client), **kwargs)
+        refresher.start()
+        return refresher
+
+    @property
+    def credentials(self) -> Any:
+        """google.auth.credentials.Credentials: The refreshed credentials."""
+        return self._schedule.credentials
+
+    @property
+    def refreshes(self) -> int:
+        return self._schedule.refreshes
+
+    @property
+    def failures(self) -> int:
+        return self._schedule.failures
+
+    @property
+    def last_error(self) -> Optional[Exception]:
+        return self._schedule.last_error
+
+    def refresh(self) -> None:
+        """Refreshes now, unless a refresh is already in flight.
+
+        A caller arriving while another refresh runs waits for that refresh
+        instead of starting a second one.
+        """
+        if not self._lock.acquire(blocking=False):
+            with self._lock:
+                return
+        try:
+            self._schedule.refresh()
+        finally:
+            self._lock.release()
+
+    def start(self) -> None:
+        """Starts the background thread."""
+        if self._thread is not None:
+            raise RuntimeError("The refresher is already started.")
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="gkehub-credentials-refresher", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        delay = self._schedule.delay()
+        while not self._stopped.wait(delay):
+            if self._schedule.delay() > 0:
+                delay = self._schedule.delay()
+                continue
+            try:
+                self.refresh()
+            except Exception:
+                delay = self._schedule.failed()
+            else:
+                delay = self._schedule.succeeded()
+
+    def stop(self, timeout: float = None) -> None:
+        """Stops the background thread and waits for it to exit."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def __enter__(self) -> "CredentialsRefresher":
+        if self._thread is None:
+            self.start()
+        return self
+
+    def __exit__(self, type, value, traceback) -> None:
+        self.stop()
+
+
+class AsyncCredentialsRefresher:
+    """Refreshes credentials from an asyncio task ahead of expiry.
+
+    Takes the same arguments and exposes the same counters as
+    :class:`CredentialsRefresher`.
+    """
+
+    def __init__(
+        self,
+        credentials: Any,
+        margin: float = 300.0,
+        interval: float = 60.0,
+        retry_delay: float = 1.0,
+        max_retry_delay: float = 60.0,
+        request: Callable = None,
+    ):
+        self._schedule = _Schedule(
+            credentials, margin, interval, retry_delay, max_retry_delay, request
+        )
+        self._inflight = None  # type: Optional[asyncio.Future]
+        self._task = None  # type: Optional[asyncio.Future]
+
+    @classmethod
+    def attach(cls, client: Any, **kwargs) -> "AsyncCredentialsRefresher":
+        """Starts a refresher for a ``GkeHubAsyncClient`` or its transport.
+
+        Must be called from a running event loop.
+        """
+        refresher = cls(_transport_credentials(client), **kwargs)
+        refresher.start()
+        return refresher
+
+    @property
+    def credentials(self) -> Any:
+        return self._schedule.credentials
+
+    @property
+    def refreshes(self) -> int:
+        return self._schedule.refreshes
+
+    @property
+    def failures(self) -> int:
+        return self._schedule.failures
+
+    @property
+    def last_error(self) -> Optional[Exception]:
+        return self._schedule.last_error
+
+    async def refresh(self) -> None:
+        """Refreshes now, or joins the refresh already in flight."""
+        if self._inflight is None:
+            loop = asyncio.get_event_loop()
+            self._inflight = loop.run_in_executor(None, self._schedule.refresh)
+        inflight = self._inflight
+        try:
+            await asyncio.shield(inflight)
+        finally:
+            if inflight.done() and self._inflight is inflight:
+                self._inflight = None
+
+    def start(self) -> None:
+        """Starts the background task."""
+        if self._task is not None:
+            raise RuntimeError("The refresher is already started.")
+        self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self) -> None:
+        delay = self._schedule.delay()
+        while True:
+            await asyncio.sleep(delay)
+            if self._schedule.delay() > 0:
+                delay = self._schedule.delay()
+                continue
+            try:
+                await self.refresh()
+            except Exception:
+                delay = self._schedule.failed()
+            else:
+                delay = self._schedule.succeeded()
+
+    async def stop(self) -> None:
+        """Cancels the background task and waits for it to finish."""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def __aenter__(self) -> "AsyncCredentialsRefresher":
+        if self._task is None:
+            self.start()
+        return self
+
+    async def __aexit__(self, type, value, traceback) -> None:
+        await self.stop()
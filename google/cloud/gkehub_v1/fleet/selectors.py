@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Kubernetes-style label selectors over ``Membership.labels``.
+
+Selectors use the Kubernetes syntax: a comma-separated conjunction of
+``key``, ``!key``, ``key=value``, ``key==value``, ``key!=value``,
+``key in (v1,v2)`` and ``key notin (v1,v2)``.
+"""
+
+import re
+from typing import Dict, FrozenSet, Iterable, List, Mapping, NamedTuple, Set, Union
+
+from .interning import InternTable
+
+EXISTS = "exists"
+DOES_NOT_EXIST = "!"
+EQUALS = "="
+NOT_EQUALS = "!="
+IN = "in"
+NOT_IN = "notin"
+
+_POSITIVE_OPERATORS = frozenset((EXISTS, EQUALS, IN))
+
+_SET_RE = re.compile(
+    r"^(?P<key>[^\s!=(),]+)\s+(?P<op>in|notin)\s*\((?P<values>[^()]*)\)$"
+)
+_EQUALITY_RE = re.compile(
+    r"^(?P<key>[^\s!=(),]+)\s*(?P<op>==|!=|=)\s*(?P<value>[^\s!=(),]*)$"
+)
+_EXISTS_RE = re.compile(r"^(?P<negate>!)?\s*(?P<key>[^\s!=(),]+)$")
+
+
+class Requirement(NamedTuple):
+    """A single term of a label selector.
+
+    Attributes:
+        key (str): The label key.
+        operator (str): One of ``exists``, ``!``, ``=``, ``!=``, ``in`` and
+            ``notin``.
+        values (FrozenSet[str]): The values for ``=``, ``!=``, ``in`` and
+            ``notin``; empty otherwise.
+    """
+
+    key: str
+    operator: str
+    values: FrozenSet[str] = frozenset()
+
+    def matches(self, labels: Mapping[str, str]) -> bool:
+        """Evaluate this requirement against a single label map."""
+        if self.operator == EXISTS:
+            return self.key in labels
+        if self.operator == DOES_NOT_EXIST:
+            return self.key not in labels
+        value = labels.get(self.key)
+        if self.operator in (EQUALS, IN):
+            return value is not None and value in self.values
+        return value is None or value not in self.values
+
+
+def _split_terms(selector: str) -> List[str]:
+    terms, depth, start = [], 0, 0
+    for i, char in enumerate(selector):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            terms.append(selector[start:i])
+            start = i + 1
+    terms.append(selector[start:])
+    return [term.strip() for term in terms if term.strip()]
+
+
+def parse_selector(selector: str) -> List[Requirement]:
+    """Parse a label selector.
+
+    Args:
+        selector (str): The selector, e.g. ``env in (prod,staging),!canary``.
+            An empty selector matches everything.
+
+    Returns:
+        List[Requirement]: The conjunction of requirements.
+
+    Raises:
+        ValueError: If the selector is malformed.
+    """
+    requirements = []
+    for term in _split_terms(selector):
+        m = _SET_RE.match(term)
+        if m:
+            values = frozenset(
+                v.strip() for v in m.group("values").split(",") if v.strip()
+            )
+            if not values:
+                raise ValueError("Empty value set in selector term {!r}".format(term))
+            requirements.append(Requirement(m.group("key"), m.group("op"), values))
+            continue
+        m = _EQUALITY_RE.match(term)
+        if m:
+            op = NOT_EQUALS if m.group("op") == "!=" else EQUALS
+            requirements.append(
+                Requirement(m.group("key"), op, frozenset((m.group("value"),)))
+            )
+            continue
+        m = _EXISTS_RE.match(term)
+        if m:
+            op = DOES_NOT_EXIST if m.group("negate") else EXISTS
+            requirements.append(Requirement(m.group("key"), op))
+            continue
+        raise ValueError("Invalid label selector term {!r}".format(term))
+    return requirements
+
+
+class LabelIndex:
+    """An inverted index from label key and value to memberships.
+
+    Each membership gets a small integer ordinal; postings are sets of
+    ordinals. The index is maintained incrementally with :meth:`add` and
+    :meth:`remove`, so it can be fed from pager results or from a stream
+    of change notifications. Positive requirements are answered by
+    intersecting postings, smallest first, and negative requirements only
+    filter the surviving candidates, so evaluation costs time proportional
+    to the postings involved rather than to the size of the fleet.
+    """
+
+    def __init__(self, intern_table: InternTable = None):
+        """Instantiate the index.
+
+        Args:
+            intern_table (InternTable): When given, names and label strings
+                are interned through it.
+        """
+        self._intern = intern_table
+        self._ordinals: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._labels: List[Dict[str, str]] = []
+        self._free: List[int] = []
+        self._live: Set[int] = set()
+        self._by_key: Dict[str, Set[int]] = {}
+        self._by_value: Dict[str, Dict[str, Set[int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._ordinals
+
+    def add(self, name: str, labels: Mapping[str, str]) -> None:
+        """Insert a membership or replace its labels.
+
+        Args:
+            name (str): The membership name.
+            labels (Mapping[str, str]): Its labels, e.g. ``Membership.labels``.
+        """
+        if self._intern is not None:
+            name = self._intern.intern_name(name)
+            labels = self._intern.intern_labels(labels)
+        else:
+            labels = dict(labels)
+        ordinal = self._ordinals.get(name)
+        if ordinal is None:
+            ordinal = self._free.pop() if self._free else len(self._names)
+            if ordinal == len(self._names):
+                self._names.append(name)
+                self._labels.append({})
+            else:
+                self._names[ordinal] = name
+            self._ordinals[name] = ordinal
+            self._live.add(ordinal)
+        old = self._labels[ordinal]
+        for key, value in old.items():
+            if labels.get(key) != value:
+                self._unpost(ordinal, key, value)
+        for key, value in labels.items():
+            if old.get(key) != value:
+                self._by_key.setdefault(key, set()).add(ordinal)
+                self._by_value.setdefault(key, {}).setdefault(value, set()).add(ordinal)
+        self._labels[ordinal] = labels
+
+    def add_memberships(self, memberships: Iterable) -> None:
+        """Insert every membership from an iterable such as a pager."""
+        for resource in memberships:
+            self.add(resource.name, resource.labels)
+
+    def remove(self, name: str) -> bool:
+        """Remove a membership.
+
+        Returns:
+            bool: Whether the membership was present.
+        """
+        ordinal = self._ordinals.pop(name, None)
+        if ordinal is None:
+            return False
+        for key, value in self._labels[ordinal].items():
+            self._unpost(ordinal, key, value)
+        self._labels[ordinal] = {}
+        self._live.discard(ordinal)
+        self._free.append(ordinal)
+        return True
+
+    def _unpost(self, ordinal: int, key: str, value: str) -> None:
+        keyed = self._by_key[key]
+        keyed.discard(ordinal)
+        if not keyed:
+            del self._by_key[key]
+        values = self._by_value[key]
+        posting = values[value]
+        posting.discard(ordinal)
+        if not posting:
+            del values[value]
+            if not values:
+                del self._by_value[key]
+
+    def labels(self, name: str) -> Dict[str, str]:
+        """Return the indexed labels of a membership."""
+        return dict(self._labels[self._ordinals[name]])
+
+    def _postings(self, requirement: Requirement) -> Set[int]:
+        if requirement.operator == EXISTS:
+            return self._by_key.get(requirement.key, set())
+        values = self._by_value.get(requirement.key, {})
+        postings = [values[v] for v in requirement.values if v in values]
+        if len(postings) == 1:
+            return postings[0]
+        return set().union(*postings)
+
+    def select(self, selector: Union[str, Iterable[Requirement]]) -> List[str]:
+        """Return the names of the memberships matching a selector.
+
+        Args:
+            selector (Union[str, Iterable[Requirement]]): A selector string
+                or already parsed requirements.
+
+        Returns:
+            List[str]: The matching membership names, in no particular order.
+        """
+        if isinstance(selector, str):
+            selector = parse_selector(selector)
+        positive, negative = [], []
+        for requirement in selector:
+            if requirement.operator in _POSITIVE_OPERATORS:
+                positive.append(self._postings(requirement))
+            else:
+                negative.append(requirement)
+
+        if positive:
+            positive.sort(key=len)
+            candidates = set(positive[0])
+            for posting in positive[1:]:
+                if not candidates:
+                    break
+                candidates &= posting
+        else:
+            candidates = set(self._live)
+            for requirement in negative:
+                if requirement.operator == DOES_NOT_EXIST:
+                    candidates -= self._by_key.get(requirement.key, set())
+                else:
+                    candidates -= self._postings(requirement)
+            negative = []
+
+        if negative:
+            labels = self._labels
+            candidates = {
+                ordinal
+                for ordinal in candidates
+                if all(r.matches(labels[ordinal]) for r in negative)
+            }
+        names = self._names
+        return [names[ordinal] for ordinal in candidates]
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""A fleet-wide index of Config Sync errors.
+
+:class:`SyncErrorIndex` maps the source path, the group/version/kind and
+the error code of every ``configmanagement.SyncError`` to the memberships
+reporting it, so "which clusters fail on ``namespaces/foo/rb.yaml``" is a
+lookup rather than a walk over every membership state::
+
+    index = SyncErrorIndex()
+    index.update_from_feature(client.get_feature(name=configmanagement))
+    index.by_source_path_prefix("namespaces/foo/")
+
+Memory is proportional to the distinct (path, kind, code) triples of each
+membership, with strings shared through an :class:`InternTable`; error
+messages are not kept.
+"""
+
+import bisect
+from typing import Any, Dict, FrozenSet, Iterable, List, NamedTuple, Set, Tuple
+
+from . import _states
+from .interning import InternTable
+
+
+class GroupVersionKind(NamedTuple):
+    """A Kubernetes group, version and kind; ``group`` is empty for core."""
+
+    group: str
+    version: str
+    kind: str
+
+
+class ErrorKey(NamedTuple):
+    """What the index records for one error resource.
+
+    Attributes:
+        source_path (str): The path in the repository; may be empty.
+        gvk (GroupVersionKind): The kind of the erroneous resource.
+        code (str): The Config Sync error code.
+    """
+
+    source_path: str
+    gvk: GroupVersionKind
+    code: str
+
+
+def _sync_errors(state: Any) -> Iterable[Any]:
+    state = _states.configmanagement_pb(state)
+    if state is None:
+        return ()
+    return state.config_sync_state.sync_state.errors
+
+
+def _postings_add(index: Dict[Any, Set[int]], key: Any, ordinal: int) -> bool:
+    posting = index.get(key)
+    if posting is None:
+        index[key] = {ordinal}
+        return True
+    posting.add(ordinal)
+    return False
+
+
+def _postings_discard(index: Dict[Any, Set[int]], key: Any, ordinal: int) -> bool:
+    posting = index[key]
+    posting.discard(ordinal)
+    if not posting:
+        del index[key]
+        return True
+    return False
+
+
+class SyncErrorIndex:
+    """Inverted maps from source path, GVK and code to memberships.
+
+    Updated incrementally with :meth:`update` as membership states change;
+    only the postings that differ from the previous state are touched.
+    """
+
+    def __init__(self, intern_table: InternTable = None):
+        """Instantiates the index.
+
+        Args:
+            intern_table (InternTable): Used to share membership names,
+                paths, kinds and codes. A private table is created if
+                omitted.
+        """
+        self._intern = intern_table if intern_table is not None else InternTable()
+        self._ordinals: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._free: List[int] = []
+        self._errors: List[FrozenSet[ErrorKey]] = []
+        self._by_path: Dict[str, Set[int]] = {}
+        self._by_gvk: Dict[GroupVersionKind, Set[int]] = {}
+        self._by_code: Dict[str, Set[int]] = {}
+        self._sorted_paths: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._ordinals)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._ordinals
+
+    def _keys(self, state: Any) -> FrozenSet[ErrorKey]:
+        intern = self._intern.intern
+        keys = set()
+        for error in _sync_errors(state):
+            code = intern(error.code)
+            resources = error.error_resources
+            if not resources:
+                keys.add(ErrorKey("", GroupVersionKind("", "", ""), code))
+            for resource in resources:
+                gvk = resource.resource_gvk
+                keys.add(
+                    ErrorKey(
+                        intern(resource.source_path),
+                        GroupVersionKind(
+                            intern(gvk.group), intern(gvk.version), intern(gvk.kind)
+                        ),
+                        code,
+                    )
+                )
+        return frozenset(keys)
+
+    def update(self, name: str, state: Any) -> None:
+        """Replaces the errors of one membership.
+
+        Args:
+            name (str): The membership name (the ``membership_states`` key).
+            state (Any): Its ``MembershipFeatureState``, its
+                ``configmanagement_v1.MembershipState``, or ``None``. A
+                state without errors removes the membership from the index.
+        """
+        keys = self._keys(state)
+        ordinal = self._ordinals.get(name)
+        if ordinal is None:
+            if not keys:
+                return
+            name = self._intern.intern_name(name)
+            ordinal = self._free.pop() if self._free else len(self._names)
+            if ordinal == len(self._names):
+                self._names.append(name)
+                self._errors.append(frozenset())
+            else:
+                self._names[ordinal] = name
+            self._ordinals[name] = ordinal
+        old = self._errors[ordinal]
+        if keys == old:
+            return
+        self._reindex(ordinal, _project(old), _project(keys))
+        if keys:
+            self._errors[ordinal] = keys
+        else:
+            self._release(name, ordinal)
+
+    def _reindex(self, ordinal: int, old: Tuple, new: Tuple) -> None:
+        (old_paths, old_gvks, old_codes), (paths, gvks, codes) = old, new
+        for path in old_paths - paths:
+            if _postings_discard(self._by_path, path, ordinal):
+                i = bisect.bisect_left(self._sorted_paths, path)
+                del self._sorted_paths[i]
+        for path in paths - old_paths:
+            if _postings_add(self._by_path, path, ordinal):
+                bisect.insort(self._sorted_paths, path)
+        for gvk in old_gvks - gvks:
+            _postings_discard(self._by_gvk, gvk, ordinal)
+        for gvk in gvks - old_gvks:
+            _postings_add(self._by_gvk, gvk, ordinal)
+        for code in old_codes - codes:
+            _postings_discard(self._by_code, code, ordinal)
+        for code in codes - old_codes:
+            _postings_add(self._by_code, code, ordinal)
+
+    def _release(self, name: str, ordinal: int) -> None:
+        del self._ordinals[name]
+        self._errors[ordinal] = frozenset()
+        self._names[ordinal] = ""
+        self._free.append(ordinal)
+
+    def remove(self, name: str) -> bool:
+        """Removes a membership.
+
+        Returns:
+            bool: Whether the membership had errors indexed.
+        """
+        ordinal = self._ordinals.get(name)
+        if ordinal is None:
+            return False
+        self._reindex(ordinal, _project(self._errors[ordinal]), _project(()))
+        self._release(name, ordinal)
+        return True
+
+    def update_from_feature(self, feature: Any, remove_missing: bool = True) -> None:
+        """Indexes every membership state of a ``configmanagement`` Feature.
+
+        Args:
+            feature (google.cloud.gkehub_v1.types.Feature): The Feature.
+            remove_missing (bool): Also drop memberships that no longer
+                appear in ``membership_states``.
+        """
+        states = feature.membership_states
+        for name, state in states.items():
+            self.update(name, state)
+        if remove_missing:
+            for name in [n for n in self._ordinals if n not in states]:
+                self.remove(name)
+
+    def _names_of(self, posting: Iterable[int]) -> Set[str]:
+        names = self._names
+        return {names[ordinal] for ordinal in posting}
+
+    def errors(self, name: str) -> FrozenSet[ErrorKey]:
+        """Returns the indexed errors of a membership."""
+        ordinal = self._ordinals.get(name)
+        return self._errors[ordinal] if ordinal is not None else frozenset()
+
+    def by_source_path(self, path: str) -> Set[str]:
+        """Returns the memberships with errors in the file ``path``."""
+        return self._names_of(self._by_path.get(path, ()))
+
+    def source_paths(self, prefix: str = "") -> List[str]:
+        """Returns the distinct erroneous source paths starting with ``prefix``, sorted."""
+        paths = self._sorted_paths
+        start = bisect.bisect_left(paths, prefix)
+        end = start
+        while end < len(paths) and paths[end].startswith(prefix):
+            end += 1
+        return paths[start:end]
+
+    def by_source_path_prefix(self, prefix: str) -> Set[str]:
+        """Returns the memberships with errors in any file under ``prefix``.
+
+        The prefix is a plain string prefix, so pass ``namespaces/foo/`` to
+        match a directory.
+        """
+        ordinals = set()
+        for path in self.source_paths(prefix):
+            ordinals |= self._by_path[path]
+        return self._names_of(ordinals)
+
+    def by_gvk(self, group: str, version: str, kind: str) -> Set[str]:
+        """Returns the memberships with errors on resources of this kind."""
+        return self._names_of(
+            self._by_gvk.get(GroupVersionKind(group, version, kind), ())
+        )
+
+    def by_code(self, code: str) -> Set[str]:
+        """Returns the memberships reporting the error code ``code``."""
+        return self._names_of(self._by_code.get(code, ()))
+
+    def counts_by_code(self) -> Dict[str, int]:
+        """Returns the number of memberships reporting each error code."""
+        return {code: len(posting) for code, posting in self._by_code.items()}
+
+
+def _project(keys: Iterable[ErrorKey]) -> Tuple[Set[str], Set, Set[str]]:
+    paths, gvks, codes = set(), set(), set()
+    for key in keys:
+        if key.source_path:
+            paths.add(key.source_path)
+        if key.gvk.kind:
+            gvks.add(key.gvk)
+        codes.add(key.code)
+    return paths, gvks, codes
@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Dependency-ordered bulk teardown of memberships.
+
+Before a membership is deleted its entries are removed from every
+Feature's ``membership_specs``, and a Feature whose
+``spec.multiclusteringress.config_membership`` names it must go first.
+:func:`plan_teardown` turns these constraints into a DAG of
+:class:`TeardownStep` objects grouped into levels, with the spec removals
+of each Feature batched into few ``update_feature`` calls.
+:class:`TeardownRunner` executes the levels with bounded concurrency::
+
+    plan = plan_teardown(memberships, client.list_features(parent=parent))
+    report = TeardownRunner(client, on_progress=print).run(plan)
+
+``DeleteFeatureRequest.force`` is only set for Features listed in
+``allow_force``.
+"""
+
+from concurrent import futures
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from google.cloud.gkehub_v1.types import feature as gcg_feature
+from google.cloud.gkehub_v1.types import service
+
+from . import _masks
+from .joins import ProjectAliasCache
+from .names import parse_membership_path
+
+REMOVE_SPECS = "remove_specs"
+DELETE_FEATURE = "delete_feature"
+DELETE_MEMBERSHIP = "delete_membership"
+
+
+class TeardownStep(NamedTuple):
+    """One RPC of a teardown.
+
+    Attributes:
+        kind (str): :data:`REMOVE_SPECS`, :data:`DELETE_FEATURE` or
+            :data:`DELETE_MEMBERSHIP`.
+        target (str): The Feature or Membership name.
+        keys (Tuple[str, ...]): For :data:`REMOVE_SPECS`, the
+            ``membership_specs`` keys removed.
+        force (bool): For :data:`DELETE_FEATURE`, whether ``force`` is set.
+    """
+
+    kind: str
+    target: str
+    keys: Tuple[str, ...] = ()
+    force: bool = False
+
+
+class TeardownProgress(NamedTuple):
+    """Reported to ``on_progress`` as each step completes.
+
+    Attributes:
+        step (TeardownStep): The completed step.
+        error (Optional[Exception]): Why it failed, if it did.
+        completed (int): Steps completed so far, this one included.
+        total (int): Steps in the plan.
+    """
+
+    step: TeardownStep
+    error: Optional[Exception]
+    completed: int
+    total: int
+
+
+class TeardownPlan:
+    """Steps, their dependencies and the resulting levels.
+
+    Attributes:
+        steps (List[TeardownStep]): Every step.
+        dependencies (Dict[int, Set[int]]): The indexes of the steps each
+            step waits for.
+        levels (List[List[int]]): Step indexes in execution order; steps of
+            one level are independent of each other.
+        blocked (Dict[str, str]): Memberships that cannot be deleted, with
+            the reason.
+    """
+
+    def __init__(self, steps: List[TeardownStep], dependencies: Dict[int, Set[int]]):
+        self.steps = steps
+        self.dependencies = dependencies
+        self.levels = _levels(len(steps), dependencies)
+        self.blocked: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+
+def _levels(count: int, dependencies: Dict[int, Set[int]]) -> List[List[int]]:
+    dependents: Dict[int, List[int]] = {i: [] for i in range(count)}
+    remaining = {i: len(dependencies.get(i, ())) for i in range(count)}
+    for step, needs in dependencies.items():
+        for need in needs:
+            dependents[need].append(step)
+    level = [i for i in range(count) if not remaining[i]]
+    levels = []
+    while level:
+        levels.append(level)
+        following = []
+        for step in level:
+            for dependent in dependents[step]:
+                remaining[dependent] -= 1
+                if not remaining[dependent]:
+                    following.append(dependent)
+        level = sorted(following)
+    if sum(len(level) for level in levels) != count:
+        raise ValueError("The teardown dependencies contain a cycle.")
+    return levels
+
+
+class _Matcher:
+    """Maps Feature keys, which may use project numbers, to memberships."""
+
+    def __init__(self, memberships: Iterable[str], cache: ProjectAliasCache):
+        self._cache = cache
+        self._by_suffix: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
+        for name in memberships:
+            parsed = parse_membership_path(name)
+            if not parsed:
+                raise ValueError("Invalid membership name {!r}.".format(name))
+            self._by_suffix.setdefault(
+                (parsed["location"], parsed["membership"]), []
+            ).append((parsed["project"], name))
+
+    def _known(self, project: str) -> bool:
+        return (
+            self._cache.project_number(project) is not None
+            or self._cache.project_id(project) is not None
+        )
+
+    def match(self, key: str) -> Optional[str]:
+        parsed = parse_membership_path(key)
+        if not parsed:
+            return None
+        candidates = self._by_suffix.get((parsed["location"], parsed["membership"]))
+        if not candidates:
+            return None
+        key_project = parsed["project"]
+        project = self._cache.canonical(key_project)
+        for candidate_project, name in candidates:
+            if self._cache.canonical(candidate_project) == project:
+                return name
+        # A number/id pair neither side knows yet: accept an unambiguous
+        # match and learn it, as join_feature_memberships does. A known
+        # project never matches a key from another project.
+        if len(candidates) != 1:
+            return None
+        candidate_project, name = candidates[0]
+        if self._known(key_project) or self._known(candidate_project):
+            return None
+        if key_project.isdigit() and not candidate_project.isdigit():
+            self._cache.learn(key_project, candidate_project)
+            return name
+        return None
+
+
+def plan_teardown(
+    memberships: Iterable[str],
+    features: Iterable[gcg_feature.Feature],
+    delete_features: Iterable[str] = (),
+    allow_force: Iterable[str] = (),
+    batch_size: int = 100,
+    cache: ProjectAliasCache = None,
+) -> TeardownPlan:
+    """Plan the removal of memberships and their Feature entries.
+
+    Args:
+        memberships (Iterable[str]): The memberships to delete.
+        features (Iterable[google.cloud.gkehub_v1.types.Feature]): Every
+            Feature of the memberships' projects, e.g. from
+            ``list_features``.
+        delete_features (Iterable[str]): Feature names to delete outright
+            rather than edit.
+        allow_force (Iterable[str]): Features of ``delete_features`` that
+            may be deleted with ``force=True``.
+        batch_size (int): The most spec entries removed per
+            ``update_feature`` call.
+        cache (ProjectAliasCache): Known project number/id pairs, used to
+            match Feature keys with membership names. Pairs learned from
+            unambiguous matches are added to it.
+
+    Returns:
+        TeardownPlan: The plan. Memberships that are the Multi-cluster
+            Ingress config membership of a Feature not being deleted are
+            left out and listed in ``blocked``.
+
+    Raises:
+        ValueError: If ``allow_force`` names a Feature not being deleted.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be positive.")
+    memberships = list(dict.fromkeys(memberships))
+    delete_features = set(delete_features)
+    allow_force = set(allow_force)
+    if not allow_force <= delete_features:
+        raise ValueError(
+            "force is only allowed for deleted features: {}".format(
+                sorted(allow_force - delete_features)
+            )
+        )
+    matcher = _Matcher(memberships, cache if cache is not None else ProjectAliasCache())
+    features = list(features)
+    blocked: Dict[str, str] = {}
+    for feature in features:
+        config_membership = matcher.match(
+            feature.spec.multiclusteringress.config_membership
+        )
+        if config_membership is not None and feature.name not in delete_features:
+            blocked[config_membership] = (
+                "Multi-cluster Ingress config membership of {}; fail over or "
+                "delete the feature first.".format(feature.name)
+            )
+    steps: List[TeardownStep] = []
+    # membership -> indexes of the steps it must wait for
+    waits_for: Dict[str, Set[int]] = {name: set() for name in memberships}
+    for feature in features:
+        keys = {}
+        for key in feature.membership_specs:
+            name = matcher.match(key)
+            if name is not None and name not in blocked:
+                keys[key] = name
+        if feature.name in delete_features:
+            referenced = set(keys.values())
+            config_membership = matcher.match(
+                feature.spec.multiclusteringress.config_membership
+            )
+            if config_membership is not None and config_membership not in blocked:
+                referenced.add(config_membership)
+            steps.append(
+                TeardownStep(
+                    DELETE_FEATURE, feature.name, force=feature.name in allow_force
+                )
+            )
+            for name in referenced:
+                waits_for[name].add(len(steps) - 1)
+            continue
+        ordered = sorted(keys)
+        for start in range(0, len(ordered), batch_size):
+            batch = tuple(ordered[start : start + batch_size])
+            steps.append(TeardownStep(REMOVE_SPECS, feature.name, keys=batch))
+            for key in batch:
+                waits_for[keys[key]].add(len(steps) - 1)
+    dependencies: Dict[int, Set[int]] = {}
+    for name in memberships:
+        if name in blocked:
+            continue
+        steps.append(TeardownStep(DELETE_MEMBERSHIP, name))
+        dependencies[len(steps) - 1] = waits_for[name]
+    plan = TeardownPlan(steps, dependencies)
+    plan.blocked = blocked
+    return plan
+
+
+class TeardownReport:
+    """The outcome of a teardown.
+
+    Attributes:
+        succeeded (List[TeardownStep]): Steps that completed.
+        failed (Dict[TeardownStep, Exception]): Steps that failed.
+        skipped (List[TeardownStep]): Steps not attempted because a step
+            they depend on failed or was skipped.
+    """
+
+    def __init__(self):
+        self.succeeded: List[TeardownStep] = []
+        self.failed: Dict[TeardownStep, Exception] = {}
+        self.skipped: List[TeardownStep] = []
+
+    @property
+    def ok(self) -> bool:
+        """bool: Whether every step completed."""
+        return not self.failed and not self.skipped
+
+    @property
+    def deleted(self) -> List[str]:
+        """List[str]: The memberships deleted."""
+        return [s.target for s in self.succeeded if s.kind == DELETE_MEMBERSHIP]
+
+
+class TeardownRunner:
+    """Executes a :class:`TeardownPlan` level by level."""
+
+    def __init__(
+        self,
+        client: Any,
+        max_concurrency: int = 8,
+        operation_timeout: float = None,
+        on_progress: Callable[[TeardownProgress], None] = None,
+        **kwargs
+    ):
+        """Instantiates the runner.
+
+        Args:
+            client (google.cloud.gkehub_v1.GkeHubClient): The client.
+            max_concurrency (int): The most steps in flight.
+            operation_timeout (float): The longest wait, in seconds, for
+                each operation.
+            on_progress (Callable[[TeardownProgress], None]): Called from
+                the calling thread as each step completes.
+            kwargs: Passed to every RPC (``retry``, ``timeout``,
+                ``metadata``).
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be positive.")
+        self._client = client
+        self._max_concurrency = max_concurrency
+        self._operation_timeout = operation_timeout
+        self._on_progress = on_progress
+        self._kwargs = kwargs
+
+    def run(self, plan: TeardownPlan) -> TeardownReport:
+        """Runs every step whose dependencies succeeded.
+
+        Returns:
+            TeardownReport: The outcome.
+        """
+        report = TeardownReport()
+        succeeded: Set[int] = set()
+        completed = 0
+        with futures.ThreadPoolExecutor(max_workers=self._max_concurrency) as pool:
+            for level in plan.levels:
+                submitted = {}
+                for index in level:
+                    step = plan.steps[index]
+                    if plan.dependencies.get(index, set()) <= succeeded:
+                        submitted[pool.submit(self._execute, step)] = index
+                    else:
+                        report.skipped.append(step)
+                for future in futures.as_completed(submitted):
+                    index = submitted[future]
+                    step = plan.steps[index]
+                    error = future.exception()
+                    if error is None:
+                        succeeded.add(index)
+                        report.succeeded.append(step)
+                    else:
+                        report.failed[step] = error
+                    completed += 1
+                    if self._on_progress is not None:
+                        self._on_progress(
+                            TeardownProgress(step, error, completed, len(plan.steps))
+                        )
+        return report
+
+    def _execute(self, step: TeardownStep) -> Any:
+        if step.kind == REMOVE_SPECS:
+            operation = self._client.update_feature(
+                name=step.target,
+                resource=gcg_feature.Feature(name=step.target),
+                update_mask=_masks.field_mask(
+                    _masks.map_key_path("membership_specs", key) for key in step.keys
+                ),
+                **self._kwargs
+            )
+        elif step.kind == DELETE_FEATURE:
+            operation = self._client.delete_feature(
+                request=service.DeleteFeatureRequest(
+                    name=step.target, force=step.force
+                ),
+                **self._kwargs
+            )
+        else:
+            operation = self._client.delete_membership(name=step.target, **self._kwargs)
+        return operation.result(timeout=self._operation_timeout)
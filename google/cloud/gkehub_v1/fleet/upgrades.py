@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Fleet-wide preparation of Connect agent upgrades.
+
+A membership's agent version is
+``endpoint.kubernetes_resource.resource_options.connect_version``.
+:class:`ConnectUpgradePlanner` streams a membership listing through an
+:class:`AgentVersionIndex`, and as soon as a stale membership is seen it
+calls ``generate_connect_manifest`` with ``is_upgrade=True``, concurrently
+and under a rate limit, writing each cluster's manifest to its own file::
+
+    planner = ConnectUpgradePlanner(client, "out", target_version="1.9.0")
+    report = planner.run(client.list_memberships(parent=parent))
+
+Files are named ``<project>/<location>/<membership>.yaml`` under the
+output directory and hold the returned resources as one multi-document
+YAML stream.
+"""
+
+import os
+import re
+import threading
+from concurrent import futures
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from google.cloud.gkehub_v1.types import service
+
+from . import _files
+from .manifests import ManifestCache
+from .names import parse_membership_path
+from .ratelimit import TokenBucket
+
+
+def _version_key(version: str) -> Tuple[Tuple[int, int, str], ...]:
+    # Numeric parts compare as numbers. The end of the version sorts after
+    # textual parts and before numeric ones, so "1.10.0" > "1.9.0" and
+    # "1.9.0" > "1.9.0-rc1" > "1.9".
+    parts = [
+        (2, int(part), "") if part.isdigit() else (0, 0, part)
+        for part in re.split(r"[.\-+_]", version)
+        if part
+    ]
+    parts.append((1, 0, ""))
+    return tuple(parts)
+
+
+def connect_version(membership: Any) -> str:
+    """Returns the Connect agent version of a v1 or v1beta1 membership."""
+    return membership.endpoint.kubernetes_resource.resource_options.connect_version
+
+
+class AgentVersionIndex:
+    """Memberships grouped by Connect agent version.
+
+    Staleness is decided once per distinct version rather than once per
+    membership.
+    """
+
+    def __init__(self, target_version: str, include_unset: bool = False):
+        """Instantiates an empty index.
+
+        Args:
+            target_version (str): The version being upgraded to.
+            include_unset (bool): Whether memberships without a version
+                count as stale. An unset version means the agent runs the
+                latest release, so they do not by default.
+        """
+        if not target_version:
+            raise ValueError("target_version is required.")
+        self.target_version = target_version
+        self._target_key = _version_key(target_version)
+        self._include_unset = include_unset
+        self._members: Dict[str, List[str]] = {}
+        self._stale: Dict[str, bool] = {}
+
+    def is_stale(self, version: str) -> bool:
+        """Returns whether agents at a version need upgrading."""
+        stale = self._stale.get(version)
+        if stale is None:
+            if not version:
+                stale = self._include_unset
+            else:
+                stale = _version_key(version) < self._target_key
+            self._stale[version] = stale
+        return stale
+
+    def add(self, name: str, version: str) -> bool:
+        """Indexes a membership and returns whether it is stale."""
+        self._members.setdefault(version, []).append(name)
+        return self.is_stale(version)
+
+    def add_membership(self, membership: Any) -> bool:
+        """Indexes a v1 or v1beta1 membership and returns whether it is stale."""
+        return self.add(membership.name, connect_version(membership))
+
+    def versions(self) -> Dict[str, int]:
+        """Returns the number of memberships at each version."""
+        return {version: len(names) for version, names in self._members.items()}
+
+    def members(self, version: str) -> List[str]:
+        """Returns the memberships at a version."""
+        return list(self._members.get(version, ()))
+
+    def stale(self) -> List[str]:
+        """Returns every stale membership, oldest version first."""
+        versions = sorted(
+            (v for v in self._members if self.is_stale(v)), key=_version_key
+        )
+        return [name for version in versions for name in self._members[version]]
+
+    def __len__(self) -> int:
+        return sum(len(names) for names in self._members.values())
+
+
+class UpgradeResult(NamedTuple):
+    """The manifest prepared for one membership.
+
+    Attributes:
+        membership (str): The membership name.
+        version (str): Its current agent version.
+        path (Optional[str]): The file written, unless it failed.
+        error (Optional[Exception]): Why it failed, if it did.
+    """
+
+    membership: str
+    version: str
+    path: Optional[str]
+    error: Optional[Exception] = None
+
+
+class UpgradeReport:
+    """The outcome of :meth:`ConnectUpgradePlanner.run`.
+
+    Attributes:
+        scanned (int): Memberships read.
+        written (Dict[str, str]): The file written for each stale membership.
+        failed (Dict[str, Exception]): Stale memberships whose manifest
+            could not be prepared.
+        versions (Dict[str, int]): The number of memberships at each version.
+    """
+
+    def __init__(self):
+        self.scanned = 0
+        self.written: Dict[str, str] = {}
+        self.failed: Dict[str, Exception] = {}
+        self.versions: Dict[str, int] = {}
+
+    @property
+    def ok(self) -> bool:
+        """bool: Whether every stale membership's manifest was written."""
+        return not self.failed
+
+    @property
+    def current(self) -> int:
+        """int: Memberships that need no upgrade."""
+        return self.scanned - len(self.written) - len(self.failed)
+
+
+def _write_manifest(path: str, response: Any) -> None:
+    documents = []
+    for resource in response.manifest:
+        document = resource.manifest
+        if not document.endswith("\n"):
+            document += "\n"
+        documents.append(document)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _files.write_atomically(path, "---\n".join(documents))
+
+
+class _RateLimitedClient:
+    # Takes a token per call that reaches the client, so cache hits are free.
+
+    def __init__(self, client: Any, limiter: TokenBucket):
+        self._client = client
+        self._limiter = limiter
+
+    def generate_connect_manifest(self, request: Any, **kwargs) -> Any:
+        self._limiter.acquire()
+        return self._client.generate_connect_manifest(request=request, **kwargs)
+
+
+class ConnectUpgradePlanner:
+    """Writes upgrade manifests for every membership with a stale agent."""
+
+    def __init__(
+        self,
+        client: Any,
+        output_dir: str,
+        target_version: str,
+        template: Any = None,
+        include_unset: bool = False,
+        rate: float = 10.0,
+        burst: float = None,
+        max_concurrency: int = 16,
+        cache: ManifestCache = None,
+        on_result: Callable[[UpgradeResult], None] = None,
+        **kwargs
+    ):
+        """Instantiates the planner.
+
+        Args:
+            client (google.cloud.gkehub_v1.GkeHubClient): The client; a
+                v1beta1 ``GkeHubMembershipServiceClient`` works with a
+                v1beta1 ``template``.
+            output_dir (str): Where manifests are written.
+            target_version (str): The agent version being upgraded to.
+            template (Any): A ``GenerateConnectManifestRequest`` whose
+                fields, other than ``name`` and ``is_upgrade``, are used for
+                every request; defaults to a v1 request for
+                ``target_version``.
+            include_unset (bool): See :class:`AgentVersionIndex`.
+            rate (float): The most ``generate_connect_manifest`` calls per
+                second.
+            burst (float): The largest burst of calls; see
+                :class:`TokenBucket`.
+            max_concurrency (int): The most calls in flight.
+            cache (ManifestCache): Serves repeated requests without a call.
+            on_result (Callable[[UpgradeResult], None]): Called from a
+                worker thread, one call at a time, as each membership
+                completes.
+            kwargs: Passed to ``generate_connect_manifest`` (``retry``,
+                ``timeout``, ``metadata``).
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be positive.")
+        if template is None:
+            template = service.GenerateConnectManifestRequest(version=target_version)
+        self._client = _RateLimitedClient(client, TokenBucket(rate, burst))
+        self._output_dir = os.path.expanduser(output_dir)
+        self._target_version = target_version
+        self._template = template
+        self._include_unset = include_unset
+        self._max_concurrency = max_concurrency
+        self._cache = cache
+        self._on_result = on_result
+        self._kwargs = kwargs
+        self.index = None  # type: Optional[AgentVersionIndex]
+
+    def path_for(self, membership: str) -> str:
+        """Returns the file a membership's manifest is written to."""
+        parsed = parse_membership_path(membership)
+        if not parsed:
+            raise ValueError("Invalid membership name {!r}.".format(membership))
+        return os.path.join(
+            self._output_dir,
+            parsed["project"],
+            parsed["location"],
+            parsed["membership"] + ".yaml",
+        )
+
+    def request_for(self, membership: str) -> Any:
+        """Returns the ``GenerateConnectManifestRequest`` for a membership."""
+        request_type = type(self._template)
+        request = request_type()
+        pb = request_type.pb(request)
+        pb.CopyFrom(request_type.pb(self._template))
+        pb.name = membership
+        pb.is_upgrade = True
+        return request
+
+    def run(self, memberships: Iterable[Any]) -> UpgradeReport:
+        """Indexes memberships and writes a manifest for each stale one.
+
+        Generation starts while ``memberships`` is still being read. At
+        most ``max_concurrency`` stale memberships are in flight; reading
+        pauses until one of them is written.
+
+        Args:
+            memberships (Iterable[Any]): v1 or v1beta1 memberships, e.g. the
+                pager returned by ``list_memberships``.
+
+        Returns:
+            UpgradeReport: The outcome; the index is kept as :attr:`index`.
+        """
+        report = UpgradeReport()
+        index = self.index = AgentVersionIndex(
+            self._target_version, self._include_unset
+        )
+        lock = threading.Lock()
+        pending = set()
+        with futures.ThreadPoolExecutor(max_workers=self._max_concurrency) as pool:
+            for membership in memberships:
+                report.scanned += 1
+                version = connect_version(membership)
+                if not index.add(membership.name, version):
+                    continue
+                pending.add(
+                    pool.submit(self._prepare, membership.name, version, report, lock)
+                )
+                if len(pending) >= self._max_concurrency:
+                    _, pending = futures.wait(
+                        pending, return_when=futures.FIRST_COMPLETED
+                    )
+            futures.wait(pending)
+        report.versions = index.versions()
+        return report
+
+    def _generate(self, request: Any) -> Any:
+        if self._cache is not None:
+            return self._cache.generate(self._client, request, **self._kwargs)
+        return self._client.generate_connect_manifest(request=request, **self._kwargs)
+
+    def _prepare(
+        self, name: str, version: str, report: UpgradeReport, lock: threading.Lock
+    ) -> None:
+        try:
+            path = self.path_for(name)
+            _write_manifest(path, self._generate(self.request_for(name)))
+        except Exception as exc:
+            result = UpgradeResult(name, version, None, exc)
+        else:
+            result = UpgradeResult(name, version, path)
+        with lock:
+            if result.error is None:
+                report.written[name] = result.path
+            else:
+                report.failed[name] = result.error
+            if self._on_result is not None:
+                self._on_result(result)
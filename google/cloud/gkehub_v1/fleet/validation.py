@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Offline validation of Config Management membership specs.
+
+A malformed ``configmanagement.MembershipSpec`` is otherwise only reported
+once ``update_feature`` has started a long-running operation.
+:func:`validate_spec` checks the ``ConfigSync``/``GitConfig``,
+``PolicyController`` and ``HierarchyControllerConfig`` parts locally and
+returns :class:`Finding` records; :func:`validate_specs` checks many specs
+in a process pool::
+
+    findings = validate_specs(desired_specs)
+    if has_errors(findings):
+        ...
+
+The checks mirror the documented constraints of the ConfigManagement
+resource; they cannot tell whether a repository or secret actually exists.
+"""
+
+from concurrent import futures
+import functools
+import operator
+import re
+from typing import Any, Iterable, Iterator, List, Mapping, NamedTuple, Tuple
+
+from google.cloud.gkehub_v1 import configmanagement_v1
+from google.cloud.gkehub_v1.types import feature as gcg_feature
+
+from .mapreduce import iter_partials
+
+ERROR = "ERROR"
+WARNING = "WARNING"
+
+SECRET_TYPES = frozenset(
+    ("none", "ssh", "cookiefile", "token", "gcenode", "gcpserviceaccount")
+)
+SOURCE_FORMATS = frozenset(("hierarchy", "unstructured"))
+MAX_SYNC_WAIT_SECS = 3600
+
+_SSH_REPO = re.compile(r"^(ssh://|[\w.-]+@[\w.-]+:)")
+_HTTP_REPO = re.compile(r"^https?://[^/\s]+")
+_NAMESPACE = re.compile(r"^[a-z0-9]([-a-z0-9]*[a-z0-9])?$")
+_VERSION = re.compile(r"^\d+\.\d+\.\d+$")
+_HIERARCHY_DIRS = frozenset(("system", "cluster", "namespaces"))
+
+
+class Finding(NamedTuple):
+    """One problem found in a spec.
+
+    Attributes:
+        membership (str): The membership the spec is for; may be empty.
+        path (str): The offending field, e.g. ``config_sync.git.sync_repo``.
+        code (str): A stable identifier such as ``EMPTY_SYNC_REPO``.
+        message (str): A human-readable explanation.
+        severity (str): :data:`ERROR` for specs the server would reject or
+            that cannot work, :data:`WARNING` for likely mistakes.
+    """
+
+    membership: str
+    path: str
+    code: str
+    message: str
+    severity: str = ERROR
+
+
+def _pb(spec: Any) -> Any:
+    if isinstance(spec, configmanagement_v1.MembershipSpec):
+        return configmanagement_v1.MembershipSpec.pb(spec)
+    if isinstance(spec, Mapping):
+        return configmanagement_v1.MembershipSpec.pb(
+            configmanagement_v1.MembershipSpec(spec)
+        )
+    return spec
+
+
+def _check_git(git: Any, source_format: str, max_sync_wait_secs: int) -> Iterator:
+    repo = git.sync_repo.strip()
+    secret_type = git.secret_type
+    if not repo:
+        yield ("git.sync_repo", "EMPTY_SYNC_REPO", "sync_repo is required.", ERROR)
+    elif not (_HTTP_REPO.match(repo) or _SSH_REPO.match(repo)):
+        yield (
+            "git.sync_repo",
+            "INVALID_SYNC_REPO",
+            "sync_repo {!r} is not an HTTP(S) or SSH URL.".format(repo),
+            ERROR,
+        )
+    if not secret_type:
+        yield (
+            "git.secret_type",
+            "MISSING_SECRET_TYPE",
+            "secret_type is required; use 'none' for public repositories.",
+            ERROR,
+        )
+    elif secret_type not in SECRET_TYPES:
+        yield (
+            "git.secret_type",
+            "INVALID_SECRET_TYPE",
+            "secret_type {!r} is not one of {}.".format(
+                secret_type, ", ".join(sorted(SECRET_TYPES))
+            ),
+            ERROR,
+        )
+    elif repo and secret_type == "ssh" and not _SSH_REPO.match(repo):
+        yield (
+            "git.secret_type",
+            "SECRET_TYPE_URL_MISMATCH",
+            "secret_type 'ssh' needs an SSH sync_repo URL.",
+            ERROR,
+        )
+    elif repo and secret_type in ("cookiefile", "token") and _SSH_REPO.match(repo):
+        yield (
+            "git.secret_type",
+            "SECRET_TYPE_URL_MISMATCH",
+            "secret_type {!r} needs an HTTPS sync_repo URL.".format(secret_type),
+            ERROR,
+        )
+    if secret_type == "gcpserviceaccount" and not git.gcp_service_account_email:
+        yield (
+            "git.gcp_service_account_email",
+            "MISSING_SERVICE_ACCOUNT",
+            "secret_type 'gcpserviceaccount' needs gcp_service_account_email.",
+            ERROR,
+        )
+    elif git.gcp_service_account_email and secret_type != "gcpserviceaccount":
+        yield (
+            "git.gcp_service_account_email",
+            "UNUSED_SERVICE_ACCOUNT",
+            "gcp_service_account_email is ignored unless secret_type is "
+            "'gcpserviceaccount'.",
+            WARNING,
+        )
+    if not 0 <= git.sync_wait_secs <= max_sync_wait_secs:
+        yield (
+            "git.sync_wait_secs",
+            "SYNC_WAIT_SECS_OUT_OF_RANGE",
+            "sync_wait_secs must be between 0 (default) and {}, got {}.".format(
+                max_sync_wait_secs, git.sync_wait_secs
+            ),
+            ERROR,
+        )
+    policy_dir = git.policy_dir
+    if policy_dir.startswith("/") or ".." in policy_dir.split("/"):
+        yield (
+            "git.policy_dir",
+            "INVALID_POLICY_DIR",
+            "policy_dir must be a relative path inside the repository.",
+            ERROR,
+        )
+    for field in ("sync_branch", "sync_rev"):
+        value = getattr(git, field)
+        if value != value.strip() or " " in value or value.startswith("-"):
+            yield (
+                "git." + field,
+                "INVALID_REVISION",
+                "{} {!r} is not a valid git reference.".format(field, value),
+                ERROR,
+            )
+    if git.https_proxy:
+        if not _HTTP_REPO.match(git.https_proxy):
+            yield (
+                "git.https_proxy",
+                "INVALID_HTTPS_PROXY",
+                "https_proxy must be an HTTP(S) URL.",
+                ERROR,
+            )
+        elif _SSH_REPO.match(repo):
+            yield (
+                "git.https_proxy",
+                "UNUSED_HTTPS_PROXY",
+                "https_proxy is ignored for SSH repositories.",
+                WARNING,
+            )
+    # An empty policy_dir is the repository root. A set one that names one
+    # of the hierarchy's own directories points inside the hierarchy.
+    if (
+        source_format == "hierarchy"
+        and policy_dir
+        and policy_dir.rstrip("/").rsplit("/", 1)[-1] in _HIERARCHY_DIRS
+    ):
+        yield (
+            "source_format",
+            "SOURCE_FORMAT_MISMATCH",
+            "The hierarchy source format expects policy_dir to hold the "
+            "system/, cluster/ and namespaces/ directories, not to be one "
+            "of them.",
+            WARNING,
+        )
+
+
+def _check_config_sync(config_sync: Any, max_sync_wait_secs: int) -> Iterator:
+    source_format = config_sync.source_format
+    if source_format and source_format not in SOURCE_FORMATS:
+        yield (
+            "source_format",
+            "SOURCE_FORMAT_MISMATCH",
+            "source_format {!r} is not one of {}.".format(
+                source_format, ", ".join(sorted(SOURCE_FORMATS))
+            ),
+            ERROR,
+        )
+    if not config_sync.HasField("git"):
+        yield ("git", "MISSING_GIT", "config_sync needs a git source.", ERROR)
+        return
+    yield from _check_git(config_sync.git, source_format, max_sync_wait_secs)
+
+
+def _check_policy_controller(policy_controller: Any) -> Iterator:
+    if (
+        policy_controller.HasField("audit_interval_seconds")
+        and policy_controller.audit_interval_seconds < 0
+    ):
+        yield (
+            "audit_interval_seconds",
+            "NEGATIVE_AUDIT_INTERVAL",
+            "audit_interval_seconds must be 0 (disabled) or positive.",
+            ERROR,
+        )
+    seen = set()
+    for namespace in policy_controller.exemptable_namespaces:
+        if not _NAMESPACE.match(namespace) or len(namespace) > 63:
+            yield (
+                "exemptable_namespaces",
+                "INVALID_NAMESPACE",
+                "{!r} is not a valid namespace name.".format(namespace),
+                ERROR,
+            )
+        elif namespace in seen:
+            yield (
+                "exemptable_namespaces",
+                "DUPLICATE_NAMESPACE",
+                "{!r} is listed more than once.".format(namespace),
+                WARNING,
+            )
+        seen.add(namespace)
+    if not policy_controller.enabled and (
+        policy_controller.exemptable_namespaces
+        or policy_controller.referential_rules_enabled
+        or policy_controller.log_denies_enabled
+        or policy_controller.HasField("template_library_installed")
+        or policy_controller.HasField("audit_interval_seconds")
+    ):
+        yield (
+            "enabled",
+            "SETTINGS_WHILE_DISABLED",
+            "Policy Controller settings have no effect while it is disabled.",
+            WARNING,
+        )
+
+
+def _check_hierarchy_controller(hierarchy_controller: Any) -> Iterator:
+    if not hierarchy_controller.enabled and (
+        hierarchy_controller.enable_pod_tree_labels
+        or hierarchy_controller.enable_hierarchical_resource_quota
+    ):
+        yield (
+            "enabled",
+            "SETTINGS_WHILE_DISABLED",
+            "Hierarchy Controller settings have no effect while it is disabled.",
+            WARNING,
+        )
+
+
+def validate_spec(
+    spec: Any, membership: str = "", max_sync_wait_secs: int = MAX_SYNC_WAIT_SECS
+) -> List[Finding]:
+    """Check one Config Management membership spec.
+
+    Args:
+        spec (Any): A ``configmanagement_v1.MembershipSpec``, its raw
+            protobuf, or an equivalent dict.
+        membership (str): Recorded in each finding.
+        max_sync_wait_secs (int): The largest accepted ``sync_wait_secs``.
+
+    Returns:
+        List[Finding]: The findings, in field order; empty for a valid spec.
+    """
+    pb = _pb(spec)
+    checks: List[Tuple[str, Iterable]] = []
+    if pb.HasField("config_sync"):
+        checks.append(
+            ("config_sync.", _check_config_sync(pb.config_sync, max_sync_wait_secs))
+        )
+    if pb.HasField("policy_controller"):
+        checks.append(
+            ("policy_controller.", _check_policy_controller(pb.policy_controller))
+        )
+    if pb.HasField("hierarchy_controller"):
+        checks.append(
+            (
+                "hierarchy_controller.",
+                _check_hierarchy_controller(pb.hierarchy_controller),
+            )
+        )
+    findings = [
+        Finding(membership, prefix + path, code, message, severity)
+        for prefix, check in checks
+        for path, code, message, severity in check
+    ]
+    if pb.version and not _VERSION.match(pb.version):
+        findings.append(
+            Finding(
+                membership,
+                "version",
+                "INVALID_VERSION",
+                "version {!r} is not of the form 1.2.3.".format(pb.version),
+            )
+        )
+    return findings
+
+
+def _validate_entries(feature: Any, max_sync_wait_secs: int) -> List[Finding]:
+    # ``feature`` carries specs to the workers in its membership_specs map.
+    findings = []
+    for membership, spec in feature.membership_specs.items():
+        findings.extend(
+            validate_spec(spec.configmanagement, membership, max_sync_wait_secs)
+        )
+    return findings
+
+
+def validate_specs(
+    specs: Mapping[str, Any],
+    workers: int = None,
+    executor: futures.Executor = None,
+    chunk_size: int = 256,
+    max_sync_wait_secs: int = MAX_SYNC_WAIT_SECS,
+    max_pending: int = None,
+) -> List[Finding]:
+    """Check many specs, in parallel worker processes.
+
+    Specs are shipped to the workers in chunks of ``chunk_size`` through
+    :func:`~google.cloud.gkehub_v1.fleet.mapreduce.iter_partials`. ``None``
+    values (entries to be removed) are skipped.
+
+    Args:
+        specs (Mapping[str, Any]): Membership name to spec, in any form
+            accepted by :func:`validate_spec`.
+        workers (int): The number of worker processes; ``0`` validates in
+            the calling process. Ignored when ``executor`` is given.
+        executor (concurrent.futures.Executor): An executor to reuse
+            instead of creating a process pool.
+        chunk_size (int): Specs per unit of work.
+        max_sync_wait_secs (int): See :func:`validate_spec`.
+        max_pending (int): The most chunks submitted but not yet checked;
+            see :func:`~google.cloud.gkehub_v1.fleet.mapreduce.iter_partials`.
+
+    Returns:
+        List[Finding]: Every finding, sorted by membership and then path.
+    """
+
+    def entries():
+        for membership, spec in specs.items():
+            if spec is not None:
+                entry = gcg_feature.Feature()
+                entry_pb = gcg_feature.Feature.pb(entry)
+                entry_pb.membership_specs[membership].configmanagement.CopyFrom(
+                    _pb(spec)
+                )
+                yield entry
+
+    findings: List[Finding] = []
+    for partial in iter_partials(
+        entries(),
+        functools.partial(_validate_entries, max_sync_wait_secs=max_sync_wait_secs),
+        operator.iadd,
+        workers=workers,
+        executor=executor,
+        page_size=chunk_size,
+        max_pending=max_pending,
+    ):
+        findings.extend(partial)
+    findings.sort(key=lambda finding: (finding.membership, finding.path))
+    return findings
+
+
+def validate_feature(feature: Any, **kwargs) -> List[Finding]:
+    """Check every ``configmanagement`` spec of a Feature.
+
+    Args:
+        feature (google.cloud.gkehub_v1.types.Feature): The Feature.
+        kwargs: Passed to :func:`validate_specs`.
+
+    Returns:
+        List[Finding]: Every finding.
+    """
+    specs = {
+        membership: spec.configmanagement
+        for membership, spec in feature.membership_specs.items()
+        if "configmanagement" in spec
+    }
+    return validate_specs(specs, **kwargs)
+
+
+def has_errors(findings: Iterable[Finding]) -> bool:
+    """Returns whether any finding is an :data:`ERROR`."""
+    return any(finding.severity == ERROR for finding in findings)
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Helpers shared by the fleet tests."""
+
+import threading
+
+import mock
+
+
+def member(i, project="p"):
+    """Returns the name of the ``i``-th membership in a project.
+
+    Names are zero-padded so that they sort in creation order.
+    """
+    return "projects/{}/locations/global/memberships/m{:02d}".format(project, i)
+
+
+class FakeClient:
+    """A client that records calls and returns mock operations.
+
+    Tests subclass it with the client methods they exercise.
+    """
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def record(self, call):
+        with self.lock:
+            self.calls.append(call)
+
+    def operation(self, result=None, error=None):
+        """Returns an operation whose ``result()`` returns or raises."""
+        operation = mock.Mock()
+        if error is not None:
+            operation.result.side_effect = error
+        else:
+            operation.result.return_value = result
+        return operation
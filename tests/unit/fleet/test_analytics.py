@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+import math
+import random
+
+import pytest
+
+from google.cloud.gkehub_v1 import configmanagement_v1
+from google.cloud.gkehub_v1.fleet import analytics
+from google.cloud.gkehub_v1.types import feature as gcg_feature
+
+from ._helpers import member
+
+NOW = 1_600_000_000
+
+
+def _state(syncer="1.9.0", gatekeeper="v3.4.0", lag=None):
+    sync_state = {}
+    if lag is not None:
+        sync_state["last_sync_time"] = {"seconds": NOW - lag}
+    return gcg_feature.MembershipFeatureState(
+        configmanagement={
+            "operator_state": {"version": "1.9.0"},
+            "config_sync_state": {
+                "version": {"syncer": syncer},
+                "sync_state": sync_state,
+            },
+            "policy_controller_state": {"version": {"version": gatekeeper}},
+        }
+    )
+
+
+def _feature(states):
+    return gcg_feature.Feature(
+        membership_states={member(i): state for i, state in enumerate(states)}
+    )
+
+
+def test_tdigest_empty():
+    digest = analytics.TDigest()
+    assert len(digest) == 0
+    assert math.isnan(digest.quantile(0.5))
+    assert digest.centroids() == []
+
+
+def test_tdigest_invalid_arguments():
+    with pytest.raises(ValueError):
+        analytics.TDigest(compression=1)
+    digest = analytics.TDigest()
+    with pytest.raises(ValueError):
+        digest.add(1, weight=0)
+    with pytest.raises(ValueError):
+        digest.quantile(1.5)
+
+
+def test_tdigest_single_value():
+    digest = analytics.TDigest()
+    digest.add(7)
+    assert digest.quantile(0) == 7
+    assert digest.quantile(0.5) == 7
+    assert digest.quantile(1) == 7
+
+
+def test_tdigest_quantiles_are_accurate_in_bounded_memory():
+    rng = random.Random(0)
+    values = [rng.expovariate(1 / 60) for _ in range(50000)]
+    digest = analytics.TDigest(compression=100)
+    for value in values:
+        digest.add(value)
+    values.sort()
+    assert len(digest.centroids()) <= 200
+    assert digest.quantile(0) == values[0]
+    assert digest.quantile(1) == values[-1]
+    for q in (0.01, 0.5, 0.9, 0.99, 0.999):
+        exact = values[int(q * len(values))]
+        assert digest.quantile(q) == pytest.approx(exact, rel=0.05)
+
+
+def test_tdigest_merge_matches_single_digest():
+    rng = random.Random(1)
+    values = [rng.uniform(0, 1000) for _ in range(20000)]
+    parts = [analytics.TDigest() for _ in range(4)]
+    for i, value in enumerate(values):
+        parts[i % 4].add(value)
+    merged = analytics.TDigest()
+    for part in parts:
+        assert merged.merge(part) is merged
+    assert len(merged) == len(values)
+    assert merged.min == min(values)
+    assert merged.max == max(values)
+    for q in (0.1, 0.5, 0.95):
+        assert merged.quantile(q) == pytest.approx(1000 * q, abs=15)
+
+
+def test_tdigest_dict_round_trip():
+    digest = analytics.TDigest()
+    for value in range(1000):
+        digest.add(value)
+    restored = analytics.TDigest.from_dict(json.loads(json.dumps(digest.to_dict())))
+    assert len(restored) == 1000
+    assert (restored.min, restored.max) == (0, 999)
+    assert restored.quantile(0.5) == digest.quantile(0.5)
+    assert analytics.TDigest.from_dict(analytics.TDigest().to_dict()).count == 0
+
+
+def test_stats_version_histograms():
+    stats = analytics.ConfigManagementStats()
+    stats.add_feature(
+        _feature(
+            [
+                _state(),
+                _state(syncer="1.10.0"),
+                _state(gatekeeper=""),
+                gcg_feature.MembershipFeatureState(),
+            ]
+        ),
+        now=NOW,
+    )
+    assert stats.memberships == 4
+    assert stats.without_state == 1
+    assert stats.version_histogram("config_sync.syncer") == {
+        "1.9.0": 2,
+        "1.10.0": 1,
+    }
+    assert stats.version_histogram("policy_controller") == {"v3.4.0": 2}
+    assert stats.version_histogram("operator") == {"1.9.0": 3}
+    assert stats.version_histogram("hierarchy_controller.hnc") == {}
+    assert stats.version_drift("config_sync.syncer") == pytest.approx(
+        {"1.9.0": 2 / 3, "1.10.0": 1 / 3}
+    )
+
+
+def test_stats_sync_lag():
+    stats = analytics.ConfigManagementStats()
+    stats.add_states([_state(lag=lag) for lag in range(1, 101)], now=NOW)
+    stats.add(_state(), now=NOW)
+    stats.add(_state(lag=-5), now=NOW)
+    assert stats.never_synced == 1
+    assert len(stats.lag) == 101
+    assert stats.lag.min == 0
+    percentiles = stats.lag_percentiles((50, 99))
+    assert percentiles[50] == pytest.approx(50, abs=2)
+    assert percentiles[99] == pytest.approx(99, abs=2)
+    assert stats.lag_at_most(50) == pytest.approx(0.5, abs=0.05)
+    assert math.isnan(analytics.ConfigManagementStats().lag_at_most(10))
+
+
+def test_stats_default_to_the_current_time():
+    stats = analytics.ConfigManagementStats()
+    stats.add(_state(lag=NOW - 1))
+    stats.add_states([_state(lag=NOW - 1)])
+    stats.add(
+        gcg_feature.MembershipFeatureState(
+            configmanagement={"operator_state": {"version": "1.9.0"}}
+        )
+    )
+    assert len(stats.lag) == 2
+    assert stats.lag.min > 0
+    assert stats.never_synced == 0
+    assert stats.version_histogram("operator") == {"1.9.0": 3}
+
+
+def test_stats_accepts_configmanagement_states():
+    stats = analytics.ConfigManagementStats()
+    state = configmanagement_v1.MembershipState(
+        config_sync_state={"version": {"syncer": "1.9.0"}}
+    )
+    stats.add(state)
+    stats.add(configmanagement_v1.MembershipState.pb(state))
+    stats.add(None)
+    assert stats.version_histogram("config_sync.syncer") == {"1.9.0": 2}
+    assert stats.without_state == 1
+    assert stats.never_synced == 2
+
+
+def test_stats_merge_and_round_trip():
+    first = analytics.ConfigManagementStats()
+    first.add_feature(_feature([_state(lag=10), _state(lag=20)]), now=NOW)
+    second = analytics.ConfigManagementStats()
+    second.add_feature(
+        _feature(
+            [_state(syncer="1.10.0", lag=30), gcg_feature.MembershipFeatureState()]
+        ),
+        now=NOW,
+    )
+    shipped = json.loads(json.dumps(second.to_dict()))
+    merged = first.merge(analytics.ConfigManagementStats.from_dict(shipped))
+    assert merged is first
+    assert merged.memberships == 4
+    assert merged.without_state == 1
+    assert merged.version_histogram("config_sync.syncer") == {
+        "1.9.0": 2,
+        "1.10.0": 1,
+    }
+    assert len(merged.lag) == 3
+    assert (merged.lag.min, merged.lag.max) == (10, 30)
+
+
+def test_stats_reads_raw_feature():
+    feature = _feature([_state(lag=5)])
+    stats = analytics.ConfigManagementStats()
+    stats.add_feature(gcg_feature.Feature.pb(feature), now=NOW)
+    assert stats.version_histogram("config_sync.syncer") == {"1.9.0": 1}
+    assert stats.lag_percentiles((50,)) == {50: 5}
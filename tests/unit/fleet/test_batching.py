@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import threading
+
+import pytest
+
+from google.cloud.gkehub_v1.fleet import _masks
+from google.cloud.gkehub_v1.fleet import batching
+from google.cloud.gkehub_v1.types import feature as gcg_feature
+
+from . import _helpers
+from ._helpers import member
+
+FEATURE = "projects/p/locations/global/features/configmanagement"
+
+
+def _spec(version):
+    return gcg_feature.MembershipFeatureSpec(
+        configmanagement={"version": "1.{}".format(version)}
+    )
+
+
+class FakeClient(_helpers.FakeClient):
+    def __init__(self, gate=None, error=None):
+        super().__init__()
+        self.gate = gate
+        self.error = error
+        self.called = threading.Event()
+
+    def update_feature(self, name, resource, update_mask, **kwargs):
+        self.record((name, resource, update_mask, kwargs))
+        self.called.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.operation(resource)
+
+
+def test_map_key_path():
+    assert _masks.map_key_path("labels", "env") == "labels.env"
+    assert (
+        _masks.map_key_path("membership_specs", member(1))
+        == "membership_specs.`projects/p/locations/global/memberships/m01`"
+    )
+    assert _masks.quote_segment("a`b") == "`a\\`b`"
+    assert _masks.field_mask(["b", "a", "b"]).paths == ["a", "b"]
+
+
+def test_changes_in_window_are_merged():
+    client = FakeClient()
+    batcher = batching.FeatureUpdateBatcher(client, window=0.05, timeout=30)
+    futures = [batcher.submit(FEATURE, member(i), _spec(i)) for i in range(3)]
+    results = [f.result(timeout=5) for f in futures]
+    assert len(client.calls) == 1
+    name, resource, mask, kwargs = client.calls[0]
+    assert name == FEATURE
+    assert kwargs == {"timeout": 30}
+    assert sorted(resource.membership_specs) == [member(i) for i in range(3)]
+    assert mask.paths == ["membership_specs.`{}`".format(member(i)) for i in range(3)]
+    assert all(r is results[0] for r in results)
+    assert batcher.metrics.snapshot()["batch_sizes"] == {3: 1}
+
+
+def test_last_change_to_an_entry_wins():
+    client = FakeClient()
+    batcher = batching.FeatureUpdateBatcher(client, window=0.05)
+    first = batcher.submit(FEATURE, member(1), _spec(1))
+    second = batcher.submit(FEATURE, member(1), _spec(2))
+    removed = batcher.submit(FEATURE, member(2), None)
+    assert first.result(timeout=5) is second.result(timeout=5)
+    removed.result(timeout=5)
+    _, resource, mask, _ = client.calls[0]
+    assert list(resource.membership_specs) == [member(1)]
+    assert resource.membership_specs[member(1)].configmanagement.version == "1.2"
+    assert len(mask.paths) == 2
+    assert batcher.metrics.coalesced == 1
+    assert batcher.metrics.submitted == 3
+
+
+def test_full_batch_is_sent_immediately():
+    client = FakeClient()
+    batcher = batching.FeatureUpdateBatcher(client, window=60, max_batch_size=2)
+    futures = [batcher.submit(FEATURE, member(i), _spec(i)) for i in range(2)]
+    for future in futures:
+        future.result(timeout=5)
+    assert batcher.metrics.max_batch_size == 2
+
+
+def test_one_call_in_flight_per_feature():
+    gate = threading.Event()
+    client = FakeClient(gate=gate)
+    batcher = batching.FeatureUpdateBatcher(client, window=0.01)
+    first = batcher.submit(FEATURE, member(0), _spec(0))
+    assert client.called.wait(5)
+    later = [batcher.submit(FEATURE, member(i), _spec(i)) for i in range(1, 4)]
+    threading.Event().wait(0.05)
+    assert len(client.calls) == 1
+    gate.set()
+    first.result(timeout=5)
+    for future in later:
+        future.result(timeout=5)
+    assert [len(r[2].paths) for r in client.calls] == [1, 3]
+    assert batcher.metrics.mean_batch_size == 2.0
+
+
+def test_calls_never_exceed_max_batch_size():
+    gate = threading.Event()
+    client = FakeClient(gate=gate)
+    batcher = batching.FeatureUpdateBatcher(client, window=0.01, max_batch_size=2)
+    first = [batcher.submit(FEATURE, member(i), _spec(i)) for i in range(2)]
+    assert client.called.wait(5)
+    later = [batcher.submit(FEATURE, member(i), _spec(i)) for i in range(2, 9)]
+    gate.set()
+    for future in first + later:
+        future.result(timeout=5)
+    assert [len(r[2].paths) for r in client.calls] == [2, 2, 2, 2, 1]
+    assert batcher.metrics.max_batch_size == 2
+
+
+def test_flush_waits_for_calls_in_flight():
+    gate = threading.Event()
+    client = FakeClient(gate=gate)
+    batcher = batching.FeatureUpdateBatcher(client, window=0.01)
+    future = batcher.submit(FEATURE, member(0), _spec(0))
+    assert client.called.wait(5)
+    threading.Timer(0.05, gate.set).start()
+    batcher.flush()
+    assert future.done()
+
+
+def test_errors_reach_every_caller():
+    error = ValueError("boom")
+    batcher = batching.FeatureUpdateBatcher(FakeClient(error=error), window=0.01)
+    futures = [batcher.submit(FEATURE, member(i), _spec(i)) for i in range(2)]
+    for future in futures:
+        assert future.exception(timeout=5) is error
+    assert batcher.metrics.failed_batches == 1
+
+
+def test_close_flushes():
+    client = FakeClient()
+    with batching.FeatureUpdateBatcher(client, window=60) as batcher:
+        futures = [
+            batcher.submit(FEATURE, member(1), _spec(1)),
+            batcher.submit(FEATURE + "2", member(1), _spec(1)),
+        ]
+    assert all(f.done() for f in futures)
+    assert len(client.calls) == 2
+    with pytest.raises(RuntimeError):
+        batcher.submit(FEATURE, member(1), _spec(1))
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        batching.FeatureUpdateBatcher(FakeClient(), max_batch_size=0)
+
+
+def test_metrics_without_calls():
+    metrics = batching.BatchMetrics()
+    assert metrics.mean_batch_size == 0.0
+    assert metrics.snapshot()["batches"] == 0
+
+
+def test_stale_timer_is_ignored():
+    client = FakeClient()
+    batcher = batching.FeatureUpdateBatcher(client, window=60)
+    future = batcher.submit(FEATURE, member(0), _spec(0))
+    batcher._on_timer(FEATURE)
+    batcher._on_timer(FEATURE + "2")
+    assert not client.calls
+    batcher.close()
+    assert future.done()
+
+
+def test_entries_arriving_in_flight_wait_for_their_window():
+    gate = threading.Event()
+    client = FakeClient(gate=gate)
+    batcher = batching.FeatureUpdateBatcher(client, window=0.1, max_batch_size=2)
+    first = [batcher.submit(FEATURE, member(i), _spec(i)) for i in range(2)]
+    assert client.called.wait(5)
+    later = batcher.submit(FEATURE, member(2), _spec(2))
+    gate.set()
+    for future in first:
+        future.result(timeout=5)
+    later.result(timeout=5)
+    assert [len(r[2].paths) for r in client.calls] == [2, 1]
+
+
+@pytest.mark.parametrize("error", [None, ValueError("boom")])
+def test_cancelled_callers_are_skipped(error):
+    client = FakeClient(error=error)
+    batcher = batching.FeatureUpdateBatcher(client, window=60)
+    cancelled = batcher.submit(FEATURE, member(0), _spec(0))
+    kept = batcher.submit(FEATURE, member(1), _spec(1))
+    assert cancelled.cancel()
+    batcher.flush()
+    assert kept.done() and not kept.cancelled()
+    assert len(client.calls) == 1
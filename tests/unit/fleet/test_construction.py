@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+
+import mock
+import pytest
+
+from google.api_core import client_options
+from google.auth import credentials as ga_credentials
+from google.cloud.gkehub_v1 import GkeHubAsyncClient
+from google.cloud.gkehub_v1 import GkeHubClient
+from google.cloud.gkehub_v1.fleet import construction
+from google.cloud.gkehub_v1beta1 import GkeHubMembershipServiceClient
+
+
+@pytest.mark.parametrize("client_class", [GkeHubClient, GkeHubMembershipServiceClient])
+def test_create_builds_client(client_class):
+    factory = construction.ClientFactory(client_class)
+    creds = ga_credentials.AnonymousCredentials()
+    client = factory.create(credentials=creds)
+    assert isinstance(client, client_class)
+    assert client.transport._host == client_class.DEFAULT_ENDPOINT + ":443"
+    assert client.transport._credentials is creds
+
+
+@pytest.mark.asyncio
+async def test_create_builds_async_client():
+    factory = construction.ClientFactory(GkeHubAsyncClient, transport="grpc_asyncio")
+    client = factory.create(credentials=ga_credentials.AnonymousCredentials())
+    assert isinstance(client, GkeHubAsyncClient)
+    assert client.transport.__class__.__name__ == "GkeHubGrpcAsyncIOTransport"
+
+
+def test_create_honors_api_endpoint():
+    factory = construction.ClientFactory()
+    client = factory.create(
+        credentials=ga_credentials.AnonymousCredentials(),
+        client_options={"api_endpoint": "squid.clam.whelk"},
+    )
+    assert client.transport._host == "squid.clam.whelk:443"
+
+
+def test_endpoint_is_resolved_once():
+    factory = construction.ClientFactory()
+    with mock.patch.object(
+        GkeHubClient,
+        "get_mtls_endpoint_and_cert_source",
+        return_value=("foo.googleapis.com", None),
+    ):
+        clients = [
+            factory.create(credentials=ga_credentials.AnonymousCredentials())
+            for _ in range(3)
+        ]
+    assert factory.stats()["endpoints"] == {"hits": 2, "misses": 1}
+    factory.clear()
+    client = factory.create(credentials=ga_credentials.AnonymousCredentials())
+    hosts = {c.transport._host for c in clients}
+    assert hosts == {"foo.googleapis.com:443"}
+    assert client.transport._host == GkeHubClient.DEFAULT_ENDPOINT + ":443"
+
+
+def test_environment_change_invalidates_endpoint():
+    factory = construction.ClientFactory()
+    with mock.patch.dict(os.environ, {"GOOGLE_API_USE_MTLS_ENDPOINT": "never"}):
+        assert factory.resolve_endpoint() == (GkeHubClient.DEFAULT_ENDPOINT, None)
+    with mock.patch.dict(os.environ, {"GOOGLE_API_USE_MTLS_ENDPOINT": "always"}):
+        assert factory.resolve_endpoint() == (GkeHubClient.DEFAULT_MTLS_ENDPOINT, None)
+    assert factory.stats()["endpoints"]["misses"] == 2
+
+
+def test_client_cert_source_runs_once():
+    factory = construction.ClientFactory()
+    cert_source = mock.Mock(return_value=(b"cert", b"key"))
+    options = client_options.ClientOptions(client_cert_source=cert_source)
+    with mock.patch.dict(
+        os.environ, {"GOOGLE_API_USE_CLIENT_CERTIFICATE": "true"}
+    ), mock.patch.object(
+        construction.grpc, "ssl_channel_credentials", return_value=mock.sentinel.ssl
+    ) as ssl:
+        first = factory.resolve_endpoint(options)
+        second = factory.resolve_endpoint(options)
+    assert first == second == (GkeHubClient.DEFAULT_MTLS_ENDPOINT, mock.sentinel.ssl)
+    cert_source.assert_called_once_with()
+    ssl.assert_called_once_with(certificate_chain=b"cert", private_key=b"key")
+
+
+def test_credentials_file_is_reloaded_when_changed(tmp_path):
+    path = tmp_path / "key.json"
+    path.write_text("{}")
+    factory = construction.ClientFactory()
+    loaded = [ga_credentials.AnonymousCredentials() for _ in range(2)]
+    with mock.patch.object(
+        construction.google.auth,
+        "load_credentials_from_file",
+        side_effect=[(c, None) for c in loaded],
+    ) as load:
+        assert factory.credentials(str(path)) is loaded[0]
+        assert factory.credentials(str(path)) is loaded[0]
+        stat = path.stat()
+        os.utime(str(path), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        assert factory.credentials(str(path)) is loaded[1]
+    assert load.call_count == 2
+    _, kwargs = load.call_args
+    assert kwargs["default_scopes"] == GkeHubClient.get_transport_class().AUTH_SCOPES
+
+
+def test_default_credentials_are_shared():
+    factory = construction.ClientFactory()
+    creds = ga_credentials.AnonymousCredentials()
+    with mock.patch.object(
+        construction.google.auth, "default", return_value=(creds, None)
+    ) as default:
+        clients = [factory.create() for _ in range(3)]
+        factory.credentials(scopes=["a"])
+    assert all(c.transport._credentials is creds for c in clients)
+    assert default.call_count == 2
+    assert factory.stats()["credentials"] == {"hits": 2, "misses": 2}
+
+
+def test_api_key_bypasses_cache():
+    factory = construction.ClientFactory()
+    with mock.patch.object(construction.ClientFactory, "resolve_endpoint") as resolve:
+        with pytest.raises(ValueError):
+            factory.create(
+                credentials=ga_credentials.AnonymousCredentials(),
+                client_options={"api_key": "key"},
+            )
+    resolve.assert_not_called()
+
+
+def test_clear():
+    factory = construction.ClientFactory()
+    factory.resolve_endpoint()
+    factory.clear()
+    factory.resolve_endpoint()
+    assert factory.stats()["endpoints"] == {"hits": 0, "misses": 2}
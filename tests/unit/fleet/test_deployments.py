@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import pytest
+
+from google.cloud.gkehub_v1 import configmanagement_v1
+from google.cloud.gkehub_v1.fleet import deployments
+from google.cloud.gkehub_v1.types import feature as gcg_feature
+
+from ._helpers import member
+
+State = configmanagement_v1.DeploymentState
+
+
+def _state(syncer=State.INSTALLED, audit=State.INSTALLED, hnc=State.NOT_INSTALLED):
+    return gcg_feature.MembershipFeatureState(
+        configmanagement={
+            "operator_state": {"deployment_state": State.INSTALLED},
+            "config_sync_state": {
+                "deployment_state": {"importer": State.INSTALLED, "syncer": syncer}
+            },
+            "policy_controller_state": {
+                "deployment_state": {"gatekeeper_audit": audit}
+            },
+            "hierarchy_controller_state": {"state": {"hnc": hnc}},
+        }
+    )
+
+
+def _absent_slots(matrix):
+    return matrix.column("syncer").count(0xFF)
+
+
+def _feature():
+    return gcg_feature.Feature(
+        membership_states={
+            member(0): _state(),
+            member(1): _state(syncer=State.ERROR),
+            member(2): _state(audit=State.ERROR, hnc=State.ERROR),
+            member(3): gcg_feature.MembershipFeatureState(),
+        }
+    )
+
+
+def test_from_feature():
+    matrix = deployments.DeploymentMatrix.from_feature(_feature())
+    assert len(matrix) == 4
+    assert member(1) in matrix
+    assert member(9) not in matrix
+    assert matrix.state(member(1), "syncer") == State.ERROR
+    assert matrix.states(member(3)) == dict.fromkeys(
+        deployments.COMPONENTS, State.DEPLOYMENT_STATE_UNSPECIFIED
+    )
+    ordered = deployments.DeploymentMatrix(components=["syncer"])
+    for i in range(4):
+        ordered.update(member(i), _feature().membership_states[member(i)])
+    assert ordered.column("syncer") == bytes([2, 3, 2, 0])
+
+
+def test_counts_and_select():
+    matrix = deployments.DeploymentMatrix.from_feature(_feature())
+    assert matrix.counts("syncer") == {
+        State.DEPLOYMENT_STATE_UNSPECIFIED: 1,
+        State.NOT_INSTALLED: 0,
+        State.INSTALLED: 2,
+        State.ERROR: 1,
+    }
+    assert sorted(matrix.select(State.ERROR)) == [member(1), member(2)]
+    assert matrix.select(State.ERROR, ["hnc"]) == [member(2)]
+    assert matrix.count_any(State.ERROR) == 2
+    both = matrix.mask(State.ERROR, ["gatekeeper_audit"]) & matrix.mask(
+        State.ERROR, ["hnc"]
+    )
+    assert matrix.names(both) == [member(2)]
+    assert matrix.select(State.ERROR, []) == []
+
+
+def test_update_and_remove():
+    matrix = deployments.DeploymentMatrix.from_feature(_feature())
+    matrix.update(member(1), _state())
+    assert matrix.select(State.ERROR) == [member(2)]
+    assert matrix.remove(member(2))
+    assert not matrix.remove(member(2))
+    assert _absent_slots(matrix) == 1
+    assert matrix.select(State.ERROR) == []
+    assert matrix.counts("syncer")[State.INSTALLED] == 2
+    matrix.update(member(9), _state(syncer=State.ERROR))
+    assert matrix.state(member(9), "syncer") == State.ERROR
+    assert _absent_slots(matrix) == 0
+    assert matrix.select(State.ERROR) == [member(9)]
+    matrix.update_from_feature(_feature())
+    assert sorted(matrix.select(State.ERROR)) == [member(1), member(2), member(9)]
+
+
+def test_configmanagement_state_and_components():
+    matrix = deployments.DeploymentMatrix(components=["syncer", "operator"])
+    matrix.update(member(0), _state(syncer=State.ERROR).configmanagement)
+    assert matrix.components == ["syncer", "operator"]
+    assert matrix.states(member(0)) == {
+        "syncer": State.ERROR,
+        "operator": State.INSTALLED,
+    }
+    with pytest.raises(ValueError):
+        deployments.DeploymentMatrix(components=["nope"])
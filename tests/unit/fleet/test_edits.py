@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import mock
+import pytest
+
+from google.cloud.gkehub_v1.fleet import edits
+from google.cloud.gkehub_v1.types import feature as gcg_feature
+from google.cloud.gkehub_v1.types import membership as gcg_membership
+from google.cloud.gkehub_v1.types import service
+from google.cloud.gkehub_v1beta1.types import membership as v1beta1_membership
+
+NAME = "projects/p/locations/global/memberships/m1"
+FEATURE = "projects/p/locations/global/features/configmanagement"
+
+
+def _membership():
+    return gcg_membership.Membership(
+        name=NAME,
+        labels={"env": "dev", "team": "a"},
+        external_id="uid",
+        authority={"issuer": "https://issuer"},
+        state={"code": gcg_membership.MembershipState.Code.READY},
+    )
+
+
+def _feature():
+    return gcg_feature.Feature(
+        name=FEATURE,
+        labels={"owner": "x"},
+        membership_specs={
+            NAME: {"configmanagement": {"version": "1.9.0"}},
+            NAME + "2": {"configmanagement": {"version": "1.9.0"}},
+        },
+    )
+
+
+def test_no_changes_skip_the_rpc():
+    session = edits.EditSession(_membership())
+    client = mock.Mock()
+    assert not session.dirty
+    assert session.request() is None
+    assert session.commit(client) is None
+    client.update_membership.assert_not_called()
+
+
+def test_label_changes_are_per_key():
+    session = edits.EditSession(_membership())
+    session.resource.labels["env"] = "prod"
+    session.resource.labels["new"] = "1"
+    del session.resource.labels["team"]
+    request = session.request()
+    assert isinstance(request, service.UpdateMembershipRequest)
+    assert request.name == NAME
+    assert request.update_mask.paths == ["labels.env", "labels.new", "labels.team"]
+    assert dict(request.resource.labels) == {"env": "prod", "new": "1"}
+    assert request.resource.external_id == ""
+    assert "authority" not in request.resource
+
+
+def test_message_and_scalar_fields():
+    session = edits.EditSession(_membership())
+    session.resource.authority.issuer = "https://other"
+    session.resource.external_id = "uid2"
+    session.resource.state.code = gcg_membership.MembershipState.Code.DELETING
+    request = session.request()
+    assert request.update_mask.paths == ["external_id", "authority"]
+    assert request.resource.authority.issuer == "https://other"
+    assert request.resource.external_id == "uid2"
+    assert not request.resource.labels
+
+
+def test_membership_specs_changes_are_per_key():
+    session = edits.EditSession(_feature())
+    session.resource.membership_specs[NAME].configmanagement.version = "1.10.0"
+    session.resource.membership_specs[NAME + "3"] = gcg_feature.MembershipFeatureSpec(
+        configmanagement={"version": "1.11.0"}
+    )
+    del session.resource.membership_specs[NAME + "2"]
+    request = session.request()
+    assert isinstance(request, service.UpdateFeatureRequest)
+    assert request.update_mask.paths == [
+        "membership_specs.`{}`".format(NAME),
+        "membership_specs.`{}2`".format(NAME),
+        "membership_specs.`{}3`".format(NAME),
+    ]
+    assert sorted(request.resource.membership_specs) == [NAME, NAME + "3"]
+    assert request.resource.membership_specs[NAME].configmanagement.version == "1.10.0"
+
+
+def test_commit_sends_and_resets():
+    session = edits.EditSession(_feature())
+    session.resource.labels["owner"] = "y"
+    client = mock.Mock()
+    assert session.commit(client, timeout=5) is client.update_feature.return_value
+    _, kwargs = client.update_feature.call_args
+    assert kwargs["request"].update_mask.paths == ["labels.owner"]
+    assert kwargs["timeout"] == 5
+    assert not session.dirty
+    assert session.commit(client) is None
+
+
+def test_failed_commit_stays_dirty():
+    session = edits.EditSession(_feature())
+    session.resource.labels["owner"] = "y"
+    client = mock.Mock()
+    client.update_feature.side_effect = ValueError()
+    with pytest.raises(ValueError):
+        session.commit(client)
+    assert session.dirty
+
+
+def test_v1beta1_membership_description_is_updatable():
+    session = edits.EditSession(v1beta1_membership.Membership(name=NAME))
+    session.resource.description = "cluster"
+    request = session.request()
+    assert isinstance(request, v1beta1_membership.UpdateMembershipRequest)
+    assert request.update_mask.paths == ["description"]
+
+
+def test_unsupported_type():
+    with pytest.raises(TypeError):
+        edits.EditSession(service.ListMembershipsRequest())
+
+
+def test_diff_paths_accepts_raw_protobuf():
+    before = _membership()
+    after = gcg_membership.Membership(before)
+    after.labels["weird key"] = "v"
+    raw = gcg_membership.Membership.pb
+    assert edits.diff_paths(raw(before), raw(after)) == ["labels.`weird key`"]
+
+
+def test_diff_paths_repeated_and_presence():
+    before = service.ListMembershipsResponse(unreachable=["a"])
+    after = service.ListMembershipsResponse(unreachable=["a", "b"])
+    assert edits.diff_paths(before, after) == ["unreachable"]
+    raw = gcg_membership.Membership.pb
+    before = raw(_membership())
+    after = raw(_membership())
+    after.endpoint.SetInParent()
+    assert edits.diff_paths(before, after) == ["endpoint"]
+
+
+def test_update_mask():
+    session = edits.EditSession(_membership())
+    session.resource.external_id = "uid2"
+    assert list(session.update_mask.paths) == ["external_id"]
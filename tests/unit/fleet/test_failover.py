@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import threading
+
+import mock
+import pytest
+
+from google.cloud.gkehub_v1.fleet import failover
+from google.cloud.gkehub_v1.types import feature as gcg_feature
+from google.cloud.gkehub_v1.types import membership as gcg_membership
+
+from . import _helpers
+from ._helpers import member
+
+FEATURE = "projects/p/locations/global/features/multiclusteringress"
+NOW = 1_600_000_000
+Code = gcg_membership.MembershipState.Code
+
+
+def _membership(name, code=Code.READY, age=10):
+    membership = gcg_membership.Membership(name=name, state={"code": code})
+    if age is not None:
+        membership.last_connection_time = {"seconds": NOW - age}
+    return membership
+
+
+class FakeClient(_helpers.FakeClient):
+    def __init__(self, config_membership, memberships):
+        super().__init__()
+        self.config_membership = config_membership
+        self.memberships = memberships
+        self.fail_update = False
+
+    def get_feature(self, name, **kwargs):
+        return gcg_feature.Feature(
+            name=name,
+            spec={"multiclusteringress": {"config_membership": self.config_membership}},
+        )
+
+    def get_membership(self, name, **kwargs):
+        membership = self.memberships[name]
+        if isinstance(membership, Exception):
+            raise membership
+        return membership
+
+    def update_feature(self, name, resource, update_mask, **kwargs):
+        self.record((resource, list(update_mask.paths)))
+        if self.fail_update:
+            return self.operation(error=RuntimeError("failed"))
+        self.config_membership = resource.spec.multiclusteringress.config_membership
+        return self.operation()
+
+
+def _client(**overrides):
+    memberships = {member(i): _membership(member(i)) for i in range(3)}
+    memberships.update(overrides)
+    return FakeClient(member(0), memberships)
+
+
+def _monitor(client, **kwargs):
+    return failover.ConfigMembershipMonitor(
+        client, FEATURE, [member(i) for i in range(3)], **kwargs
+    )
+
+
+@pytest.mark.parametrize(
+    "code,age,max_staleness,expected",
+    [
+        (Code.READY, 10, 600, True),
+        (Code.READY, 1000, 600, False),
+        (Code.READY, None, 600, False),
+        (Code.READY, None, None, True),
+        (Code.UPDATING, 10, 600, False),
+    ],
+)
+def test_is_healthy(code, age, max_staleness, expected):
+    membership = _membership(member(0), code, age)
+    assert failover.is_healthy(membership, max_staleness, now=NOW) is expected
+
+
+def test_is_healthy_defaults_to_the_current_time():
+    membership = _membership(member(0), age=10)
+    assert failover.is_healthy(membership, max_staleness=1e12)
+    assert not failover.is_healthy(membership)
+
+
+def test_constructor_validation():
+    with pytest.raises(ValueError):
+        failover.ConfigMembershipMonitor(mock.Mock(), FEATURE, [])
+    with pytest.raises(ValueError):
+        failover.ConfigMembershipMonitor(mock.Mock(), FEATURE, ["m"], interval=0)
+
+
+def test_check_healthy_makes_no_update():
+    client = _client()
+    monitor = _monitor(client)
+    assert monitor.check(now=NOW) is None
+    assert monitor.current == member(0)
+    assert monitor.ranked() == [member(0), member(1), member(2)]
+    assert monitor.checks == 1
+    assert client.calls == []
+
+
+def test_check_fails_over_to_best_candidate():
+    client = _client(
+        **{
+            member(0): _membership(member(0), Code.SERVICE_UPDATING),
+            member(1): _membership(member(1), age=5000),
+        }
+    )
+    events = []
+    monitor = _monitor(client, on_failover=events.append)
+    event = monitor.check(now=NOW)
+    assert event.previous == member(0)
+    assert event.target == member(2)
+    assert event.error is None
+    assert event.duration >= 0
+    assert events == [event] == monitor.events
+    assert monitor.current == member(2)
+    resource, paths = client.calls[0]
+    assert paths == [failover.CONFIG_MEMBERSHIP_PATH]
+    assert resource.spec.multiclusteringress.config_membership == member(2)
+    assert not resource.membership_specs
+    assert monitor.check(now=NOW) is None
+    assert len(client.calls) == 1
+
+
+def test_unreadable_membership_is_unhealthy():
+    client = _client(**{member(0): RuntimeError("unavailable")})
+    monitor = _monitor(client)
+    assert monitor.check(now=NOW).target == member(1)
+    assert monitor.healthy(member(0)) is False
+
+
+def test_no_healthy_candidate():
+    client = _client(
+        **{member(i): _membership(member(i), Code.DELETING) for i in range(3)}
+    )
+    monitor = _monitor(client)
+    assert monitor.check(now=NOW) is None
+    assert monitor.ranked() == []
+    with pytest.raises(ValueError):
+        monitor.failover()
+
+
+def test_failed_failover_is_recorded_and_retried():
+    client = _client(**{member(0): _membership(member(0), Code.DELETING)})
+    client.fail_update = True
+    monitor = _monitor(client)
+    event = monitor.check(now=NOW)
+    assert isinstance(event.error, RuntimeError)
+    assert monitor.current == member(0)
+    client.fail_update = False
+    assert monitor.check(now=NOW).error is None
+    assert monitor.current == member(1)
+    assert len(monitor.events) == 2
+
+
+def test_current_outside_candidates_is_watched():
+    client = _client(**{"other": _membership("other", Code.DELETING)})
+    client.config_membership = "other"
+    monitor = _monitor(client)
+    assert monitor.check(now=NOW).target == member(0)
+    assert monitor.healthy("other") is False
+
+
+def test_manual_failover():
+    client = _client()
+    monitor = _monitor(client)
+    monitor.sync()
+    event = monitor.failover(member(2))
+    assert (event.previous, event.target) == (member(0), member(2))
+    assert client.config_membership == member(2)
+    monitor.poll(now=NOW)
+    event = monitor.failover()
+    assert (event.previous, event.target) == (member(2), member(0))
+
+
+def test_observe_updates_ranking():
+    monitor = _monitor(_client())
+    monitor.observe(_membership(member(1)), now=NOW)
+    monitor.observe(_membership(member(0)), now=NOW)
+    assert monitor.ranked() == [member(0), member(1)]
+    assert not monitor.observe(_membership(member(0), Code.CREATING), now=NOW)
+    assert monitor.ranked() == [member(1)]
+
+
+def test_background_thread():
+    client = _client(**{member(0): _membership(member(0), Code.DELETING)})
+    done = threading.Event()
+    monitor = _monitor(
+        client, max_staleness=None, interval=0.01, on_failover=lambda e: done.set()
+    )
+    with monitor:
+        assert done.wait(5)
+        with pytest.raises(RuntimeError):
+            monitor.start()
+    assert monitor.current == member(1)
+
+
+def test_background_thread_survives_check_errors():
+    client = _client(**{member(0): _membership(member(0), Code.DELETING)})
+    get_feature = client.get_feature
+    client.get_feature = mock.Mock(
+        side_effect=[RuntimeError("unavailable"), get_feature(FEATURE)]
+        + [get_feature(FEATURE)] * 2
+    )
+    done = threading.Event()
+    monitor = _monitor(
+        client, max_staleness=None, interval=0.01, on_failover=lambda e: done.set()
+    )
+    monitor.stop()
+    monitor.start()
+    with monitor:
+        assert done.wait(5)
+    assert monitor.checks >= 1
+    assert monitor.current == member(1)
+
+
+def test_manual_move_is_not_overridden():
+    client = _client(**{member(0): _membership(member(0), Code.DELETING)})
+    monitor = _monitor(client)
+    monitor.sync()
+    # An operator moves the config membership after the monitor read it.
+    client.config_membership = member(2)
+    assert monitor.check(now=NOW) is None
+    assert client.calls == []
+    assert monitor.current == member(2)
+    assert monitor.check(now=NOW) is None
+    assert client.config_membership == member(2)
+
+
+def test_unset_config_membership_is_left_alone():
+    client = _client()
+    client.config_membership = ""
+    monitor = _monitor(client)
+    assert monitor.check(now=NOW) is None
+    assert monitor.current is None
+    assert client.calls == []
+
+
+def test_unset_config_membership_can_be_assigned():
+    client = _client()
+    client.config_membership = ""
+    monitor = _monitor(client, assign_when_unset=True)
+    event = monitor.check(now=NOW)
+    assert (event.previous, event.target) == ("", member(0))
+    assert client.config_membership == member(0)
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+
+import mock
+import pytest
+
+from google.cloud.gkehub_v1.fleet import _files
+
+
+def test_write_atomically_replaces_contents(tmpdir):
+    path = str(tmpdir.join("out"))
+    _files.write_atomically(path, "café")
+    _files.write_atomically(path, b"bytes")
+    with open(path, "rb") as fh:
+        assert fh.read() == b"bytes"
+    assert os.listdir(str(tmpdir)) == ["out"]
+
+
+def test_write_atomically_keeps_old_contents_on_failure(tmpdir):
+    path = str(tmpdir.join("out"))
+    _files.write_atomically(path, "old")
+    with mock.patch.object(os, "replace", side_effect=OSError("full")):
+        with pytest.raises(OSError):
+            _files.write_atomically(path, "new")
+    with open(path) as fh:
+        assert fh.read() == "old"
+    assert os.listdir(str(tmpdir)) == ["out"]
+
+
+def test_write_atomically_tolerates_missing_temporary_file(tmpdir):
+    path = str(tmpdir.join("out"))
+
+    def replace(src, dst):
+        os.unlink(src)
+        raise OSError("gone")
+
+    with mock.patch.object(os, "replace", side_effect=replace):
+        with pytest.raises(OSError):
+            _files.write_atomically(path, "new")
+    assert os.listdir(str(tmpdir)) == []
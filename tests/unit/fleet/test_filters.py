@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import datetime
+
+import mock
+import pytest
+
+from google.cloud.gkehub_v1.fleet import filters
+from google.cloud.gkehub_v1.types import feature
+from google.cloud.gkehub_v1.types import membership
+from google.cloud.gkehub_v1.types import service
+from google.protobuf import timestamp_pb2  # type: ignore
+
+READY = membership.MembershipState.Code.READY
+
+
+def _membership(name, labels=None, code=READY, created=0):
+    return membership.Membership(
+        name=name,
+        labels=labels or {},
+        state=membership.MembershipState(code=code),
+        create_time=timestamp_pb2.Timestamp(seconds=created),
+    )
+
+
+def test_predicates_compile():
+    assert filters.Label("env", 'pr"od').to_filter() == 'labels.env = "pr\\"od"'
+    assert filters.Label("example.com/team", "a").to_filter() is None
+    assert filters.HasLabel("env").to_filter() == "labels.env:*"
+    assert filters.HasLabel("Env").to_filter() is None
+    assert filters.FieldEquals("state.code", READY).to_filter() == "state.code = READY"
+    assert filters.FieldEquals("a", True).to_filter() == "a = true"
+    assert filters.FieldEquals("a", 3).to_filter() == "a = 3"
+    assert filters.FieldEquals("a", "x").to_filter() == 'a = "x"'
+    assert filters.NamePrefix("projects/p").to_filter() is None
+    assert (
+        filters.TimeRange(
+            "create_time", after=datetime.datetime(2021, 1, 1)
+        ).to_filter()
+        == 'create_time >= "2021-01-01T00:00:00.000000Z"'
+    )
+    assert (
+        filters.Label("a", "1") | filters.Label("b", "2")
+    ).to_filter() == '(labels.a = "1") OR (labels.b = "2")'
+    assert (filters.Label("a", "1") | filters.NamePrefix("x")).to_filter() is None
+    assert (~filters.Label("a", "1")).to_filter() == 'NOT (labels.a = "1")'
+    assert (~filters.NamePrefix("x")).to_filter() is None
+    assert (
+        filters.TimeRange(
+            "create_time", before=datetime.datetime(2021, 1, 1)
+        ).to_filter()
+        == 'create_time < "2021-01-01T00:00:00.000000Z"'
+    )
+    assert filters.And().to_filter() is None
+    assert filters.And(filters.NamePrefix("x")).matches(_membership("x"))
+    assert (filters.Label("a", "1") & filters.NamePrefix("x")).to_filter() is None
+    assert (
+        filters.And(filters.Label("a", "1"), filters.HasLabel("b")).to_filter()
+        == '(labels.a = "1") AND (labels.b:*)'
+    )
+    assert filters.And(filters.NamePrefix("x")).to_filter() is None
+    with pytest.raises(ValueError):
+        filters.TimeRange("create_time")
+
+
+def test_predicates_match():
+    m = _membership(
+        "projects/p/locations/l/memberships/a", {"env": "prod"}, created=100
+    )
+    assert filters.Label("env", "prod").matches(m)
+    assert not filters.HasLabel("tier").matches(m)
+    assert filters.FieldEquals("state.code", READY).matches(m)
+    assert filters.NamePrefix("projects/p/").matches(m)
+    after = datetime.datetime.fromtimestamp(50, tz=datetime.timezone.utc)
+    before = datetime.datetime.utcfromtimestamp(100)
+    assert filters.TimeRange("create_time", after=after).matches(m)
+    assert not filters.TimeRange("create_time", before=before).matches(m)
+    assert not filters.TimeRange(
+        "create_time", after=before + datetime.timedelta(1)
+    ).matches(m)
+    assert not filters.TimeRange("delete_time", after=after).matches(m)
+    assert (filters.Label("env", "dev") | filters.HasLabel("env")).matches(m)
+    assert not (~filters.HasLabel("env")).matches(m)
+    assert filters.Where(lambda r: r.name.endswith("a")).matches(m)
+    assert repr(filters.Where(len, "sized")) == "Where<sized>"
+    assert repr(filters.NamePrefix("x")) == "NamePrefix<local>"
+
+
+def test_predicate_requires_matches():
+    class Incomplete(filters.Predicate):
+        def to_filter(self):
+            return "a = 1"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+    class Complete(Incomplete):
+        def matches(self, resource):
+            return True
+
+    assert Complete().matches(None)
+    assert repr(Complete()) == "Complete<a = 1>"
+
+
+def test_exported_from_fleet():
+    from google.cloud.gkehub_v1 import fleet
+
+    assert fleet.Predicate is filters.Predicate
+    assert fleet.list_memberships is filters.list_memberships
+    assert {"And", "Label", "QueryPlan", "plan"} <= set(fleet.__all__)
+
+
+def test_plan_splits_conjunction():
+    where = (
+        filters.Label("env", "prod")
+        & filters.NamePrefix("projects/p/locations/global/")
+        & filters.FieldEquals("state.code", READY)
+    )
+    query_plan = filters.plan(where)
+    assert query_plan.filter == '(labels.env = "prod") AND (state.code = READY)'
+    assert len(query_plan.pushed) == 2
+    assert len(query_plan.residual) == 1
+    assert "local: NamePrefix<local>" in query_plan.explain()
+
+    single = filters.plan(filters.HasLabel("env"))
+    assert single.filter == "labels.env:*"
+    assert single.residual == []
+
+    everything = filters.plan(None)
+    assert everything.filter == ""
+    assert "server filter: <none>" in everything.explain()
+
+
+def test_list_memberships_applies_residual():
+    client = mock.Mock()
+    client.list_memberships.return_value = iter(
+        [
+            _membership("projects/p/locations/global/memberships/a"),
+            _membership("projects/q/locations/global/memberships/b"),
+        ]
+    )
+    where = filters.Label("env", "prod") & filters.NamePrefix("projects/p/")
+    results = list(
+        filters.list_memberships(client, "projects/-/locations/global", where, 50)
+    )
+    assert [r.name for r in results] == ["projects/p/locations/global/memberships/a"]
+    request = client.list_memberships.call_args[1]["request"]
+    assert request == service.ListMembershipsRequest(
+        parent="projects/-/locations/global",
+        filter='labels.env = "prod"',
+        page_size=50,
+    )
+
+
+def test_list_features():
+    client = mock.Mock()
+    client.list_features.return_value = iter([feature.Feature(name="f")])
+    results = list(
+        filters.list_features(client, "projects/p/locations/global", timeout=5)
+    )
+    assert len(results) == 1
+    assert client.list_features.call_args[1]["timeout"] == 5
+    assert client.list_features.call_args[1]["request"].filter == ""
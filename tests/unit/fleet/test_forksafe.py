@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+
+import mock
+import pytest
+
+from google.auth import credentials as ga_credentials
+from google.cloud.gkehub_v1 import GkeHubClient
+from google.cloud.gkehub_v1.fleet import forksafe
+from google.cloud.gkehub_v1beta1 import GkeHubMembershipServiceClient
+
+
+@pytest.mark.parametrize("client_class", [GkeHubClient, GkeHubMembershipServiceClient])
+def test_client_is_built_lazily_and_reused(client_class):
+    holder = forksafe.ForkSafeClient(
+        client_class, credentials=ga_credentials.AnonymousCredentials()
+    )
+    assert holder.pid is None
+    client = holder.get()
+    assert isinstance(client, client_class)
+    assert holder.get() is client
+    assert holder.pid == os.getpid()
+    assert holder.transport is client.transport
+
+
+def test_client_is_rebuilt_after_pid_change():
+    factory = mock.Mock(side_effect=lambda: mock.Mock())
+    holder = forksafe.ForkSafeClient(factory)
+    parent = holder.get()
+    with mock.patch.object(os, "getpid", return_value=os.getpid() + 1):
+        child = holder.get()
+        assert child is not parent
+        assert holder.get() is child
+    assert factory.call_count == 2
+    parent.transport.close.assert_not_called()
+
+
+def test_at_fork_hook_resets_holders():
+    factory = mock.Mock(side_effect=lambda: mock.Mock())
+    holder = forksafe.ForkSafeClient(factory)
+    first = holder.get()
+    forksafe._after_fork_in_child()
+    assert holder.pid is None
+    assert holder.get() is not first
+
+
+def test_client_built_while_waiting_for_the_lock_is_reused():
+    factory = mock.Mock(side_effect=lambda: mock.Mock())
+    holder = forksafe.ForkSafeClient(factory)
+    other = mock.Mock()
+
+    class Lock:
+        # Another thread builds the client while this one waits.
+        def __enter__(self):
+            holder._client = other
+            holder._pid = os.getpid()
+
+        def __exit__(self, *exc_info):
+            pass
+
+    holder._lock = Lock()
+    assert holder.get() is other
+    factory.assert_not_called()
+
+
+def test_close_and_context_manager():
+    factory = mock.Mock(side_effect=lambda: mock.Mock())
+    with forksafe.ForkSafeClient(factory) as holder:
+        client = holder.get()
+    client.transport.close.assert_called_once_with()
+    assert holder.pid is None
+    holder.close()
+    with pytest.raises(AttributeError):
+        holder._missing
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires os.fork")
+def test_real_fork_builds_child_client():
+    holder = forksafe.ForkSafeClient(
+        GkeHubClient, credentials=ga_credentials.AnonymousCredentials()
+    )
+    parent_client = holder.get()
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # pragma: NO COVER
+        ok = holder.get() is not parent_client and holder.pid == os.getpid()
+        os.write(write_fd, b"1" if ok else b"0")
+        os._exit(0)
+    os.close(write_fd)
+    os.waitpid(pid, 0)
+    assert os.read(read_fd, 1) == b"1"
+    os.close(read_fd)
+    assert holder.get() is parent_client
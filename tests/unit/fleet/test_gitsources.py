@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import pytest
+
+from google.cloud.gkehub_v1 import configmanagement_v1
+from google.cloud.gkehub_v1.fleet import gitsources
+from google.cloud.gkehub_v1.types import feature as gcg_feature
+
+SyncCode = configmanagement_v1.SyncState.SyncCode
+REPO = "https://github.com/example/config"
+
+
+def _spec(repo=REPO, **git):
+    git["sync_repo"] = repo
+    return gcg_feature.MembershipFeatureSpec(
+        configmanagement={"config_sync": {"git": git}}
+    )
+
+
+def _state(source_token="c2", sync_token="c2", code=SyncCode.SYNCED, errors=()):
+    return gcg_feature.MembershipFeatureState(
+        configmanagement={
+            "config_sync_state": {
+                "sync_state": {
+                    "source_token": source_token,
+                    "sync_token": sync_token,
+                    "code": code,
+                    "errors": [{"code": c} for c in errors],
+                }
+            }
+        }
+    )
+
+
+def _source(repo=REPO):
+    return gitsources.GitSource(repo, "master", "", "HEAD", "", "")
+
+
+def _feature():
+    return gcg_feature.Feature(
+        membership_specs={
+            "m0": _spec(),
+            "m1": _spec(repo="HTTPS://GitHub.com/example/config.git/"),
+            "m2": _spec(policy_dir="./"),
+            "m3": _spec(repo="https://github.com/example/other"),
+            "m4": gcg_feature.MembershipFeatureSpec(),
+        },
+        membership_states={
+            "m0": _state(),
+            "m1": _state(sync_token="c1"),
+            "m2": _state(code=SyncCode.ERROR),
+            "m3": _state(errors=["KNV1021"]),
+            "m4": _state(),
+        },
+    )
+
+
+@pytest.mark.parametrize(
+    "git,expected",
+    [
+        ({"sync_repo": REPO}, _source()),
+        ({"sync_repo": REPO + ".git"}, _source()),
+        ({"sync_repo": "https://GITHUB.COM/example/config/"}, _source()),
+        (
+            {"sync_repo": "git@GitHub.com:Example/config.git"},
+            _source("git@github.com:Example/config"),
+        ),
+        (
+            {
+                "sync_repo": REPO,
+                "sync_branch": "main",
+                "policy_dir": "./clusters/prod/",
+                "sync_rev": "v1",
+                "secret_type": "SSH",
+                "https_proxy": "http://proxy/",
+            },
+            gitsources.GitSource(
+                REPO, "main", "clusters/prod", "v1", "ssh", "http://proxy"
+            ),
+        ),
+    ],
+)
+def test_normalize_git_source(git, expected):
+    assert (
+        gitsources.normalize_git_source(configmanagement_v1.GitConfig(git)) == expected
+    )
+
+
+def test_groups_by_source():
+    index = gitsources.GitSourceIndex()
+    index.update_from_feature(_feature())
+    assert len(index) == 4
+    assert "m4" not in index
+    assert index.sources() == [_source(), _source("https://github.com/example/other")]
+    assert index.members(_source()) == {"m0", "m1", "m2"}
+    assert index.blast_radius("m1") == {"m0", "m1", "m2"}
+    assert index.blast_radius("m4") == set()
+    assert index.source_of("m3").repo == "https://github.com/example/other"
+
+
+def test_behind_head():
+    index = gitsources.GitSourceIndex()
+    index.update_from_feature(_feature())
+    assert index.head(_source()) == "c2"
+    assert index.synced(_source()) == {"m0", "m2"}
+    assert index.behind(_source()) == {"m1"}
+    assert index.behind_count(_source()) == 1
+    index.set_head(_source(), "c3")
+    assert index.behind_count(_source()) == 3
+    assert index.synced(_source()) == set()
+    index.set_head(_source(), None)
+    assert index.head(_source()) == "c2"
+
+
+def test_memberships_without_state_are_behind():
+    index = gitsources.GitSourceIndex()
+    index.update_spec("m0", _spec())
+    index.update_spec("m1", _spec())
+    index.update_state("m0", _state())
+    assert index.behind(_source()) == {"m1"}
+    assert index.head(gitsources.GitSource("x", "", "", "", "", "")) is None
+    assert index.behind_count(gitsources.GitSource("x", "", "", "", "", "")) == 0
+
+
+def test_failing_sources():
+    index = gitsources.GitSourceIndex()
+    index.update_from_feature(_feature())
+    assert index.failing_sources() == {
+        _source(): {"m2"},
+        _source("https://github.com/example/other"): {"m3"},
+    }
+    index.update_state("m2", _state())
+    assert index.failing(_source()) == set()
+
+
+def test_spec_change_moves_membership():
+    index = gitsources.GitSourceIndex()
+    index.update_from_feature(_feature())
+    index.update_spec("m2", _spec(repo="https://github.com/example/other"))
+    assert index.members(_source()) == {"m0", "m1"}
+    assert index.failing(_source()) == set()
+    other = _source("https://github.com/example/other")
+    assert index.failing(other) == {"m2", "m3"}
+    index.update_spec("m2", None)
+    assert "m2" not in index
+    assert index.failing(other) == {"m3"}
+
+
+def test_remove_and_remove_missing():
+    index = gitsources.GitSourceIndex()
+    index.update_from_feature(_feature())
+    assert index.remove("m3")
+    assert not index.remove("m3")
+    assert index.sources() == [_source()]
+    index.update_from_feature(
+        gcg_feature.Feature(
+            membership_specs={"m0": _spec(), "m1": _spec()},
+            membership_states={"m0": _state()},
+        )
+    )
+    assert index.members(_source()) == {"m0", "m1"}
+    assert index.behind(_source()) == {"m1"}
+    index.update_from_feature(gcg_feature.Feature())
+    assert len(index) == 0
+    assert index.sources() == []
+
+
+def test_accepts_configmanagement_messages():
+    index = gitsources.GitSourceIndex()
+    index.update_spec("m0", _spec().configmanagement)
+    index.update_state("m0", _state().configmanagement)
+    assert index.synced(_source()) == {"m0"}
+
+
+def test_unrecognized_repo_is_kept():
+    git = configmanagement_v1.GitConfig(sync_repo="/srv/git/config/")
+    assert gitsources.normalize_git_source(git).repo == "/srv/git/config"
+
+
+def test_specs_without_git_are_ignored():
+    index = gitsources.GitSourceIndex()
+    index.update_spec("m0", gcg_feature.MembershipFeatureSpec(configmanagement={}))
+    index.update_spec(
+        "m1", configmanagement_v1.MembershipSpec.pb(_spec().configmanagement)
+    )
+    assert "m0" not in index
+    assert index.members(_source()) == {"m1"}
+
+
+def test_unknown_sources_are_empty():
+    index = gitsources.GitSourceIndex()
+    unknown = gitsources.GitSource("x", "", "", "", "", "")
+    assert index.synced(unknown) == set()
+    assert index.behind(unknown) == set()
+
+
+def test_update_from_feature_keeps_or_drops_missing_entries():
+    index = gitsources.GitSourceIndex()
+    index.update_spec("m9", _spec())
+    index.update_from_feature(_feature(), remove_missing=False)
+    assert "m9" in index
+    index.update_from_feature(
+        gcg_feature.Feature(
+            membership_specs={"m0": _spec()},
+            membership_states={"m0": _state(), "m1": _state()},
+        )
+    )
+    assert "m9" not in index
+    assert "m1" not in index
+    assert index.members(_source()) == {"m0"}
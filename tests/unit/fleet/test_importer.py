@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import io
+import json
+
+from google.api_core import exceptions as core_exceptions
+import mock
+import pytest
+
+from google.cloud.gkehub_v1.fleet import importer
+
+from . import _helpers
+
+PARENT = "projects/p/locations/global"
+LINK = "//container.googleapis.com/projects/p/locations/us-central1/clusters/{}"
+
+CSV = """parent,resource_link,external_id,issuer,labels
+{parent},{link},,,env=prod;team=x
+{parent},,ext-1,https://issuer,
+""".format(parent=PARENT, link=LINK.format("alpha"))
+
+
+def _record(name, **extra):
+    record = {"parent": PARENT, "resource_link": LINK.format(name)}
+    record.update(extra)
+    return record
+
+
+class FakeClient(_helpers.FakeClient):
+    def __init__(self, existing=(), fail=(), fail_operation=(), exists_operation=()):
+        super().__init__(fail)
+        self.existing = set(existing)
+        self.fail_operation = set(fail_operation)
+        self.exists_operation = set(exists_operation)
+
+    def create_membership(self, request, **kwargs):
+        self.record(request)
+        membership_id = request.membership_id
+        if membership_id in self.existing:
+            raise core_exceptions.AlreadyExists("exists")
+        if membership_id in self.fail:
+            raise core_exceptions.PermissionDenied("denied")
+        if membership_id in self.fail_operation:
+            return self.operation(error=core_exceptions.InternalServerError("boom"))
+        if membership_id in self.exists_operation:
+            return self.operation(error=core_exceptions.AlreadyExists("exists"))
+        return self.operation()
+
+
+def test_read_inventory_csv():
+    records = list(importer.read_inventory(io.StringIO(CSV), "csv"))
+    assert records == [
+        {
+            "parent": PARENT,
+            "resource_link": LINK.format("alpha"),
+            "labels": {"env": "prod", "team": "x"},
+        },
+        {"parent": PARENT, "external_id": "ext-1", "issuer": "https://issuer"},
+    ]
+
+
+def test_read_inventory_ndjson_from_path(tmpdir):
+    path = tmpdir.join("clusters.ndjson")
+    path.write(
+        json.dumps(_record("a", labels={"env": "dev"}))
+        + "\n\n"
+        + json.dumps(_record("b"))
+    )
+    records = list(importer.read_inventory(str(path)))
+    assert [r["resource_link"] for r in records] == [LINK.format("a"), LINK.format("b")]
+    assert records[0]["labels"] == {"env": "dev"}
+
+
+def test_read_inventory_yaml(tmpdir):
+    pytest.importorskip("yaml")
+    path = tmpdir.join("clusters.yaml")
+    path.write(
+        "- parent: {p}\n  resource_link: {a}\n---\nparent: {p}\nexternal_id: x\n".format(
+            p=PARENT, a=LINK.format("a")
+        )
+    )
+    records = list(importer.read_inventory(str(path)))
+    assert [r.get("external_id") for r in records] == [None, "x"]
+
+
+def test_read_inventory_labels():
+    path = io.StringIO(
+        json.dumps(_record("a", labels={}))
+        + "\n"
+        + json.dumps(_record("b", labels="env=dev;; team = x"))
+    )
+    records = list(importer.read_inventory(path, "ndjson"))
+    assert [r["labels"] for r in records] == [{}, {"env": "dev", "team": "x"}]
+
+
+def test_read_inventory_explicit_format(tmpdir):
+    path = tmpdir.join("clusters.txt")
+    path.write(json.dumps(_record("a")))
+    records = list(importer.read_inventory(str(path), "ndjson"))
+    assert [r["resource_link"] for r in records] == [LINK.format("a")]
+
+
+def test_read_inventory_yaml_requires_pyyaml():
+    with mock.patch.object(importer, "yaml", None):
+        with pytest.raises(ImportError):
+            list(importer.read_inventory(io.StringIO(""), "yaml"))
+
+
+def test_read_inventory_unknown_format():
+    with pytest.raises(ValueError):
+        list(importer.read_inventory(io.StringIO(""), "xml"))
+
+
+def test_membership_id_for():
+    first = importer.membership_id_for(_record("Prod_Cluster"))
+    assert first.startswith("prod-cluster-")
+    assert first == importer.membership_id_for(_record("Prod_Cluster"))
+    other = importer.membership_id_for(
+        {"parent": PARENT, "resource_link": LINK.format("Prod_Cluster") + "x"}
+    )
+    assert other != first
+    long_id = importer.membership_id_for(_record("c" * 100))
+    assert len(long_id) <= 63
+    assert importer.membership_id_for({"membership_id": "mine"}) == "mine"
+    with pytest.raises(ValueError):
+        importer.membership_id_for({"membership_id": "Not-Valid"})
+    with pytest.raises(ValueError):
+        importer.membership_id_for({"parent": PARENT})
+
+
+def test_build_request():
+    request = importer.build_request(
+        _record("a", external_id="uid", issuer="https://iss", labels={"k": "v"})
+    )
+    assert request.parent == PARENT
+    assert request.resource.endpoint.gke_cluster.resource_link == LINK.format("a")
+    assert request.resource.external_id == "uid"
+    assert request.resource.authority.issuer == "https://iss"
+    assert dict(request.resource.labels) == {"k": "v"}
+    again = importer.build_request(
+        _record("a", external_id="uid", issuer="https://iss", labels={"k": "v"})
+    )
+    assert again.request_id == request.request_id
+    assert importer.build_request(_record("a")).request_id != request.request_id
+    manifest = importer.build_request(
+        {"parent": PARENT, "membership_cr_manifest": "kind: Membership\n"}
+    )
+    assert manifest.membership_id.startswith("cluster-")
+    assert manifest.resource.endpoint.kubernetes_resource.membership_cr_manifest
+    with pytest.raises(ValueError):
+        importer.build_request({"resource_link": LINK.format("a")})
+
+
+def test_run_creates_concurrently():
+    client = FakeClient()
+    records = [_record("c{}".format(i)) for i in range(20)]
+    report = importer.MembershipImporter(client, rate=1000, max_concurrency=4).run(
+        records + records[:3]
+    )
+    assert report.ok
+    assert len(report.created) == 20
+    assert len(client.calls) == 20
+
+
+def test_run_applies_backpressure(tmpdir):
+    ids = [importer.membership_id_for(_record(n)) for n in ("a", "b")]
+    client = FakeClient(exists_operation=[ids[1]])
+    path = str(tmpdir.join("journal"))
+    with importer.Journal(path, fsync=False) as journal:
+        report = importer.MembershipImporter(
+            client, journal=journal, rate=1000, max_concurrency=1, max_waiting=1
+        ).run([_record(n) for n in ("a", "b", "c", "d")])
+    assert report.ok
+    assert len(report.created) == 3
+    assert report.existing == ["{}/memberships/{}".format(PARENT, ids[1])]
+
+
+def test_run_reports_outcomes(tmpdir):
+    ids = [importer.membership_id_for(_record(n)) for n in ("a", "b", "c", "d")]
+    client = FakeClient(existing=[ids[1]], fail=[ids[2]], fail_operation=[ids[3]])
+    with importer.Journal(str(tmpdir.join("journal"))) as journal:
+        report = importer.MembershipImporter(client, journal=journal, rate=1000).run(
+            [_record(n) for n in ("a", "b", "c", "d")] + [{"parent": PARENT}]
+        )
+        statuses = {k: v["status"] for k, v in journal.entries().items()}
+    names = ["{}/memberships/{}".format(PARENT, i) for i in ids]
+    assert report.created == [names[0]]
+    assert report.existing == [names[1]]
+    assert set(report.failed) == {names[2], names[3], "#4"}
+    assert not report.ok
+    assert statuses == {
+        names[0]: importer.CREATED,
+        names[1]: importer.EXISTS,
+        names[2]: importer.FAILED,
+        names[3]: importer.FAILED,
+    }
+
+
+def test_resume_from_journal(tmpdir):
+    path = str(tmpdir.join("journal"))
+    done, started = importer.build_request(_record("a")), importer.build_request(
+        _record("b")
+    )
+    with importer.Journal(path) as journal:
+        journal.record(
+            "{}/memberships/{}".format(PARENT, done.membership_id),
+            done.request_id,
+            importer.STARTED,
+        )
+        journal.record(
+            "{}/memberships/{}".format(PARENT, done.membership_id),
+            done.request_id,
+            importer.CREATED,
+        )
+        journal.record(
+            "{}/memberships/{}".format(PARENT, started.membership_id),
+            started.request_id,
+            importer.STARTED,
+        )
+    with open(path, "a") as f:
+        f.write('{"membership": "torn')
+    client = FakeClient()
+    with importer.Journal(path) as journal:
+        assert journal.finished("{}/memberships/{}".format(PARENT, done.membership_id))
+        report = importer.MembershipImporter(client, journal=journal, rate=1000).run(
+            [_record("a"), _record("b"), _record("c")]
+        )
+    assert len(report.skipped) == 1
+    assert len(report.created) == 2
+    assert [
+        r.request_id for r in client.calls if r.membership_id == started.membership_id
+    ] == [started.request_id]
+    with importer.Journal(path) as journal:
+        assert all(
+            entry["status"] == importer.CREATED for entry in journal.entries().values()
+        )
+
+
+@pytest.mark.parametrize("fail_on", [importer.STARTED, importer.CREATED])
+def test_journal_errors_are_failures(fail_on):
+    error = OSError("disk full")
+    journal = mock.Mock(spec=importer.Journal)
+    journal.finished.return_value = False
+
+    def record(name, request_id, status, error_=None):
+        if status == fail_on:
+            raise error
+
+    journal.record.side_effect = record
+    report = importer.MembershipImporter(FakeClient(), journal=journal, rate=1000).run(
+        [_record("a")]
+    )
+    assert not report.ok
+    assert report.created == []
+    assert list(report.failed.values()) == [error]
+
+
+def test_importer_validation():
+    with pytest.raises(ValueError):
+        importer.MembershipImporter(FakeClient(), max_concurrency=0)
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import mock
+import pytest
+
+from google.cloud.gkehub_v1.fleet import interning
+from google.cloud.gkehub_v1.types import membership
+
+
+def _fresh(value):
+    # Build an equal string that is not the same object.
+    return "".join(list(value))
+
+
+def test_intern_returns_canonical_instance():
+    table = interning.InternTable()
+    first = table.intern(_fresh("env"))
+    second = table.intern(_fresh("env"))
+    assert first is second
+    assert "env" in table
+    assert len(table) == 1
+    stats = table.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["saved_bytes"] > 0
+
+
+def test_intern_is_bounded():
+    table = interning.InternTable(max_size=2)
+    table.intern("a")
+    table.intern("b")
+    value = _fresh("c")
+    assert table.intern(value) is value
+    assert len(table) == 2
+    assert table.stats()["rejected"] == 1
+    assert table.max_size == 2
+
+
+def test_intern_table_rejects_non_positive_size():
+    with pytest.raises(ValueError):
+        interning.InternTable(max_size=0)
+
+
+def test_name_components_and_labels_share_strings():
+    table = interning.InternTable()
+    parts_a = table.name_components("projects/p/locations/global/memberships/a")
+    parts_b = table.name_components("projects/p/locations/global/memberships/b")
+    assert parts_a[1] is parts_b[1]
+    assert parts_a[3] is parts_b[3]
+    assert parts_a[5] == "a" and "a" not in table
+
+    labels_a = table.intern_labels({_fresh("env"): _fresh("prod")})
+    labels_b = table.intern_labels({_fresh("env"): _fresh("prod")})
+    ((key_a, value_a),) = labels_a.items()
+    ((key_b, value_b),) = labels_b.items()
+    assert key_a is key_b
+    assert value_a is value_b
+
+
+def test_intern_name_returns_canonical_instance():
+    table = interning.InternTable()
+    first = table.intern_name(_fresh("projects/p/locations/global/memberships/m"))
+    second = _fresh("projects/p/locations/global/memberships/m")
+    assert second is not first
+    assert table.intern_name(second) is first
+    assert table.stats()["names"] == 1
+
+
+def test_unique_names_do_not_fill_the_table():
+    table = interning.InternTable(max_size=16)
+    for i in range(40000):
+        name = "projects/p{}/locations/global/memberships/m{}".format(i % 4, i)
+        assert table.intern_name(name) == name
+    assert len(table) == 0
+    assert table.stats()["names"] == 16
+    value = _fresh("prod")
+    assert table.intern(value) is value
+    assert table.intern(_fresh("prod")) is value
+    assert table.stats()["rejected"] == 40000 - 16
+
+
+def test_clear_resets_table():
+    table = interning.InternTable()
+    table.intern("x")
+    table.clear()
+    assert len(table) == 0
+    assert table.stats()["misses"] == 0
+
+
+def test_iter_interned_memberships():
+    table = interning.InternTable()
+    memberships = [
+        membership.Membership(
+            name="projects/p/locations/global/memberships/m%d" % i,
+            labels={"env": "prod", "tier": "gold"},
+        )
+        for i in range(3)
+    ]
+    records = list(interning.iter_interned_memberships(memberships, table))
+    assert [name for name, _ in records] == [m.name for m in memberships]
+    keys = [next(iter(labels)) for _, labels in records]
+    assert keys[0] is keys[1] is keys[2]
+    assert table.stats()["hits"] > 0
+
+
+def test_default_intern_table_is_shared():
+    assert interning.default_intern_table() is interning.default_intern_table()
+    name = "projects/p/locations/global/memberships/m0"
+    records = list(
+        interning.iter_interned_memberships([membership.Membership(name=name)])
+    )
+    assert records == [(name, {})]
+
+
+def test_default_intern_table_built_while_waiting_is_kept():
+    other = interning.InternTable()
+
+    class Lock:
+        # Another thread builds the table while this one waits.
+        def __enter__(self):
+            interning._default_table = other
+
+        def __exit__(self, *exc_info):
+            pass
+
+    with mock.patch.object(interning, "_default_table", None):
+        with mock.patch.object(interning, "_default_table_lock", Lock()):
+            assert interning.default_intern_table() is other
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+
+import pytest
+
+from google.cloud.gkehub_v1 import configmanagement_v1
+from google.cloud.gkehub_v1.fleet import joins
+from google.cloud.gkehub_v1.types import feature
+from google.cloud.gkehub_v1.types import membership
+
+
+def _feature(*keys):
+    return feature.Feature(
+        name="projects/123/locations/global/features/configmanagement",
+        membership_specs={
+            key: feature.MembershipFeatureSpec(
+                configmanagement=configmanagement_v1.MembershipSpec(version="1.9.0")
+            )
+            for key in keys
+        },
+        membership_states={
+            key: feature.MembershipFeatureState(
+                state=feature.FeatureState(code=feature.FeatureState.Code.OK)
+            )
+            for key in keys
+        },
+    )
+
+
+def test_project_alias_cache_learn_and_evict():
+    cache = joins.ProjectAliasCache(max_size=2)
+    cache.learn("1", "one")
+    cache.learn("2", "two")
+    assert cache.project_id("1") == "one"
+    cache.learn("3", "three")
+    assert len(cache) == 2
+    assert cache.project_id("2") is None
+    assert cache.project_number("two") is None
+    assert cache.canonical("one") == "1"
+    assert cache.canonical("unknown") == "unknown"
+    cache.learn("3", "tres")
+    assert cache.project_number("three") is None
+    assert cache.project_number("tres") == "3"
+    cache.learn("4", "4")
+    assert cache.project_id("4") is None
+    cache.learn("5", "tres")
+    assert cache.project_id("3") is None
+    assert cache.project_number("tres") == "5"
+
+
+def test_project_alias_cache_rejects_non_positive_size():
+    with pytest.raises(ValueError):
+        joins.ProjectAliasCache(max_size=0)
+
+
+def test_project_alias_cache_persistence(tmp_path):
+    path = str(tmp_path / "aliases.json")
+    cache = joins.ProjectAliasCache(path=path)
+    cache.learn(123, "my-project")
+    cache.save()
+    with open(path) as fh:
+        assert json.load(fh) == {"123": "my-project"}
+
+    reloaded = joins.ProjectAliasCache(path=path)
+    assert reloaded.project_id("123") == "my-project"
+
+    with pytest.raises(ValueError):
+        joins.ProjectAliasCache().save()
+
+
+def test_join_learns_project_number():
+    cache = joins.ProjectAliasCache()
+    feat = _feature(
+        "projects/123/locations/global/memberships/a",
+        "projects/123/locations/global/memberships/orphan",
+    )
+    listed = [
+        membership.Membership(
+            name="projects/my-project/locations/global/memberships/a"
+        ),
+        membership.Membership(
+            name="projects/my-project/locations/global/memberships/b"
+        ),
+    ]
+    records = list(
+        joins.join_feature_memberships(feat, listed, cache, include_orphans=True)
+    )
+    assert cache.project_id("123") == "my-project"
+    assert [r.name for r in records] == [
+        "projects/my-project/locations/global/memberships/a",
+        "projects/my-project/locations/global/memberships/b",
+        "projects/123/locations/global/memberships/orphan",
+    ]
+    assert records[0].key == "projects/123/locations/global/memberships/a"
+    assert records[0].spec.configmanagement.version == "1.9.0"
+    assert records[0].state.state.code == feature.FeatureState.Code.OK
+    assert records[1].key is None and records[1].spec is None
+    assert records[2].membership is None
+
+
+def test_join_uses_known_aliases():
+    cache = joins.ProjectAliasCache()
+    cache.learn("123", "my-project")
+    feat = _feature("projects/123/locations/global/memberships/a")
+    listed = [
+        membership.Membership(name="projects/my-project/locations/global/memberships/a")
+    ]
+    (record,) = joins.join_feature_memberships(feat, listed, cache)
+    assert record.key == "projects/123/locations/global/memberships/a"
+
+
+def test_join_does_not_relearn_a_known_project_number():
+    cache = joins.ProjectAliasCache()
+    cache.learn("111", "proj-a")
+    feat = _feature("projects/111/locations/l/memberships/foo")
+    listed = [membership.Membership(name="projects/proj-b/locations/l/memberships/foo")]
+    (record,) = joins.join_feature_memberships(feat, listed, cache)
+    assert record.key is None and record.spec is None
+    assert cache.project_id("111") == "proj-a"
+    assert cache.project_number("proj-b") is None
+
+
+def test_join_ambiguous_suffix_is_not_learned():
+    cache = joins.ProjectAliasCache()
+    feat = _feature(
+        "projects/123/locations/global/memberships/a",
+        "projects/456/locations/global/memberships/a",
+    )
+    listed = [
+        membership.Membership(
+            name="projects/my-project/locations/global/memberships/a"
+        ),
+        membership.Membership(name="bogus"),
+    ]
+    records = list(joins.join_feature_memberships(feat, listed, cache))
+    assert [r.key for r in records] == [None, None]
+    assert len(cache) == 0
+
+
+def test_join_skips_unparsable_keys_without_a_cache():
+    feat = _feature("bogus", "projects/123/locations/global/memberships/a")
+    listed = [
+        membership.Membership(name="projects/my-project/locations/global/memberships/a")
+    ]
+    records = list(joins.join_feature_memberships(feat, listed, include_orphans=True))
+    assert [(r.name, r.key) for r in records] == [
+        (
+            "projects/my-project/locations/global/memberships/a",
+            "projects/123/locations/global/memberships/a",
+        ),
+    ]
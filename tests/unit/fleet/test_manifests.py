@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+
+import mock
+import pytest
+
+from google.cloud.gkehub_v1.fleet.manifests import ManifestCache
+from google.cloud.gkehub_v1.types import service
+from google.cloud.gkehub_v1beta1.types import membership as v1beta1_membership
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _resource(kind, manifest, module=service):
+    return module.ConnectAgentResource(
+        type_=module.TypeMeta(kind=kind, api_version="v1"), manifest=manifest
+    )
+
+
+def _response(name, module=service):
+    return module.GenerateConnectManifestResponse(
+        manifest=[
+            _resource("Namespace", "kind: Namespace\n" * 50, module),
+            _resource("Secret", "membership: {}\n".format(name), module),
+        ]
+    )
+
+
+def _request(name, version="1.2.3"):
+    return service.GenerateConnectManifestRequest(
+        name=name, version=version, namespace="gke-connect", is_upgrade=True
+    )
+
+
+def _client():
+    client = mock.Mock()
+    client.generate_connect_manifest.side_effect = lambda request, **kw: _response(
+        request.name,
+        (
+            service
+            if isinstance(request, service.GenerateConnectManifestRequest)
+            else v1beta1_membership
+        ),
+    )
+    return client
+
+
+def test_generate_serves_repeats_from_cache(tmpdir):
+    cache = ManifestCache(str(tmpdir))
+    client = _client()
+    request = _request("projects/p/locations/global/memberships/a")
+
+    first = cache.generate(client, request, timeout=5)
+    second = cache.generate(client, _request(request.name))
+
+    assert first == second == _response(request.name)
+    client.generate_connect_manifest.assert_called_once_with(request=request, timeout=5)
+    assert cache.hits == 1 and cache.misses == 1
+
+
+def test_key_covers_every_field():
+    base = _request("projects/p/locations/global/memberships/a")
+    assert ManifestCache.key(base) == ManifestCache.key(_request(base.name))
+    assert ManifestCache.key(base) != ManifestCache.key(
+        _request(base.name, version="1.2.4")
+    )
+    secret = _request(base.name)
+    secret.image_pull_secret_content = b"s3cr3t"
+    assert ManifestCache.key(base) != ManifestCache.key(secret)
+    beta = v1beta1_membership.GenerateConnectManifestRequest(name=base.name)
+    assert ManifestCache.key(beta) != ManifestCache.key(
+        service.GenerateConnectManifestRequest(name=base.name)
+    )
+    with pytest.raises(TypeError):
+        ManifestCache.key({"name": base.name})
+
+
+def test_shared_resources_are_stored_once(tmpdir):
+    cache = ManifestCache(str(tmpdir))
+    client = _client()
+    for i in range(3):
+        cache.generate(client, _request("projects/p/locations/l/memberships/" + str(i)))
+
+    stats = cache.stats()
+    assert stats["responses"] == 3
+    # One shared Namespace plus one Secret per membership.
+    assert stats["blobs"] == 4
+    assert len(os.listdir(os.path.join(str(tmpdir), "blobs"))) == 4
+    uncompressed = len("kind: Namespace\n" * 50)
+    assert stats["bytes"] < uncompressed
+
+
+def test_requests_with_pull_secrets_are_not_cached(tmpdir):
+    secret = service.GenerateConnectManifestResponse(
+        manifest=[
+            _resource("Namespace", "kind: Namespace\n"),
+            _resource("Secret", "data:\n  .dockerconfigjson: pull-secret-value\n"),
+        ]
+    )
+    client = mock.Mock()
+    client.generate_connect_manifest.return_value = secret
+    cache = ManifestCache(str(tmpdir))
+    request = _request("projects/p/locations/global/memberships/a")
+    request.image_pull_secret_content = b"pull-secret-value"
+
+    assert cache.generate(client, request) == secret
+    assert cache.generate(client, request) == secret
+    cache.put(request, secret)
+
+    assert client.generate_connect_manifest.call_count == 2
+    assert cache.bypassed == 2
+    assert cache.get(request) is None
+    assert len(cache) == 0
+    assert not any(files for _, _, files in os.walk(str(tmpdir)))
+
+
+def test_files_are_private(tmpdir):
+    directory = str(tmpdir.join("cache"))
+    cache = ManifestCache(directory)
+    cache.generate(_client(), _request("projects/p/locations/global/memberships/a"))
+    assert os.stat(directory).st_mode & 0o777 == 0o700
+    for root, dirs, files in os.walk(directory):
+        for name in dirs:
+            assert os.stat(os.path.join(root, name)).st_mode & 0o777 == 0o700
+        for name in files:
+            assert os.stat(os.path.join(root, name)).st_mode & 0o777 == 0o600
+
+
+def test_entries_expire_after_ttl(tmpdir):
+    clock = FakeClock()
+    cache = ManifestCache(str(tmpdir), ttl=60, clock=clock)
+    client = _client()
+    request = _request("projects/p/locations/global/memberships/a")
+
+    cache.generate(client, request)
+    clock.now += 60
+    assert cache.get(request) is not None
+    clock.now += 1
+    assert cache.get(request) is None
+    assert cache.stats()["blobs"] == 0
+    cache.generate(client, request)
+    assert client.generate_connect_manifest.call_count == 2
+
+
+def test_least_recently_used_is_evicted(tmpdir):
+    # A fixed clock keeps the index files the same size when rewritten.
+    clock = FakeClock()
+    cache = ManifestCache(str(tmpdir), clock=clock)
+    client = _client()
+    names = ["projects/p/locations/l/memberships/" + str(i) for i in range(3)]
+    for name in names:
+        cache.generate(client, _request(name))
+    size = cache.stats()["bytes"]
+    # Recency survives a reopen through the index files' mtimes.
+    for age, name in enumerate(reversed(names)):
+        index = os.path.join(str(tmpdir), "index", cache.key(_request(name)))
+        os.utime(index + ".json", (1000 - age, 1000 - age))
+
+    bounded = ManifestCache(str(tmpdir), max_bytes=size - 1, clock=clock)
+    assert len(bounded) == 3
+    bounded.get(_request(names[0]))
+    bounded.put(_request(names[1]), _response(names[1]))
+
+    assert bounded.evictions == 1
+    assert bounded.get(_request(names[2])) is None
+    assert bounded.get(_request(names[0])) is not None
+    assert bounded.get(_request(names[1])) is not None
+    assert bounded.stats()["bytes"] <= size - 1
+
+
+def test_reopen_restores_entries_and_removes_orphans(tmpdir):
+    cache = ManifestCache(str(tmpdir))
+    request = _request("projects/p/locations/global/memberships/a")
+    cache.generate(_client(), request)
+    orphan = os.path.join(str(tmpdir), "blobs", "0" * 64 + ".z")
+    open(orphan, "wb").close()
+    open(os.path.join(str(tmpdir), "index", "x.json.tmp"), "wb").close()
+
+    reopened = ManifestCache(str(tmpdir))
+
+    assert reopened.stats() == dict(cache.stats(), hits=0, misses=0)
+    assert not os.path.exists(orphan)
+    assert reopened.get(request) == _response(request.name)
+
+
+def test_reopen_drops_damaged_files(tmpdir):
+    cache = ManifestCache(str(tmpdir))
+    first = _request("projects/p/locations/global/memberships/a")
+    second = _request("projects/p/locations/global/memberships/b", version="2")
+    cache.generate(_client(), first)
+    cache.generate(_client(), second)
+    index_dir = os.path.join(str(tmpdir), "index")
+    blob_dir = os.path.join(str(tmpdir), "blobs")
+    with open(os.path.join(index_dir, cache.key(first) + ".json"), "wb") as fh:
+        fh.write(b"{not json")
+    with open(os.path.join(index_dir, cache.key(second) + ".json"), "w") as fh:
+        fh.write('{"created": 1000, "blobs": ["%s"]}' % ("f" * 64))
+    stray = os.path.join(blob_dir, "stray.tmp")
+    open(stray, "wb").close()
+
+    reopened = ManifestCache(str(tmpdir))
+
+    assert len(reopened) == 0
+    assert os.listdir(index_dir) == []
+    assert os.listdir(blob_dir) == []
+
+
+def test_touch_failure_still_hits(tmpdir):
+    cache = ManifestCache(str(tmpdir))
+    request = _request("projects/p/locations/global/memberships/a")
+    cache.generate(_client(), request)
+    with mock.patch.object(os, "utime", side_effect=OSError("read-only")):
+        assert cache.get(request) == _response(request.name)
+    assert cache.hits == 1
+
+
+def test_missing_blob_is_a_miss(tmpdir):
+    cache = ManifestCache(str(tmpdir))
+    request = _request("projects/p/locations/global/memberships/a")
+    cache.generate(_client(), request)
+    blob_dir = os.path.join(str(tmpdir), "blobs")
+    os.unlink(os.path.join(blob_dir, sorted(os.listdir(blob_dir))[0]))
+
+    assert cache.get(request) is None
+    assert len(cache) == 0
+
+
+def test_v1beta1_requests(tmpdir):
+    cache = ManifestCache(str(tmpdir))
+    client = _client()
+    request = v1beta1_membership.GenerateConnectManifestRequest(
+        name="projects/p/locations/global/memberships/a",
+        connect_agent=v1beta1_membership.ConnectAgent(namespace="gke-connect"),
+    )
+    cache.generate(client, request)
+    response = cache.get(request)
+
+    assert isinstance(response, v1beta1_membership.GenerateConnectManifestResponse)
+    assert response == _response(request.name, v1beta1_membership)
+
+
+def test_clear(tmpdir):
+    cache = ManifestCache(str(tmpdir))
+    cache.generate(_client(), _request("projects/p/locations/global/memberships/a"))
+    cache.clear()
+    assert cache.stats()["bytes"] == 0
+    assert os.listdir(os.path.join(str(tmpdir), "blobs")) == []
+    assert os.listdir(os.path.join(str(tmpdir), "index")) == []
+
+
+def test_invalid_arguments(tmpdir):
+    with pytest.raises(ValueError):
+        ManifestCache(str(tmpdir), ttl=0)
+    with pytest.raises(ValueError):
+        ManifestCache(str(tmpdir), max_bytes=0)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from concurrent import futures
+import operator
+import threading
+
+import mock
+import pytest
+
+from google.cloud.gkehub_v1.fleet import mapreduce
+from google.cloud.gkehub_v1.types import membership
+from google.cloud.gkehub_v1.types import service
+
+
+def _node_count(resource):
+    return resource.endpoint.kubernetes_metadata.node_count
+
+
+def _fail(resource):
+    raise RuntimeError("boom")
+
+
+def _memberships(count):
+    return [
+        membership.Membership(
+            name="m%d" % i,
+            endpoint=membership.MembershipEndpoint(
+                kubernetes_metadata=membership.KubernetesMetadata(node_count=i)
+            ),
+        )
+        for i in range(count)
+    ]
+
+
+def _pager(resources, page_size):
+    pages = [
+        service.ListMembershipsResponse(resources=resources[i : i + page_size])
+        for i in range(0, len(resources), page_size)
+    ]
+    return mock.Mock(pages=iter(pages))
+
+
+def test_fleet_map_reduce_process_pool():
+    total = mapreduce.fleet_map_reduce(
+        _pager(_memberships(50), 7), _node_count, operator.add, workers=2
+    )
+    assert total == sum(range(50))
+
+
+def test_fleet_map_reduce_inline_and_chunked():
+    resources = _memberships(10)
+    assert (
+        mapreduce.fleet_map_reduce(
+            resources, _node_count, operator.add, workers=0, page_size=3
+        )
+        == 45
+    )
+    raw = [membership.Membership.pb(r) for r in resources]
+    partials = list(
+        mapreduce.iter_partials(raw, _node_count, operator.add, workers=0, page_size=4)
+    )
+    assert partials == [6, 22, 17]
+
+
+def test_fleet_map_reduce_with_executor_and_backpressure():
+    with futures.ThreadPoolExecutor(max_workers=2) as executor:
+        partials = list(
+            mapreduce.iter_partials(
+                _pager(_memberships(20), 2),
+                _node_count,
+                max,
+                executor=executor,
+                max_pending=1,
+            )
+        )
+    assert partials == [1, 3, 5, 7, 9, 11, 13, 15, 17, 19]
+
+
+def test_fleet_map_reduce_keeps_listing_order():
+    def name(resource):
+        # Early pages finish last.
+        threading.Event().wait(0.01 * (10 - int(resource.name[1:])))
+        return resource.name
+
+    with futures.ThreadPoolExecutor(max_workers=4) as executor:
+        result = mapreduce.fleet_map_reduce(
+            _memberships(10), name, operator.add, executor=executor, page_size=1
+        )
+    assert result == "".join("m%d" % i for i in range(10))
+
+
+def test_iter_partials_rejects_non_positive_max_pending():
+    with pytest.raises(ValueError):
+        list(mapreduce.iter_partials([], _node_count, operator.add, max_pending=0))
+
+
+def test_fleet_map_reduce_empty():
+    with pytest.raises(ValueError):
+        mapreduce.fleet_map_reduce([], _node_count, operator.add, workers=0)
+    assert (
+        mapreduce.fleet_map_reduce([], _node_count, operator.add, workers=0, initial=0)
+        == 0
+    )
+
+
+def test_fleet_map_reduce_propagates_errors():
+    with futures.ThreadPoolExecutor(max_workers=1) as executor:
+        with pytest.raises(RuntimeError):
+            mapreduce.fleet_map_reduce(
+                _memberships(3), _fail, operator.add, executor=executor
+            )
+
+
+def test_iter_partials_skips_empty_pages():
+    pages = [
+        service.ListMembershipsResponse(),
+        service.ListMembershipsResponse(resources=_memberships(3)),
+    ]
+    partials = list(
+        mapreduce.iter_partials(
+            mock.Mock(pages=iter(pages)), _node_count, operator.add, workers=0
+        )
+    )
+    assert partials == [3]
+
+
+def test_closing_iter_partials_cancels_pending_chunks():
+    submitted = []
+
+    def submit(*args):
+        submitted.append(mock.Mock(**{"result.return_value": 1}))
+        return submitted[-1]
+
+    executor = mock.Mock(**{"submit.side_effect": submit})
+    partials = mapreduce.iter_partials(
+        _memberships(10),
+        _node_count,
+        operator.add,
+        executor=executor,
+        page_size=1,
+        max_pending=3,
+    )
+    assert next(partials) == 1
+    partials.close()
+    assert len(submitted) == 3
+    submitted[0].cancel.assert_not_called()
+    for future in submitted[1:]:
+        future.cancel.assert_called_once_with()
+    executor.shutdown.assert_not_called()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import pytest
+
+from google.cloud.gkehub_v1.fleet import interning
+from google.cloud.gkehub_v1.fleet import names
+from google.cloud.gkehub_v1.services.gke_hub import GkeHubClient
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "projects/p/locations/global/memberships/m",
+        "projects/p/locations/global/memberships/a/b",
+        "projects//locations/global/memberships/m",
+        "projects/p/locations/global/features/m",
+        "memberships/m",
+        "",
+    ],
+)
+def test_parse_membership_path_matches_client(path):
+    assert names.parse_membership_path(path) == GkeHubClient.parse_membership_path(path)
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "projects/p/locations/global/features/configmanagement",
+        "projects/p/locations/global/memberships/m",
+        "projects/p/x/y/locations/global/features/f",
+    ],
+)
+def test_parse_feature_path_matches_client(path):
+    assert names.parse_feature_path(path) == GkeHubClient.parse_feature_path(path)
+
+
+def test_bulk_parse():
+    paths = [
+        "projects/p/locations/global/memberships/a",
+        "bogus",
+    ]
+    assert names.parse_membership_paths(paths) == [
+        {"project": "p", "location": "global", "membership": "a"},
+        {},
+    ]
+    assert names.parse_feature_paths(["projects/p/locations/l/features/f"]) == [
+        {"project": "p", "location": "l", "feature": "f"}
+    ]
+
+
+def test_membership_name_index_queries():
+    index = names.MembershipNameIndex(intern_table=interning.InternTable())
+    index.update(
+        [
+            "projects/p1/locations/global/memberships/a",
+            "projects/p1/locations/global/memberships/b",
+            "projects/p1/locations/us-east1/memberships/c",
+            "projects/p2/locations/global/memberships/d",
+        ]
+    )
+    index.add("projects/p1/locations/global/memberships/a", value="payload")
+    assert len(index) == 4
+    assert sorted(index.projects()) == ["p1", "p2"]
+    assert sorted(index.locations("p1")) == ["global", "us-east1"]
+    assert sorted(index.query("p1")) == [
+        "payload",
+        "projects/p1/locations/global/memberships/b",
+        "projects/p1/locations/us-east1/memberships/c",
+    ]
+    assert list(index.query("p1", "us-east1")) == [
+        "projects/p1/locations/us-east1/memberships/c"
+    ]
+    assert list(index.query("missing")) == []
+    assert index.get("projects/p1/locations/global/memberships/a") == "payload"
+    assert index.get("bogus", "default") == "default"
+    assert index.lookup("p2", "global", "d") == (
+        "projects/p2/locations/global/memberships/d"
+    )
+    assert "projects/p2/locations/global/memberships/d" in index
+    assert "bogus" not in index
+    assert len(list(index)) == 4
+
+
+def test_membership_name_index_remove():
+    index = names.MembershipNameIndex()
+    index.add("projects/p/locations/global/memberships/a")
+    with pytest.raises(ValueError):
+        index.add("bogus")
+    assert not index.remove("bogus")
+    assert not index.remove("projects/p/locations/global/memberships/z")
+    assert index.remove("projects/p/locations/global/memberships/a")
+    assert len(index) == 0
+    assert index.projects() == []
+
+
+def test_membership_name_index_remove_keeps_siblings():
+    index = names.MembershipNameIndex()
+    index.add("projects/p/locations/global/memberships/a")
+    index.add("projects/p/locations/global/memberships/b")
+    index.add("projects/p/locations/us-east1/memberships/c")
+    assert index.remove("projects/p/locations/global/memberships/a")
+    assert index.locations("p") == ["global", "us-east1"]
+    assert index.remove("projects/p/locations/us-east1/memberships/c")
+    assert index.locations("p") == ["global"]
+    assert len(index) == 1
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import mock
+import pytest
+
+from google.auth import credentials as ga_credentials
+from google.cloud.gkehub_v1 import GkeHubAsyncClient
+from google.cloud.gkehub_v1 import GkeHubClient
+from google.cloud.gkehub_v1.fleet import paging
+from google.cloud.gkehub_v1.types import feature
+from google.cloud.gkehub_v1.types import membership
+from google.cloud.gkehub_v1.types import service
+from google.cloud.gkehub_v1beta1 import GkeHubMembershipServiceClient
+from google.cloud.gkehub_v1beta1.types import membership as v1beta1_membership
+
+
+def _pages(module=service, resource=membership.Membership):
+    return (
+        module.ListMembershipsResponse(
+            resources=[resource(name="a"), resource(name="b"), resource(name="c")],
+            next_page_token="abc",
+        ),
+        module.ListMembershipsResponse(
+            resources=[resource(name="d"), resource(name="e")],
+            next_page_token="def",
+        ),
+        module.ListMembershipsResponse(resources=[resource(name="f")]),
+        RuntimeError,
+    )
+
+
+def _recording(responses, requests):
+    responses = iter(responses)
+
+    def fake_call(request, **kwargs):
+        requests.append((request.page_token, request.page_size))
+        return next(responses)
+
+    return fake_call
+
+
+def test_page_size_tuner():
+    tuner = paging.PageSizeTuner(
+        target_bytes=1000, latency_budget=1.0, min_page_size=1, max_page_size=50
+    )
+    response = service.ListMembershipsResponse(
+        resources=[membership.Membership(name="x" * 90) for _ in range(10)],
+    )
+    # ~100 bytes per resource: 10 fit the byte target, latency allows more.
+    assert tuner.next_page_size(10, response, 0.1) == 10
+    # Slow pages shrink toward the latency budget.
+    assert tuner.next_page_size(10, response, 4.0) < 10
+    assert tuner.next_page_size(7, service.ListMembershipsResponse(), None) == 7
+    assert tuner.pages == 3
+    assert tuner.total_bytes > 0
+
+    growing = paging.PageSizeTuner(target_bytes=10**9, max_page_size=1000)
+    assert growing.next_page_size(10, response, None) == 20
+    assert growing.next_page_size(0, response, None) == 20
+
+    with pytest.raises(ValueError):
+        paging.PageSizeTuner(min_page_size=0)
+
+
+def test_listing_iterates_every_page():
+    client = GkeHubClient(credentials=ga_credentials.AnonymousCredentials())
+    request = service.ListMembershipsRequest(parent="parent_value", page_size=3)
+    requests = []
+    with mock.patch.object(type(client.transport.list_memberships), "__call__") as call:
+        call.side_effect = _recording(_pages(), requests)
+        listing = paging.Listing(client.list_memberships, request, timeout=5)
+        with pytest.raises(AttributeError):
+            listing.next_page_token
+        assert [r.name for r in listing] == ["a", "b", "c", "d", "e", "f"]
+        assert call.mock_calls[0][2]["timeout"] == 5
+    assert requests == [("", 3), ("abc", 3), ("def", 3)]
+    # The caller's request is not modified.
+    assert request.page_token == ""
+    assert listing.next_page_token == ""
+
+
+def test_listing_adapts_page_size():
+    client = GkeHubClient(credentials=ga_credentials.AnonymousCredentials())
+    requests = []
+    with mock.patch.object(type(client.transport.list_memberships), "__call__") as call:
+        call.side_effect = _recording(_pages(), requests)
+        tuner = paging.PageSizeTuner(min_page_size=1, max_growth=2.0)
+        listing = paging.Listing(
+            client.list_memberships,
+            service.ListMembershipsRequest(page_size=3),
+            tuner=tuner,
+        )
+        assert len(list(listing)) == 6
+
+    # Tiny, fast pages: the size doubles each time.
+    assert [size for _, size in requests] == [3, 6, 12]
+    assert tuner.pages == 2
+
+
+def test_listing_v1beta1():
+    client = GkeHubMembershipServiceClient(
+        credentials=ga_credentials.AnonymousCredentials()
+    )
+    with mock.patch.object(type(client.transport.list_memberships), "__call__") as call:
+        call.side_effect = _pages(v1beta1_membership, v1beta1_membership.Membership)
+        listing = paging.Listing(
+            client.list_memberships,
+            v1beta1_membership.ListMembershipsRequest(page_size=3),
+            tuner=paging.PageSizeTuner(min_page_size=1),
+        )
+        assert [r.name for r in listing] == ["a", "b", "c", "d", "e", "f"]
+
+
+@pytest.mark.asyncio
+async def test_async_listing_adapts_page_size():
+    client = GkeHubAsyncClient(credentials=ga_credentials.AnonymousCredentials())
+    requests = []
+    with mock.patch.object(
+        type(client.transport.list_memberships), "__call__", new_callable=mock.AsyncMock
+    ) as call:
+        fake_call = _recording(_pages(), requests)
+
+        async def async_call(request, **kwargs):
+            return fake_call(request, **kwargs)
+
+        call.side_effect = async_call
+        listing = paging.AsyncListing(
+            client.list_memberships,
+            service.ListMembershipsRequest(page_size=3),
+            tuner=paging.PageSizeTuner(),
+        )
+        assert [r.name async for r in listing] == ["a", "b", "c", "d", "e", "f"]
+
+    # The default tuner never goes below its minimum page size of 10.
+    assert [size for _, size in requests] == [3, 10, 20]
+
+
+def test_listing_checkpoint_resume():
+    client = GkeHubClient(credentials=ga_credentials.AnonymousCredentials())
+    request = service.ListMembershipsRequest(parent="parent_value", page_size=3)
+    with mock.patch.object(type(client.transport.list_memberships), "__call__") as call:
+        call.side_effect = _pages()
+        listing = paging.Listing(client.list_memberships, request)
+        assert listing.checkpoint().offset == 0
+        iterator = iter(listing)
+        consumed = [next(iterator).name for _ in range(4)]
+        checkpoint = listing.checkpoint()
+
+    assert consumed == ["a", "b", "c", "d"]
+    assert checkpoint.request_type == "google.cloud.gkehub.v1.ListMembershipsRequest"
+    assert checkpoint.page_token == "abc"
+    assert checkpoint.offset == 1
+    assert paging.PagerCheckpoint.from_dict(checkpoint.to_dict()) == checkpoint
+
+    requests = []
+    with mock.patch.object(type(client.transport.list_memberships), "__call__") as call:
+        call.side_effect = _recording(_pages()[1:], requests)
+        resumed = paging.Listing.from_checkpoint(client.list_memberships, checkpoint)
+        assert [r.name for r in resumed] == ["e", "f"]
+        assert call.mock_calls[0][1][0].parent == "parent_value"
+    assert requests[0] == ("abc", 3)
+
+
+def test_resumed_listing_reports_pending_offset():
+    client = GkeHubClient(credentials=ga_credentials.AnonymousCredentials())
+    checkpoint = (
+        paging.Listing(client.list_memberships, service.ListMembershipsRequest())
+        .checkpoint()
+        ._replace(offset=2)
+    )
+    resumed = paging.Listing.from_checkpoint(client.list_memberships, checkpoint)
+    # Nothing fetched yet: saving this checkpoint again must not replay a, b.
+    assert resumed.checkpoint() == checkpoint
+    with mock.patch.object(type(client.transport.list_memberships), "__call__") as call:
+        call.side_effect = _pages()
+        iterator = iter(resumed)
+        assert next(iterator).name == "c"
+        assert resumed.checkpoint().offset == 3
+
+
+def test_checkpoint_of_failed_fetch_starts_the_next_page():
+    client = GkeHubClient(credentials=ga_credentials.AnonymousCredentials())
+    with mock.patch.object(type(client.transport.list_memberships), "__call__") as call:
+        call.side_effect = _pages()[:1] + (RuntimeError,)
+        listing = paging.Listing(
+            client.list_memberships, service.ListMembershipsRequest()
+        )
+        with pytest.raises(RuntimeError):
+            list(listing)
+    checkpoint = listing.checkpoint()
+    assert (checkpoint.page_token, checkpoint.offset) == ("abc", 0)
+
+
+def test_checkpoint_for_unknown_request_type():
+    checkpoint = paging.PagerCheckpoint(
+        request_type="google.cloud.gkehub.v1.Other",
+        request=b"",
+        page_token="",
+        offset=0,
+    )
+    with pytest.raises(ValueError):
+        paging.Listing.from_checkpoint(mock.Mock(), checkpoint)
+
+
+def test_list_features_checkpoint():
+    client = GkeHubClient(credentials=ga_credentials.AnonymousCredentials())
+    with mock.patch.object(type(client.transport.list_features), "__call__") as call:
+        call.side_effect = [
+            service.ListFeaturesResponse(
+                resources=[feature.Feature(name="a"), feature.Feature(name="b")],
+                next_page_token="abc",
+            ),
+            service.ListFeaturesResponse(resources=[feature.Feature(name="c")]),
+        ]
+        listing = paging.Listing(client.list_features, service.ListFeaturesRequest())
+        iterator = iter(listing)
+        next(iterator)
+        checkpoint = listing.checkpoint()
+    assert isinstance(checkpoint.to_request(), service.ListFeaturesRequest)
+    assert checkpoint.offset == 1
+
+
+def test_checkpoint_file(tmpdir):
+    client = GkeHubMembershipServiceClient(
+        credentials=ga_credentials.AnonymousCredentials()
+    )
+    checkpoint_file = paging.CheckpointFile(str(tmpdir.join("ckpt.json")), every=2)
+    assert checkpoint_file.load() is None
+    pages = _pages(v1beta1_membership, v1beta1_membership.Membership)
+
+    with mock.patch.object(type(client.transport.list_memberships), "__call__") as call:
+        call.side_effect = pages
+        tracked = checkpoint_file.track(
+            paging.Listing(
+                client.list_memberships, v1beta1_membership.ListMembershipsRequest()
+            )
+        )
+        consumed = [next(tracked).name for _ in range(5)]
+
+    saved = checkpoint_file.load()
+    assert consumed == ["a", "b", "c", "d", "e"]
+    assert saved.page_token == "abc"
+    assert saved.offset == 1
+
+    with mock.patch.object(type(client.transport.list_memberships), "__call__") as call:
+        call.side_effect = pages[1:]
+        resumed = paging.Listing.from_checkpoint(client.list_memberships, saved)
+        assert [r.name for r in checkpoint_file.track(resumed)] == ["e", "f"]
+
+    assert checkpoint_file.load() is None
+    checkpoint_file.clear()
+
+
+@pytest.mark.asyncio
+async def test_async_listing_checkpoint(tmpdir):
+    client = GkeHubAsyncClient(credentials=ga_credentials.AnonymousCredentials())
+    checkpoint_file = paging.CheckpointFile(
+        str(tmpdir.join("ckpt.json")), every=100, interval=0
+    )
+
+    with mock.patch.object(
+        type(client.transport.list_memberships), "__call__", new_callable=mock.AsyncMock
+    ) as call:
+        call.side_effect = _pages()
+        listing = paging.AsyncListing(
+            client.list_memberships, service.ListMembershipsRequest()
+        )
+        tracked = checkpoint_file.track_async(listing)
+        consumed = [(await tracked.__anext__()).name for _ in range(5)]
+        await tracked.aclose()
+    assert consumed == ["a", "b", "c", "d", "e"]
+
+    # Saved once "e" was asked for, so "d" is the last one handled.
+    saved = checkpoint_file.load()
+    assert (saved.page_token, saved.offset) == ("abc", 1)
+
+    with mock.patch.object(
+        type(client.transport.list_memberships), "__call__", new_callable=mock.AsyncMock
+    ) as call:
+        call.side_effect = _pages()[1:]
+        resumed = paging.AsyncListing.from_checkpoint(client.list_memberships, saved)
+        # Not due again before the listing ends, which clears the file.
+        patient = paging.CheckpointFile(
+            str(tmpdir.join("ckpt.json")), every=100, interval=3600
+        )
+        assert [r.name async for r in patient.track_async(resumed)] == ["e", "f"]
+
+    assert checkpoint_file.load() is None
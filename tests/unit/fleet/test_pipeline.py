@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import asyncio
+
+import mock
+import pytest
+
+from google.auth import credentials as ga_credentials
+from google.cloud.gkehub_v1.fleet import pipeline
+from google.cloud.gkehub_v1.services.gke_hub import GkeHubAsyncClient
+from google.cloud.gkehub_v1.types import membership
+from google.cloud.gkehub_v1.types import service
+
+
+@pytest.mark.asyncio
+async def test_pipeline_over_async_pager():
+    client = GkeHubAsyncClient(
+        credentials=ga_credentials.AnonymousCredentials,
+    )
+
+    with mock.patch.object(
+        type(client.transport.list_memberships), "__call__", new_callable=mock.AsyncMock
+    ) as call:
+        call.side_effect = (
+            service.ListMembershipsResponse(
+                resources=[membership.Membership(name=str(i)) for i in range(5)],
+                next_page_token="abc",
+            ),
+            service.ListMembershipsResponse(
+                resources=[membership.Membership(name=str(i)) for i in range(5, 10)],
+            ),
+        )
+
+        async def double(resource):
+            await asyncio.sleep(0)
+            return int(resource.name) * 2
+
+        def keep_even_tens(value):
+            return value if value % 4 == 0 else pipeline.DROP
+
+        p = (
+            pipeline.Pipeline(client.list_memberships(parent="parent_value"))
+            .stage("double", double, concurrency=3, queue_size=2)
+            .stage("filter", keep_even_tens, concurrency=2)
+        )
+        results = await p.collect()
+
+    assert sorted(results) == [0, 4, 8, 12, 16]
+    metrics = p.metrics
+    assert metrics["double"].processed == 10
+    assert metrics["filter"].dropped == 5
+    assert metrics["double"].max_queue_depth <= 2
+    snapshot = metrics["filter"].snapshot()
+    assert snapshot["in_flight"] == 0
+    assert snapshot["queue_depth"] == 0
+    assert snapshot["throughput"] > 0
+
+
+@pytest.mark.asyncio
+async def test_pipeline_backpressure_bounds_in_flight():
+    active = []
+    peak = []
+
+    async def slow(item):
+        active.append(item)
+        peak.append(len(active))
+        await asyncio.sleep(0.001)
+        active.remove(item)
+        return item
+
+    p = pipeline.Pipeline(range(20)).stage("slow", slow, concurrency=4)
+    assert await p.run() == 20
+    assert max(peak) <= 4
+
+
+@pytest.mark.asyncio
+async def test_pipeline_error_cancels_stages():
+    cancelled = []
+
+    async def fail_on_three(item):
+        if item == 3:
+            raise RuntimeError("boom")
+        return item
+
+    async def hang(item):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(item)
+            raise
+
+    p = (
+        pipeline.Pipeline(range(10))
+        .stage("check", fail_on_three, concurrency=1)
+        .stage("hang", hang, concurrency=2)
+    )
+    with pytest.raises(RuntimeError, match="boom"):
+        await p.run()
+    assert cancelled
+
+
+@pytest.mark.asyncio
+async def test_pipeline_abandoned_iteration_cancels():
+    async def source():
+        # Endless, so only cancellation can stop the pipeline.
+        i = 0
+        while True:
+            yield i
+            i += 1
+
+    p = pipeline.Pipeline(source()).stage("id", lambda x: x, concurrency=2)
+    results = p.results()
+    assert await results.__anext__() is not None
+    await results.aclose()
+    assert p.metrics["id"].processed < 1000
+
+
+@pytest.mark.asyncio
+async def test_pipeline_without_stages_and_reuse():
+    p = pipeline.Pipeline([1, 2, 3])
+    assert await p.collect() == [1, 2, 3]
+    with pytest.raises(RuntimeError):
+        await p.collect()
+
+
+def test_pipeline_stage_validation():
+    p = pipeline.Pipeline([])
+    with pytest.raises(ValueError):
+        p.stage("a", lambda x: x, concurrency=0)
+    p.stage("a", lambda x: x)
+    with pytest.raises(ValueError):
+        p.stage("a", lambda x: x)
+    assert p.metrics["a"].throughput == 0.0
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import threading
+import time
+
+import pytest
+
+from google.cloud.gkehub_v1.fleet import ratelimit
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.now += seconds
+
+
+def _bucket(rate, capacity=None):
+    clock = FakeClock()
+    return ratelimit.TokenBucket(rate, capacity, clock=clock, sleep=clock.sleep), clock
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        ratelimit.TokenBucket(0)
+    with pytest.raises(ValueError):
+        ratelimit.TokenBucket(1, capacity=0.5)
+    with pytest.raises(ValueError):
+        ratelimit.TokenBucket(1, capacity=2).acquire(3)
+
+
+def test_burst_then_paced():
+    bucket, clock = _bucket(rate=10, capacity=5)
+    for _ in range(5):
+        assert bucket.acquire() == 0
+    assert clock.now == 0
+    assert bucket.acquire() == pytest.approx(0.1)
+    assert bucket.acquire() == pytest.approx(0.1)
+    assert clock.now == pytest.approx(0.2)
+    assert bucket.waited == pytest.approx(0.2)
+
+
+def test_refills_up_to_capacity():
+    bucket, clock = _bucket(rate=2, capacity=2)
+    bucket.acquire(2)
+    clock.now += 100
+    assert bucket.try_acquire(2)
+    assert not bucket.try_acquire()
+    clock.now += 0.5
+    assert bucket.try_acquire()
+
+
+def test_default_capacity():
+    assert ratelimit.TokenBucket(0.5).capacity == 1
+    assert ratelimit.TokenBucket(20).capacity == 20
+
+
+def test_rate_holds_across_threads():
+    bucket = ratelimit.TokenBucket(rate=1000, capacity=1)
+    threads = [
+        threading.Thread(target=lambda: [bucket.acquire() for _ in range(25)])
+        for _ in range(4)
+    ]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 100 tokens at 1000/s with one available up front.
+    assert time.monotonic() - start >= 0.099
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import mock
+import pytest
+
+from google.cloud.gkehub_v1 import configmanagement_v1
+from google.cloud.gkehub_v1.fleet import reconcile
+from google.cloud.gkehub_v1.fleet.joins import ProjectAliasCache
+from google.cloud.gkehub_v1.types import feature as gcg_feature
+
+from . import _helpers
+from ._helpers import member
+
+FEATURE = "projects/p/locations/global/features/configmanagement"
+
+
+def _spec(version, repo="https://git/repo"):
+    return configmanagement_v1.MembershipSpec(
+        version=version, config_sync={"git": {"sync_repo": repo}}
+    )
+
+
+def _feature(count, version="1.9.0"):
+    return gcg_feature.Feature(
+        name=FEATURE,
+        membership_specs={
+            member(i): {"configmanagement": _spec(version)} for i in range(count)
+        },
+    )
+
+
+class FakeClient(_helpers.FakeClient):
+    def __init__(self, feature, fail_on=None):
+        super().__init__()
+        self.feature = feature
+        self.fail_on = fail_on
+        self.get_feature = mock.Mock(return_value=feature)
+
+    def update_feature(self, name, resource, update_mask, **kwargs):
+        self.record((resource, list(update_mask.paths)))
+        if self.fail_on is not None and self.fail_on in resource.membership_specs:
+            return self.operation(error=RuntimeError("failed"))
+        return self.operation(resource)
+
+
+def test_diff_membership_specs():
+    feature = _feature(3)
+    desired = {
+        member(0): _spec("1.9.0"),
+        member(1): {"version": "1.10.0", "config_sync": {"git": {"sync_repo": "x"}}},
+        member(5): _spec("1.9.0"),
+    }
+    changes = reconcile.diff_membership_specs(feature, desired)
+    assert [c.membership for c in changes] == [member(1), member(5)]
+    assert changes[0].actual == _spec("1.9.0")
+    assert changes[0].desired.version == "1.10.0"
+    assert changes[1].actual is None
+    pruned = reconcile.diff_membership_specs(feature, desired, prune=True)
+    assert [c.membership for c in pruned] == [member(1), member(2), member(5)]
+    assert pruned[1].desired is None
+
+
+def test_split_waves():
+    items = list(range(40))
+    waves = reconcile.split_waves(items, (5, 50, 100))
+    assert [len(w) for w in waves] == [2, 18, 20]
+    assert sum(waves, []) == items
+    assert reconcile.split_waves([1], (1, 100)) == [[1]]
+    assert reconcile.split_waves([], (100,)) == []
+    with pytest.raises(ValueError):
+        reconcile.split_waves(items, (50, 10))
+
+
+def test_noop_run_makes_one_read():
+    client = FakeClient(_feature(5))
+    reconciler = reconcile.ConfigManagementReconciler(client, FEATURE, timeout=10)
+    report = reconciler.reconcile({member(i): _spec("1.9.0") for i in range(5)})
+    assert report.ok
+    assert report.calls == 1
+    assert report.unchanged == 5
+    assert client.calls == []
+    client.get_feature.assert_called_once_with(name=FEATURE, timeout=10)
+
+
+def test_changes_are_batched_with_minimal_masks():
+    client = FakeClient(_feature(10))
+    reconciler = reconcile.ConfigManagementReconciler(client, FEATURE, batch_size=4)
+    desired = {member(i): _spec("1.10.0") for i in range(10)}
+    desired[member(0)] = _spec("1.9.0")
+    report = reconciler.reconcile(desired)
+    assert report.ok
+    assert report.unchanged == 1
+    assert sorted(report.applied) == [member(i) for i in range(1, 10)]
+    assert report.calls == 1 + 3
+    sizes = sorted(len(paths) for _, paths in client.calls)
+    assert sizes == [1, 4, 4]
+    for resource, paths in client.calls:
+        assert paths == [
+            "membership_specs.`{}`".format(key)
+            for key in sorted(resource.membership_specs)
+        ]
+        for spec in resource.membership_specs.values():
+            assert spec.configmanagement.version == "1.10.0"
+
+
+def test_removals_are_in_the_mask_only():
+    client = FakeClient(_feature(2))
+    reconciler = reconcile.ConfigManagementReconciler(client, FEATURE)
+    report = reconciler.reconcile({member(0): None})
+    assert report.applied == [member(0)]
+    resource, paths = client.calls[0]
+    assert not resource.membership_specs
+    assert paths == ["membership_specs.`{}`".format(member(0))]
+
+
+def test_canary_wave_runs_first():
+    client = FakeClient(_feature(20))
+    seen = []
+
+    def between_waves(index, wave):
+        seen.append((index, [c.membership for c in wave], len(client.calls)))
+        return True
+
+    reconciler = reconcile.ConfigManagementReconciler(
+        client, FEATURE, waves=(10, 100), between_waves=between_waves
+    )
+    report = reconciler.reconcile({member(i): _spec("2.0") for i in range(20)})
+    assert report.ok
+    assert report.waves == [
+        [member(0), member(1)],
+        [member(i) for i in range(2, 20)],
+    ]
+    assert seen == [(0, [member(0), member(1)], 1)]
+    assert len(client.calls) == 2
+
+
+def test_halted_rollout_leaves_pending():
+    client = FakeClient(_feature(20))
+    reconciler = reconcile.ConfigManagementReconciler(
+        client, FEATURE, waves=(10, 100), between_waves=lambda i, w: False
+    )
+    report = reconciler.reconcile({member(i): _spec("2.0") for i in range(20)})
+    assert not report.ok
+    assert report.applied == [member(0), member(1)]
+    assert report.pending == [member(i) for i in range(2, 20)]
+
+
+def test_failed_wave_stops_rollout():
+    client = FakeClient(_feature(20), fail_on=member(1))
+    seen = []
+    reconciler = reconcile.ConfigManagementReconciler(
+        client,
+        FEATURE,
+        batch_size=1,
+        waves=(10, 100),
+        between_waves=lambda i, w: seen.append(i),
+    )
+    report = reconciler.reconcile({member(i): _spec("2.0") for i in range(20)})
+    assert seen == []
+    assert list(report.failed) == [member(1)]
+    assert report.applied == [member(0)]
+    assert len(report.pending) == 18
+
+
+def test_plan_does_not_write():
+    client = FakeClient(_feature(3))
+    reconciler = reconcile.ConfigManagementReconciler(client, FEATURE)
+    report = reconciler.plan({member(0): _spec("2.0")})
+    assert report.pending == [member(0)]
+    assert client.calls == []
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        reconcile.ConfigManagementReconciler(mock.Mock(), FEATURE, batch_size=0)
+    with pytest.raises(ValueError):
+        reconcile.ConfigManagementReconciler(mock.Mock(), FEATURE, waves=())
+
+
+def test_diff_matches_project_ids_with_numbers():
+    feature = gcg_feature.Feature(
+        name=FEATURE,
+        membership_specs={
+            member(i, "123"): {"configmanagement": _spec("1.9.0")} for i in range(3)
+        },
+    )
+    desired = {member(0): _spec("1.9.0"), member(1): _spec("2.0")}
+    desired[member(2, "123")] = _spec("1.9.0")
+    cache = ProjectAliasCache()
+
+    changes = reconcile.diff_membership_specs(feature, desired, True, cache)
+
+    assert [(c.membership, c.desired.version) for c in changes] == [
+        (member(1, "123"), "2.0")
+    ]
+    assert cache.project_number("p") == "123"
+
+
+def test_diff_rejects_duplicate_project_forms():
+    feature = gcg_feature.Feature(
+        name=FEATURE, membership_specs={member(0, "123"): {"configmanagement": {}}}
+    )
+    cache = ProjectAliasCache()
+    cache.learn("123", "p")
+    with pytest.raises(ValueError):
+        reconcile.diff_membership_specs(
+            feature, {member(0): None, member(0, "123"): None}, cache=cache
+        )
+
+
+def test_diff_does_not_guess_known_projects():
+    feature = gcg_feature.Feature(
+        name=FEATURE, membership_specs={member(0, "123"): {"configmanagement": {}}}
+    )
+    cache = ProjectAliasCache()
+    cache.learn("456", "p")
+    changes = reconcile.diff_membership_specs(
+        feature, {member(0): _spec("1.9.0")}, prune=True, cache=cache
+    )
+    assert [(c.membership, c.desired is None) for c in changes] == [
+        (member(0, "123"), True),
+        (member(0), False),
+    ]
+
+
+def test_noop_run_with_project_ids_makes_one_read():
+    feature = gcg_feature.Feature(
+        name=FEATURE,
+        membership_specs={
+            member(i, "123"): {"configmanagement": _spec("1.9.0")} for i in range(3)
+        },
+    )
+    client = FakeClient(feature)
+    reconciler = reconcile.ConfigManagementReconciler(client, FEATURE, prune=True)
+    report = reconciler.reconcile({member(i): _spec("1.9.0") for i in range(3)})
+    assert report.ok
+    assert report.calls == 1
+    assert report.unchanged == 3
+    assert client.calls == []
+
+
+def test_diff_leaves_unmatchable_keys_alone():
+    feature = gcg_feature.Feature(
+        name=FEATURE,
+        membership_specs={
+            "bogus": {"configmanagement": _spec("1.9.0")},
+            member(0, "q"): {"configmanagement": _spec("1.9.0")},
+            member(1, "123"): {"configmanagement": _spec("1.9.0")},
+        },
+    )
+    cache = ProjectAliasCache()
+    cache.learn("123", "other")
+    desired = {
+        "bogus": _spec("1.9.0"),
+        "unparsable": _spec("1.9.0"),
+        member(2, "456"): _spec("1.9.0"),
+        member(0): _spec("1.9.0"),
+        member(1): _spec("1.9.0"),
+    }
+    changes = reconcile.diff_membership_specs(feature, desired, cache=cache)
+    assert sorted(c.membership for c in changes) == sorted(
+        ["unparsable", member(2, "456"), member(0), member(1)]
+    )
+    assert cache.project_number("p") is None
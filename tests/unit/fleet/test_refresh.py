@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import asyncio
+import datetime
+import threading
+import time
+
+import mock
+import pytest
+
+from google.cloud.gkehub_v1.fleet import refresh
+
+
+class FakeCredentials:
+    def __init__(self, lifetime=3600, token=None, gate=None, error=None):
+        self.token = token
+        self.expiry = None
+        self.lifetime = lifetime
+        self.gate = gate
+        self.error = error
+        self.calls = 0
+
+    def refresh(self, request):
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        self.token = "token-{}".format(self.calls)
+        self.expiry = datetime.datetime.utcnow() + datetime.timedelta(
+            seconds=self.lifetime
+        )
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+async def _async_wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        await asyncio.sleep(0.01)
+
+
+def test_delay():
+    credentials = FakeCredentials()
+    schedule = refresh._Schedule(credentials, 300, 60, 1, 60, request=mock.Mock())
+    assert schedule.delay() == 0.0
+    credentials.token = "t"
+    assert schedule.delay() == 60
+    now = datetime.datetime.utcnow()
+    credentials.expiry = now + datetime.timedelta(seconds=330)
+    assert 25 < schedule.delay() <= 30
+    credentials.expiry = now + datetime.timedelta(seconds=100)
+    assert schedule.delay() == 0.0
+    credentials.expiry = datetime.datetime.now(datetime.timezone.utc)
+    assert schedule.delay() == 0.0
+
+
+def test_backoff():
+    schedule = refresh._Schedule(FakeCredentials(), 300, 60, 1, 5, request=mock.Mock())
+    assert [schedule.failed() for _ in range(5)] == [1, 2, 4, 5, 5]
+    assert schedule.succeeded() == 1
+    assert schedule.failed() == 1
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        refresh.CredentialsRefresher(FakeCredentials(), interval=0)
+
+
+def test_refresher_refreshes_ahead_of_expiry():
+    credentials = FakeCredentials(lifetime=0.3)
+    refresher = refresh.CredentialsRefresher(
+        credentials, margin=0.2, retry_delay=0.05, request=mock.Mock()
+    )
+    with refresher:
+        _wait_for(lambda: refresher.refreshes >= 3)
+    assert credentials.token is not None
+    assert refresher.failures == 0
+    calls = credentials.calls
+    time.sleep(0.2)
+    assert credentials.calls == calls
+
+
+def test_refresher_retries_failures():
+    error = ValueError("boom")
+    credentials = FakeCredentials(error=error)
+    refresher = refresh.CredentialsRefresher(
+        credentials, retry_delay=0.01, max_retry_delay=0.02, request=mock.Mock()
+    )
+    with refresher:
+        _wait_for(lambda: refresher.failures >= 3)
+        assert refresher.last_error is error
+        credentials.error = None
+        _wait_for(lambda: refresher.refreshes == 1)
+    assert refresher.last_error is None
+
+
+def test_refresh_is_single_flight():
+    gate = threading.Event()
+    credentials = FakeCredentials(gate=gate)
+    refresher = refresh.CredentialsRefresher(credentials, request=mock.Mock())
+    threads = [threading.Thread(target=refresher.refresh) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    _wait_for(lambda: credentials.calls == 1)
+    time.sleep(0.05)
+    gate.set()
+    for thread in threads:
+        thread.join()
+    assert credentials.calls == 1
+    assert refresher.refreshes == 1
+
+
+def test_attach_uses_transport_credentials():
+    credentials = FakeCredentials(token="t")
+    client = mock.Mock()
+    client.transport._credentials = credentials
+    refresher = refresh.CredentialsRefresher.attach(client, request=mock.Mock())
+    try:
+        assert refresher.credentials is credentials
+        with pytest.raises(RuntimeError):
+            refresher.start()
+    finally:
+        refresher.stop()
+
+
+@pytest.mark.asyncio
+async def test_async_refresh_is_single_flight():
+    gate = threading.Event()
+    credentials = FakeCredentials(gate=gate)
+    refresher = refresh.AsyncCredentialsRefresher(credentials, request=mock.Mock())
+    calls = asyncio.gather(*(refresher.refresh() for _ in range(8)))
+    await asyncio.sleep(0.05)
+    gate.set()
+    await calls
+    assert credentials.calls == 1
+    await refresher.refresh()
+    assert credentials.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_async_refresher_runs_in_background():
+    credentials = FakeCredentials(lifetime=0.3)
+    transport = mock.Mock(spec=["_credentials"])
+    transport._credentials = credentials
+    refresher = refresh.AsyncCredentialsRefresher.attach(
+        transport, margin=0.2, retry_delay=0.05, request=mock.Mock()
+    )
+    await _async_wait_for(lambda: refresher.refreshes >= 3)
+    await refresher.stop()
+    assert refresher.refreshes >= 3
+    assert refresher.credentials.token is not None
+
+
+def _expiring(seconds):
+    credentials = FakeCredentials(token="t")
+    credentials.expiry = datetime.datetime.utcnow() + datetime.timedelta(
+        seconds=seconds
+    )
+    return credentials
+
+
+def test_refresher_waits_again_after_an_early_refresh():
+    credentials = _expiring(0.3)
+    refresher = refresh.CredentialsRefresher(
+        credentials, margin=0.2, request=mock.Mock()
+    )
+    with refresher:
+        refresher.refresh()
+        with refresher:
+            time.sleep(0.2)
+        refresher.stop()
+    assert credentials.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_async_refresher_retries_with_backoff():
+    error = ValueError("boom")
+    credentials = FakeCredentials(error=error)
+    refresher = refresh.AsyncCredentialsRefresher(
+        credentials, retry_delay=0.01, max_retry_delay=0.02, request=mock.Mock()
+    )
+    async with refresher:
+        await _async_wait_for(lambda: refresher.failures >= 3)
+        assert refresher.last_error is error
+        credentials.error = None
+        await _async_wait_for(lambda: refresher.refreshes)
+    assert refresher.refreshes == 1
+    assert refresher.last_error is None
+    assert refresher.credentials is credentials
+
+
+@pytest.mark.asyncio
+async def test_async_refresher_shutdown():
+    credentials = _expiring(0.3)
+    refresher = refresh.AsyncCredentialsRefresher(
+        credentials, margin=0.2, request=mock.Mock()
+    )
+    await refresher.stop()
+    refresher.start()
+    with pytest.raises(RuntimeError):
+        refresher.start()
+    # Let the task schedule its first wake-up before refreshing early.
+    await asyncio.sleep(0)
+    await refresher.refresh()
+    async with refresher:
+        await asyncio.sleep(0.2)
+    await refresher.stop()
+    calls = credentials.calls
+    credentials.expiry = None
+    await asyncio.sleep(0.05)
+    assert calls == credentials.calls == 1
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import pytest
+
+from google.cloud.gkehub_v1.fleet import interning
+from google.cloud.gkehub_v1.fleet import selectors
+from google.cloud.gkehub_v1.types import membership
+
+
+def _index():
+    index = selectors.LabelIndex(intern_table=interning.InternTable())
+    index.add_memberships(
+        [
+            membership.Membership(name="a", labels={"env": "prod", "tier": "gold"}),
+            membership.Membership(
+                name="b", labels={"env": "staging", "canary": "true"}
+            ),
+            membership.Membership(name="c", labels={"env": "dev", "tier": "gold"}),
+            membership.Membership(name="d", labels={}),
+        ]
+    )
+    return index
+
+
+def test_parse_selector():
+    assert selectors.parse_selector("env in (prod, staging),!canary,tier=gold") == [
+        selectors.Requirement("env", selectors.IN, frozenset(("prod", "staging"))),
+        selectors.Requirement("canary", selectors.DOES_NOT_EXIST),
+        selectors.Requirement("tier", selectors.EQUALS, frozenset(("gold",))),
+    ]
+    assert selectors.parse_selector("") == []
+    assert selectors.parse_selector("a==b")[0].operator == selectors.EQUALS
+    assert selectors.parse_selector("a != b")[0].operator == selectors.NOT_EQUALS
+    assert selectors.parse_selector("a notin (x)")[0].operator == selectors.NOT_IN
+    assert selectors.parse_selector("a")[0].operator == selectors.EXISTS
+
+
+@pytest.mark.parametrize("selector", ["a in ()", "=x", "a b", "a in (x"])
+def test_parse_selector_invalid(selector):
+    with pytest.raises(ValueError):
+        selectors.parse_selector(selector)
+
+
+@pytest.mark.parametrize(
+    "selector,expected",
+    [
+        ("", ["a", "b", "c", "d"]),
+        ("env in (prod,staging)", ["a", "b"]),
+        ("env in (prod,staging),!canary", ["a"]),
+        ("tier=gold", ["a", "c"]),
+        ("tier=gold,env!=dev", ["a"]),
+        ("env notin (prod)", ["b", "c", "d"]),
+        ("!tier", ["b", "d"]),
+        ("tier", ["a", "c"]),
+        ("env=missing", []),
+        ("tier=gold,env=staging", []),
+        ("env=staging,tier=gold,env in (prod,dev)", []),
+    ],
+)
+def test_select(selector, expected):
+    index = _index()
+    assert sorted(index.select(selector)) == expected
+    requirements = selectors.parse_selector(selector)
+    brute = [
+        name
+        for name in "abcd"
+        if all(r.matches(index.labels(name)) for r in requirements)
+    ]
+    assert brute == expected
+
+
+def test_incremental_updates():
+    index = _index()
+    index.add("a", {"env": "staging"})
+    assert sorted(index.select("env=staging")) == ["a", "b"]
+    assert index.select("tier=gold") == ["c"]
+    assert index.remove("b")
+    assert not index.remove("b")
+    assert "b" not in index
+    assert len(index) == 3
+    index.add("e", {"canary": "true"})
+    assert index.select("canary") == ["e"]
+    assert sorted(index.select("!canary")) == ["a", "c", "d"]
+
+
+def test_index_without_intern_table():
+    index = selectors.LabelIndex()
+    labels = {"env": "prod", "tier": "gold"}
+    index.add("a", labels)
+    labels["env"] = "dev"
+    assert index.select("env=prod") == ["a"]
+    index.add("a", {"env": "prod", "tier": "silver"})
+    assert index.select("env=prod") == ["a"]
+    assert index.select("tier=gold") == []
+    assert index.select(selectors.parse_selector("tier=silver")) == ["a"]
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from google.cloud.gkehub_v1 import configmanagement_v1
+from google.cloud.gkehub_v1.fleet import syncerrors
+from google.cloud.gkehub_v1.fleet.interning import InternTable
+from google.cloud.gkehub_v1.types import feature as gcg_feature
+
+from ._helpers import member
+
+
+def _error(code, *resources):
+    return {
+        "code": code,
+        "error_message": "message",
+        "error_resources": [
+            {
+                "source_path": path,
+                "resource_gvk": {"group": group, "version": "v1", "kind": kind},
+            }
+            for path, group, kind in resources
+        ],
+    }
+
+
+def _state(*errors):
+    return gcg_feature.MembershipFeatureState(
+        configmanagement={"config_sync_state": {"sync_state": {"errors": list(errors)}}}
+    )
+
+
+ROLEBINDING = (
+    "namespaces/foo/rolebinding.yaml",
+    "rbac.authorization.k8s.io",
+    "RoleBinding",
+)
+CONFIGMAP = ("namespaces/foo/cm.yaml", "", "ConfigMap")
+OTHER = ("namespaces/bar/cm.yaml", "", "ConfigMap")
+
+
+def test_lookups():
+    index = syncerrors.SyncErrorIndex()
+    index.update(member(1), _state(_error("KNV1021", ROLEBINDING, CONFIGMAP)))
+    index.update(member(2), _state(_error("KNV1021", ROLEBINDING), _error("KNV2009")))
+    index.update(member(3), _state(_error("KNV1050", OTHER)))
+    index.update(member(4), _state())
+    assert len(index) == 3
+    assert member(4) not in index
+    assert index.by_source_path(ROLEBINDING[0]) == {member(1), member(2)}
+    assert index.by_source_path_prefix("namespaces/foo/") == {member(1), member(2)}
+    assert index.by_source_path_prefix("namespaces/") == {
+        member(1),
+        member(2),
+        member(3),
+    }
+    assert index.by_source_path_prefix("namespaces/baz") == set()
+    assert index.source_paths("namespaces/foo") == [
+        "namespaces/foo/cm.yaml",
+        "namespaces/foo/rolebinding.yaml",
+    ]
+    assert index.by_gvk("", "v1", "ConfigMap") == {member(1), member(3)}
+    assert index.by_code("KNV2009") == {member(2)}
+    assert index.counts_by_code() == {"KNV1021": 2, "KNV2009": 1, "KNV1050": 1}
+    assert syncerrors.ErrorKey(
+        "", syncerrors.GroupVersionKind("", "", ""), "KNV2009"
+    ) in index.errors(member(2))
+
+
+def test_incremental_update():
+    index = syncerrors.SyncErrorIndex()
+    index.update(member(1), _state(_error("KNV1021", ROLEBINDING, CONFIGMAP)))
+    index.update(member(2), _state(_error("KNV1021", CONFIGMAP)))
+    index.update(member(1), _state(_error("KNV1050", OTHER)))
+    assert index.by_source_path(ROLEBINDING[0]) == set()
+    assert index.by_source_path(CONFIGMAP[0]) == {member(2)}
+    assert index.source_paths() == ["namespaces/bar/cm.yaml", "namespaces/foo/cm.yaml"]
+    assert index.counts_by_code() == {"KNV1021": 1, "KNV1050": 1}
+    index.update(member(2), None)
+    assert member(2) not in index
+    assert index.source_paths() == ["namespaces/bar/cm.yaml"]
+    assert index.remove(member(1))
+    assert not index.remove(member(1))
+    assert index.source_paths() == []
+    assert index.counts_by_code() == {}
+    index.update(member(5), _state(_error("KNV1021", CONFIGMAP)))
+    assert index.by_code("KNV1021") == {member(5)}
+
+
+def test_update_from_feature():
+    feature = gcg_feature.Feature(
+        membership_states={
+            member(1): _state(_error("KNV1021", ROLEBINDING)),
+            member(2): gcg_feature.MembershipFeatureState(),
+        }
+    )
+    index = syncerrors.SyncErrorIndex()
+    index.update(member(9), _state(_error("KNV1021", OTHER)))
+    index.update_from_feature(feature)
+    assert index.by_code("KNV1021") == {member(1)}
+    index.update(member(9), _state(_error("KNV1021", OTHER)))
+    index.update_from_feature(feature, remove_missing=False)
+    assert member(9) in index
+
+
+def test_accepts_configmanagement_state_and_interns():
+    table = InternTable()
+    index = syncerrors.SyncErrorIndex(intern_table=table)
+    state = configmanagement_v1.MembershipState(
+        config_sync_state={"sync_state": {"errors": [_error("KNV1021", CONFIGMAP)]}}
+    )
+    index.update(member(1), state)
+    index.update(member(2), state)
+    first, second = (next(iter(index.errors(member(i)))) for i in (1, 2))
+    assert first.source_path is second.source_path
+    assert CONFIGMAP[0] in table
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import pytest
+
+from google.cloud.gkehub_v1.fleet import teardown
+from google.cloud.gkehub_v1.fleet.joins import ProjectAliasCache
+from google.cloud.gkehub_v1.types import feature as gcg_feature
+
+from . import _helpers
+from ._helpers import member
+
+PARENT = "projects/p/locations/global"
+CM = PARENT + "/features/configmanagement"
+MCI = PARENT + "/features/multiclusteringress"
+
+
+def _features(config_membership=member(0, "123")):
+    return [
+        gcg_feature.Feature(
+            name=CM,
+            membership_specs={
+                member(i, "123"): gcg_feature.MembershipFeatureSpec() for i in range(5)
+            },
+        ),
+        gcg_feature.Feature(
+            name=MCI,
+            spec={"multiclusteringress": {"config_membership": config_membership}},
+        ),
+    ]
+
+
+class FakeClient(_helpers.FakeClient):
+    def _operation(self, target):
+        self.record(target)
+        if target in self.fail:
+            return self.operation(error=RuntimeError("failed"))
+        return self.operation()
+
+    def update_feature(self, name, resource, update_mask, **kwargs):
+        assert not resource.membership_specs
+        return self._operation(("update", name, tuple(update_mask.paths)))
+
+    def delete_feature(self, request, **kwargs):
+        return self._operation(("delete_feature", request.name, request.force))
+
+    def delete_membership(self, name, **kwargs):
+        return self._operation(("delete_membership", name))
+
+
+def test_plan_orders_spec_removal_before_deletion():
+    plan = teardown.plan_teardown(
+        [member(1), member(2), member(3)], _features(), batch_size=2
+    )
+    kinds = [[plan.steps[i].kind for i in level] for level in plan.levels]
+    assert kinds == [
+        [teardown.REMOVE_SPECS] * 2,
+        [teardown.DELETE_MEMBERSHIP] * 3,
+    ]
+    assert [plan.steps[i].keys for i in plan.levels[0]] == [
+        (member(1, "123"), member(2, "123")),
+        (member(3, "123"),),
+    ]
+    assert plan.blocked == {}
+    assert len(plan) == 5
+
+
+def test_plan_blocks_mci_config_membership():
+    plan = teardown.plan_teardown([member(0), member(1)], _features())
+    assert list(plan.blocked) == [member(0)]
+    assert [s.target for s in plan.steps if s.kind == teardown.DELETE_MEMBERSHIP] == [
+        member(1)
+    ]
+    assert all(member(0, "123") not in s.keys for s in plan.steps)
+
+
+def test_plan_deletes_features():
+    plan = teardown.plan_teardown(
+        [member(0), member(1)],
+        _features(),
+        delete_features=[MCI, CM],
+        allow_force=[MCI],
+    )
+    assert plan.blocked == {}
+    first = [plan.steps[i] for i in plan.levels[0]]
+    assert first == [
+        teardown.TeardownStep(teardown.DELETE_FEATURE, CM, force=False),
+        teardown.TeardownStep(teardown.DELETE_FEATURE, MCI, force=True),
+    ]
+    assert [plan.steps[i].kind for i in plan.levels[1]] == [
+        teardown.DELETE_MEMBERSHIP
+    ] * 2
+
+
+def test_force_requires_deletion():
+    with pytest.raises(ValueError):
+        teardown.plan_teardown([member(0)], _features(), allow_force=[MCI])
+
+
+def test_plan_matches_projects_with_cache():
+    features = [
+        gcg_feature.Feature(
+            name=CM,
+            membership_specs={
+                member(0, "123"): gcg_feature.MembershipFeatureSpec(),
+                member(0, "456"): gcg_feature.MembershipFeatureSpec(),
+            },
+        )
+    ]
+    members = [member(0, "p"), member(0, "q")]
+    plan = teardown.plan_teardown(members, features)
+    # Ambiguous without knowing which number is which project.
+    assert [s.kind for s in plan.steps] == [teardown.DELETE_MEMBERSHIP] * 2
+    cache = ProjectAliasCache()
+    cache.learn("123", "p")
+    cache.learn("456", "q")
+    plan = teardown.plan_teardown(members, features, cache=cache)
+    assert plan.steps[0].keys == (member(0, "123"), member(0, "456"))
+    assert plan.dependencies[1] == {0}
+
+
+def test_plan_ignores_other_projects_with_known_aliases():
+    foo = "projects/{}/locations/global/memberships/foo"
+    features = [
+        gcg_feature.Feature(
+            name=CM,
+            membership_specs={foo.format("222"): gcg_feature.MembershipFeatureSpec()},
+        )
+    ]
+    cache = ProjectAliasCache()
+    cache.learn("111", "proj-a")
+    plan = teardown.plan_teardown([foo.format("proj-a")], features, cache=cache)
+    # projects/222 is not proj-a, so its entry must not be removed.
+    assert plan.steps == [
+        teardown.TeardownStep(teardown.DELETE_MEMBERSHIP, foo.format("proj-a"))
+    ]
+    assert cache.project_id("222") is None
+
+
+def test_plan_learns_aliases_from_unambiguous_matches():
+    cache = ProjectAliasCache()
+    plan = teardown.plan_teardown([member(1)], _features(), cache=cache)
+    assert plan.steps[0].keys == (member(1, "123"),)
+    assert cache.project_number("p") == "123"
+
+
+def test_plan_does_not_match_two_project_ids():
+    foo = "projects/{}/locations/global/memberships/foo"
+    features = [
+        gcg_feature.Feature(
+            name=CM,
+            membership_specs={
+                foo.format("proj-b"): gcg_feature.MembershipFeatureSpec()
+            },
+        )
+    ]
+    cache = ProjectAliasCache()
+    plan = teardown.plan_teardown([foo.format("proj-a")], features, cache=cache)
+    assert plan.steps == [
+        teardown.TeardownStep(teardown.DELETE_MEMBERSHIP, foo.format("proj-a"))
+    ]
+    assert len(cache) == 0
+
+
+def test_plan_validation():
+    with pytest.raises(ValueError):
+        teardown.plan_teardown(["not-a-membership"], [])
+    with pytest.raises(ValueError):
+        teardown.plan_teardown([member(0)], [], batch_size=0)
+    with pytest.raises(ValueError):
+        teardown.TeardownPlan(
+            [teardown.TeardownStep(teardown.DELETE_MEMBERSHIP, "a")] * 2,
+            {0: {1}, 1: {0}},
+        )
+
+
+def test_run_reports_progress():
+    plan = teardown.plan_teardown(
+        [member(i) for i in range(1, 5)], _features(), batch_size=3
+    )
+    client = FakeClient()
+    progress = []
+    report = teardown.TeardownRunner(
+        client, max_concurrency=3, on_progress=progress.append
+    ).run(plan)
+    assert report.ok
+    assert sorted(report.deleted) == [member(i) for i in range(1, 5)]
+    assert [p.completed for p in progress] == [1, 2, 3, 4, 5, 6]
+    assert {p.total for p in progress} == {6}
+    assert set(client.calls[:2]) == {
+        (
+            "update",
+            CM,
+            tuple("membership_specs.`{}`".format(member(i, "123")) for i in (1, 2, 3)),
+        ),
+        ("update", CM, ("membership_specs.`{}`".format(member(4, "123")),)),
+    }
+
+
+def test_run_skips_dependents_of_failures():
+    plan = teardown.plan_teardown([member(1), member(4)], _features(), batch_size=1)
+    client = FakeClient(
+        fail=[("update", CM, ("membership_specs.`{}`".format(member(1, "123")),))]
+    )
+    report = teardown.TeardownRunner(client).run(plan)
+    assert not report.ok
+    assert report.deleted == [member(4)]
+    assert [s.target for s in report.skipped] == [member(1)]
+    assert len(report.failed) == 1
+    assert ("delete_membership", member(1)) not in client.calls
+
+
+def test_run_delete_feature_force():
+    plan = teardown.plan_teardown(
+        [member(0)], _features(), delete_features=[MCI], allow_force=[MCI]
+    )
+    client = FakeClient()
+    teardown.TeardownRunner(client, max_concurrency=1).run(plan)
+    assert client.calls[0] == (
+        "update",
+        CM,
+        ("membership_specs.`{}`".format(member(0, "123")),),
+    )
+    assert client.calls[1] == ("delete_feature", MCI, True)
+    assert client.calls[2] == ("delete_membership", member(0))
+
+
+def test_runner_validation():
+    with pytest.raises(ValueError):
+        teardown.TeardownRunner(FakeClient(), max_concurrency=0)
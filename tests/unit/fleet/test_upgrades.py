@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import threading
+
+import mock
+import pytest
+
+from google.cloud.gkehub_v1.fleet.manifests import ManifestCache
+from google.cloud.gkehub_v1.fleet.upgrades import AgentVersionIndex
+from google.cloud.gkehub_v1.fleet.upgrades import ConnectUpgradePlanner
+from google.cloud.gkehub_v1.types import membership as gcg_membership
+from google.cloud.gkehub_v1.types import service
+from google.cloud.gkehub_v1beta1.types import membership as v1beta1_membership
+
+from . import _helpers
+
+
+def _membership(name, version, module=gcg_membership):
+    return module.Membership(
+        name="projects/p/locations/global/memberships/" + name,
+        endpoint=module.MembershipEndpoint(
+            kubernetes_resource=module.KubernetesResource(
+                resource_options=module.ResourceOptions(connect_version=version)
+            )
+        ),
+    )
+
+
+class FakeClient(_helpers.FakeClient):
+    def generate_connect_manifest(self, request, **kwargs):
+        self.record(request)
+        if request.name in self.fail:
+            raise RuntimeError("boom")
+        return service.GenerateConnectManifestResponse(
+            manifest=[
+                service.ConnectAgentResource(manifest="kind: Namespace\n"),
+                service.ConnectAgentResource(manifest="name: " + request.name),
+            ]
+        )
+
+
+@pytest.mark.parametrize(
+    "version,stale",
+    [
+        ("1.8.9", True),
+        ("1.9.0-rc1", True),
+        ("1.9", True),
+        ("1.9.0", False),
+        ("1.10.0", False),
+        ("", False),
+    ],
+)
+def test_index_is_stale(version, stale):
+    assert AgentVersionIndex("1.9.0").is_stale(version) is stale
+
+
+def test_index_can_include_unset_versions():
+    assert AgentVersionIndex("1.9.0", include_unset=True).is_stale("")
+
+
+def test_index_groups_by_version():
+    index = AgentVersionIndex("1.9.0")
+    for name, version in [("a", "1.8"), ("b", "1.9.0"), ("c", "1.7"), ("d", "")]:
+        index.add_membership(_membership(name, version))
+    index.add_membership(_membership("e", "1.8", v1beta1_membership))
+
+    assert len(index) == 5
+    assert index.versions() == {"1.8": 2, "1.9.0": 1, "1.7": 1, "": 1}
+    assert [n.rsplit("/", 1)[1] for n in index.stale()] == ["c", "a", "e"]
+    assert index.members("1.9.0") == [_membership("b", "").name]
+    with pytest.raises(ValueError):
+        AgentVersionIndex("")
+
+
+def test_run_writes_stale_manifests(tmpdir):
+    client = FakeClient()
+    results = []
+    planner = ConnectUpgradePlanner(
+        client,
+        str(tmpdir),
+        "1.9.0",
+        rate=1000,
+        max_concurrency=2,
+        on_result=results.append,
+        timeout=7,
+    )
+    memberships = [_membership(str(i), "1.8.0") for i in range(5)]
+    memberships.append(_membership("current", "1.9.0"))
+
+    report = planner.run(iter(memberships))
+
+    assert report.ok
+    assert report.scanned == 6 and report.current == 1
+    assert report.versions == {"1.8.0": 5, "1.9.0": 1}
+    assert sorted(report.written) == sorted(m.name for m in memberships[:5])
+    assert len(results) == 5
+    path = os.path.join(str(tmpdir), "p", "global", "0.yaml")
+    assert report.written[memberships[0].name] == path
+    with open(path) as fh:
+        assert fh.read() == (
+            "kind: Namespace\n---\nname: projects/p/locations/global/memberships/0\n"
+        )
+    assert not os.path.exists(os.path.join(str(tmpdir), "p", "global", "current.yaml"))
+    request = client.calls[0]
+    assert request.is_upgrade and request.version == "1.9.0"
+    assert planner.index.versions() == report.versions
+
+
+def test_run_reports_failures(tmpdir):
+    memberships = [_membership("a", "1.0"), _membership("b", "1.0")]
+    client = FakeClient(fail=[memberships[0].name])
+    report = ConnectUpgradePlanner(client, str(tmpdir), "2.0", rate=1000).run(
+        memberships
+    )
+
+    assert not report.ok
+    assert list(report.failed) == [memberships[0].name]
+    assert list(report.written) == [memberships[1].name]
+    assert os.listdir(os.path.join(str(tmpdir), "p", "global")) == ["b.yaml"]
+
+
+def test_template_fields_are_kept():
+    template = v1beta1_membership.GenerateConnectManifestRequest(
+        version="2.0",
+        connect_agent=v1beta1_membership.ConnectAgent(namespace="gke-connect"),
+    )
+    planner = ConnectUpgradePlanner(mock.Mock(), "out", "2.0", template=template)
+    request = planner.request_for("projects/p/locations/l/memberships/m")
+
+    assert isinstance(request, v1beta1_membership.GenerateConnectManifestRequest)
+    assert request.name == "projects/p/locations/l/memberships/m"
+    assert request.is_upgrade
+    assert request.connect_agent.namespace == "gke-connect"
+    assert not template.name and not template.is_upgrade
+
+
+def test_cache_hits_skip_calls(tmpdir):
+    cache = ManifestCache(str(tmpdir.join("cache")))
+    client = FakeClient()
+    memberships = [_membership("a", "1.0")]
+    output = str(tmpdir.join("out"))
+    ConnectUpgradePlanner(client, output, "2.0", cache=cache).run(memberships)
+    ConnectUpgradePlanner(client, output, "2.0", cache=cache).run(memberships)
+
+    assert len(client.calls) == 1
+    assert cache.hits == 1
+
+
+def test_secret_requests_bypass_the_cache(tmpdir):
+    cache = ManifestCache(str(tmpdir.join("cache")))
+    client = FakeClient()
+    template = service.GenerateConnectManifestRequest(
+        version="2.0", image_pull_secret_content=b"secret"
+    )
+    output = str(tmpdir.join("out"))
+    for _ in range(2):
+        ConnectUpgradePlanner(
+            client, output, "2.0", template=template, cache=cache
+        ).run([_membership("a", "1.0")])
+
+    assert len(client.calls) == 2
+    assert cache.bypassed == 2
+    assert len(cache) == 0
+
+
+def test_invalid_membership_name_fails(tmpdir):
+    membership = _membership("a", "1.0")
+    membership.name = "bogus"
+    report = ConnectUpgradePlanner(FakeClient(), str(tmpdir), "2.0").run([membership])
+    assert isinstance(report.failed["bogus"], ValueError)
+
+
+def test_invalid_concurrency():
+    with pytest.raises(ValueError):
+        ConnectUpgradePlanner(mock.Mock(), "out", "1.0", max_concurrency=0)
+
+
+class SlowClient(FakeClient):
+    def generate_connect_manifest(self, request, **kwargs):
+        threading.Event().wait(0.01)
+        return super().generate_connect_manifest(request, **kwargs)
+
+
+def test_run_reads_ahead_at_most_max_concurrency(tmpdir):
+    done = []
+
+    def memberships():
+        for i in range(12):
+            # The i-th stale membership is read only once a worker is free.
+            assert len(done) >= i - 2
+            yield _membership(str(i), "1.0")
+
+    planner = ConnectUpgradePlanner(
+        SlowClient(),
+        str(tmpdir),
+        "2.0",
+        rate=1000,
+        max_concurrency=2,
+        on_result=done.append,
+    )
+    report = planner.run(memberships())
+    assert len(report.written) == 12
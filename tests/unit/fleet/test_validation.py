@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from concurrent import futures
+
+import mock
+import pytest
+
+from google.cloud.gkehub_v1 import configmanagement_v1
+from google.cloud.gkehub_v1.fleet import validation
+from google.cloud.gkehub_v1.types import feature as gcg_feature
+
+
+def _spec(**git):
+    values = {
+        "sync_repo": "https://github.com/example/config",
+        "secret_type": "none",
+        "policy_dir": "config",
+    }
+    values.update(git)
+    return configmanagement_v1.MembershipSpec(
+        config_sync={"git": values, "source_format": "unstructured"},
+        version="1.9.0",
+    )
+
+
+def _codes(findings):
+    return [(finding.path, finding.code) for finding in findings]
+
+
+def test_valid_spec():
+    assert validation.validate_spec(_spec()) == []
+    assert validation.validate_spec(configmanagement_v1.MembershipSpec()) == []
+
+
+@pytest.mark.parametrize(
+    "git,path,code",
+    [
+        ({"sync_repo": ""}, "config_sync.git.sync_repo", "EMPTY_SYNC_REPO"),
+        (
+            {"sync_repo": "github.com/x"},
+            "config_sync.git.sync_repo",
+            "INVALID_SYNC_REPO",
+        ),
+        ({"secret_type": ""}, "config_sync.git.secret_type", "MISSING_SECRET_TYPE"),
+        ({"secret_type": "SSH"}, "config_sync.git.secret_type", "INVALID_SECRET_TYPE"),
+        (
+            {"secret_type": "ssh"},
+            "config_sync.git.secret_type",
+            "SECRET_TYPE_URL_MISMATCH",
+        ),
+        (
+            {"secret_type": "gcpserviceaccount"},
+            "config_sync.git.gcp_service_account_email",
+            "MISSING_SERVICE_ACCOUNT",
+        ),
+        (
+            {"sync_wait_secs": -1},
+            "config_sync.git.sync_wait_secs",
+            "SYNC_WAIT_SECS_OUT_OF_RANGE",
+        ),
+        (
+            {"sync_wait_secs": 86400},
+            "config_sync.git.sync_wait_secs",
+            "SYNC_WAIT_SECS_OUT_OF_RANGE",
+        ),
+        ({"policy_dir": "../etc"}, "config_sync.git.policy_dir", "INVALID_POLICY_DIR"),
+        (
+            {"sync_branch": "my branch"},
+            "config_sync.git.sync_branch",
+            "INVALID_REVISION",
+        ),
+        (
+            {"https_proxy": "proxy:3128"},
+            "config_sync.git.https_proxy",
+            "INVALID_HTTPS_PROXY",
+        ),
+    ],
+)
+def test_git_errors(git, path, code):
+    findings = validation.validate_spec(_spec(**git), membership="m")
+    assert _codes(findings) == [(path, code)]
+    assert findings[0].membership == "m"
+    assert findings[0].severity == validation.ERROR
+    assert validation.has_errors(findings)
+
+
+def test_ssh_repository():
+    spec = _spec(sync_repo="git@github.com:example/config.git", secret_type="ssh")
+    assert validation.validate_spec(spec) == []
+    spec = _spec(
+        sync_repo="ssh://git@example.com/config",
+        secret_type="token",
+        https_proxy="http://proxy:3128",
+    )
+    assert _codes(validation.validate_spec(spec)) == [
+        ("config_sync.git.secret_type", "SECRET_TYPE_URL_MISMATCH"),
+        ("config_sync.git.https_proxy", "UNUSED_HTTPS_PROXY"),
+    ]
+
+
+def test_source_format():
+    spec = _spec()
+    spec.config_sync.source_format = "flat"
+    assert _codes(validation.validate_spec(spec)) == [
+        ("config_sync.source_format", "SOURCE_FORMAT_MISMATCH")
+    ]
+    spec = _spec(policy_dir="")
+    spec.config_sync.source_format = "hierarchy"
+    assert validation.validate_spec(spec) == []
+    spec = _spec(policy_dir="config/namespaces/")
+    spec.config_sync.source_format = "hierarchy"
+    findings = validation.validate_spec(spec)
+    assert _codes(findings) == [("config_sync.source_format", "SOURCE_FORMAT_MISMATCH")]
+    assert not validation.has_errors(findings)
+    spec = configmanagement_v1.MembershipSpec(
+        config_sync={"source_format": "unstructured"}
+    )
+    assert _codes(validation.validate_spec(spec)) == [
+        ("config_sync.git", "MISSING_GIT")
+    ]
+
+
+def test_policy_controller():
+    spec = configmanagement_v1.MembershipSpec(
+        policy_controller={
+            "enabled": True,
+            "audit_interval_seconds": -60,
+            "exemptable_namespaces": ["kube-system", "Bad_NS", "kube-system"],
+        }
+    )
+    assert _codes(validation.validate_spec(spec)) == [
+        ("policy_controller.audit_interval_seconds", "NEGATIVE_AUDIT_INTERVAL"),
+        ("policy_controller.exemptable_namespaces", "INVALID_NAMESPACE"),
+        ("policy_controller.exemptable_namespaces", "DUPLICATE_NAMESPACE"),
+    ]
+    spec = configmanagement_v1.MembershipSpec(
+        policy_controller={"enabled": False, "audit_interval_seconds": 0}
+    )
+    findings = validation.validate_spec(spec)
+    assert _codes(findings) == [
+        ("policy_controller.enabled", "SETTINGS_WHILE_DISABLED")
+    ]
+    assert findings[0].severity == validation.WARNING
+
+
+def test_hierarchy_controller_and_version():
+    spec = configmanagement_v1.MembershipSpec(
+        hierarchy_controller={"enable_pod_tree_labels": True}, version="latest"
+    )
+    assert _codes(validation.validate_spec(spec)) == [
+        ("hierarchy_controller.enabled", "SETTINGS_WHILE_DISABLED"),
+        ("version", "INVALID_VERSION"),
+    ]
+
+
+def test_valid_optional_settings():
+    spec = _spec(https_proxy="http://proxy:3128")
+    spec.hierarchy_controller.enabled = True
+    spec.hierarchy_controller.enable_pod_tree_labels = True
+    assert validation.validate_spec(spec) == []
+    findings = validation.validate_spec(
+        _spec(gcp_service_account_email="sa@p.iam.gserviceaccount.com")
+    )
+    assert _codes(findings) == [
+        ("config_sync.git.gcp_service_account_email", "UNUSED_SERVICE_ACCOUNT")
+    ]
+    assert findings[0].severity == validation.WARNING
+
+
+def test_accepts_dicts_and_raw_messages():
+    spec = _spec(sync_repo="")
+    as_dict = configmanagement_v1.MembershipSpec.to_dict(spec)
+    raw = configmanagement_v1.MembershipSpec.pb(spec)
+    assert (
+        validation.validate_spec(as_dict)
+        == validation.validate_spec(raw)
+        == validation.validate_spec(spec)
+    )
+
+
+def _specs():
+    return {
+        "m2": _spec(sync_wait_secs=-5),
+        "m1": _spec(sync_repo=""),
+        "m0": _spec(),
+        "gone": None,
+    }
+
+
+def test_validate_specs_in_process():
+    findings = validation.validate_specs(_specs(), workers=0, chunk_size=1)
+    assert [(f.membership, f.code) for f in findings] == [
+        ("m1", "EMPTY_SYNC_REPO"),
+        ("m2", "SYNC_WAIT_SECS_OUT_OF_RANGE"),
+    ]
+
+
+def test_validate_specs_with_executor():
+    with futures.ThreadPoolExecutor(max_workers=2) as executor:
+        findings = validation.validate_specs(_specs(), executor=executor, chunk_size=2)
+    assert [f.membership for f in findings] == ["m1", "m2"]
+
+
+def test_validate_specs_bounds_pending_chunks():
+    with mock.patch.object(
+        validation, "iter_partials", wraps=validation.iter_partials
+    ) as iter_partials:
+        findings = validation.validate_specs(_specs(), workers=0, max_pending=2)
+    assert [f.membership for f in findings] == ["m1", "m2"]
+    assert iter_partials.call_args[1]["max_pending"] == 2
+
+
+def test_validate_specs_process_pool():
+    findings = validation.validate_specs(_specs(), workers=2)
+    assert [f.membership for f in findings] == ["m1", "m2"]
+
+
+def test_validate_specs_max_sync_wait_secs():
+    specs = {"m": _spec(sync_wait_secs=120)}
+    assert validation.validate_specs(specs, workers=0) == []
+    findings = validation.validate_specs(specs, workers=0, max_sync_wait_secs=60)
+    assert [f.code for f in findings] == ["SYNC_WAIT_SECS_OUT_OF_RANGE"]
+
+
+def test_validate_feature():
+    feature = gcg_feature.Feature(
+        membership_specs={
+            "m0": gcg_feature.MembershipFeatureSpec(
+                configmanagement=_spec(sync_repo="")
+            ),
+            "m1": gcg_feature.MembershipFeatureSpec(),
+        }
+    )
+    findings = validation.validate_feature(feature, workers=0)
+    assert _codes(findings) == [("config_sync.git.sync_repo", "EMPTY_SYNC_REPO")]